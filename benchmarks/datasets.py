@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+
+import io
+import json
+import tempfile
+import zipfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+FORMATS = ["CSV", "XLSX", "GEOJSON", "JSON", "TXT", "SHP", "ZIP"]
+
+DATASTORE_TYPES = {"int64": "int", "float64": "numeric", "object": "text"}
+
+
+def make_frame(n_rows, seed=0):
+    """
+    Builds a synthetic table resembling a typical Open Data Toronto resource.
+
+    Parameters
+    ----------
+    n_rows: int
+        Number of rows to generate
+    seed: int, optional (default=0)
+        Seed for the random number generator
+
+    Returns
+    ----------
+    pandas.DataFrame:
+        Table with integer, float, text and date columns, plus coordinates
+        within the bounds of the city
+    """
+
+    rng = np.random.RandomState(seed)
+
+    return pd.DataFrame(
+        {
+            "OBJECTID": np.arange(n_rows, dtype="int64"),
+            "WARD": rng.randint(1, 26, n_rows).astype("int64"),
+            "AMOUNT": rng.normal(100, 25, n_rows).round(2),
+            "STATUS": rng.choice(["Active", "Inactive", "Pending"], n_rows),
+            "ADDRESS": [f"{i % 9999} Yonge St" for i in range(n_rows)],
+            "DATE": pd.Timestamp("2019-01-01")
+            + pd.to_timedelta(rng.randint(0, 365, n_rows), unit="D"),
+            "LONGITUDE": rng.uniform(-79.64, -79.11, n_rows).round(6),
+            "LATITUDE": rng.uniform(43.58, 43.86, n_rows).round(6),
+        }
+    )
+
+
+def make_payload(file_format, frame):
+    """
+    Serializes a synthetic table as the file a resource of the given format would serve.
+
+    Parameters
+    ----------
+    file_format: str
+        One of FORMATS
+    frame: pandas.DataFrame
+        Table created by make_frame
+
+    Returns
+    ----------
+    bytes:
+        File content
+    """
+
+    writers = {
+        "CSV": _to_csv,
+        "XLSX": _to_xlsx,
+        "GEOJSON": _to_geojson,
+        "JSON": _to_json,
+        "TXT": _to_txt,
+        "SHP": _to_shp,
+        "ZIP": _to_zip,
+    }
+
+    return writers[file_format](frame)
+
+
+def make_datastore(frame):
+    """
+    Converts a synthetic table to DataStore fields and records.
+
+    Parameters
+    ----------
+    frame: pandas.DataFrame
+        Table created by make_frame
+
+    Returns
+    ----------
+    tuple:
+        List of field definitions and list of records, as returned by datastore_search
+    """
+
+    frame = frame.assign(DATE=frame["DATE"].dt.strftime("%Y-%m-%dT%H:%M:%S"))
+
+    fields = [{"id": "_id", "type": "int"}] + [
+        {
+            "id": col,
+            "type": (
+                "timestamp"
+                if col == "DATE"
+                else DATASTORE_TYPES.get(str(dtype), "text")
+            ),
+        }
+        for col, dtype in frame.dtypes.items()
+    ]
+
+    records = json.loads(frame.to_json(orient="records"))
+    for i, record in enumerate(records):
+        record["_id"] = i + 1
+
+    return fields, records
+
+
+def _to_csv(frame):
+    return frame.to_csv(index=False).encode("utf-8")
+
+
+def _to_xlsx(frame):
+    buffer = io.BytesIO()
+    frame.to_excel(buffer, index=False)
+    return buffer.getvalue()
+
+
+def _to_geojson(frame):
+    features = [
+        {
+            "type": "Feature",
+            "properties": {"OBJECTID": int(oid), "STATUS": status},
+            "geometry": {"type": "Point", "coordinates": [lon, lat]},
+        }
+        for oid, status, lon, lat in zip(
+            frame["OBJECTID"], frame["STATUS"], frame["LONGITUDE"], frame["LATITUDE"]
+        )
+    ]
+    return json.dumps({"type": "FeatureCollection", "features": features}).encode(
+        "utf-8"
+    )
+
+
+def _to_json(frame):
+    return frame.to_json(orient="records", date_format="iso").encode("utf-8")
+
+
+def _to_txt(frame):
+    return "\n".join(frame["ADDRESS"]).encode("utf-8")
+
+
+def _to_shp(frame):
+    import geopandas
+
+    gdf = geopandas.GeoDataFrame(
+        frame[["OBJECTID", "STATUS"]],
+        geometry=geopandas.points_from_xy(frame["LONGITUDE"], frame["LATITUDE"]),
+        crs="EPSG:4326",
+    )
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        gdf.to_file(Path(temp_dir) / "synthetic.shp")
+
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+            for file in sorted(Path(temp_dir).iterdir()):
+                archive.write(file, file.name)
+
+    return buffer.getvalue()
+
+
+def _to_zip(frame):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("synthetic.csv", _to_csv(frame))
+        archive.writestr("synthetic.json", _to_json(frame))
+    return buffer.getvalue()
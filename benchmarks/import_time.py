@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+"""
+Measures the cold import time of pyopendatato modules in fresh interpreters.
+
+Usage:
+
+    python -m benchmarks.import_time --repeat 10
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+MODULES = ["pyopendatato", "pyopendatato.utils", "pyopendatato.ckanTO"]
+
+HEAVY_MODULES = ["geopandas", "patoolib", "ckanapi", "pandas", "requests"]
+
+SNIPPET = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    "seconds": elapsed,
+    "loaded": [m for m in {heavy!r} if m in sys.modules],
+}}))
+"""
+
+
+def time_import(module, repeat):
+    """
+    Imports module in repeat fresh interpreters.
+
+    Returns
+    ----------
+    dict:
+        Median and minimum import time in seconds, and the heavy dependencies
+        that the import pulled in
+    """
+
+    timings = []
+    loaded = []
+
+    for _ in range(repeat):
+        output = subprocess.check_output(
+            [sys.executable, "-c", SNIPPET.format(module=module, heavy=HEAVY_MODULES)]
+        )
+        result = json.loads(output.decode("utf-8").strip().splitlines()[-1])
+        timings.append(result["seconds"])
+        loaded = result["loaded"]
+
+    return {
+        "module": module,
+        "median_s": statistics.median(timings),
+        "min_s": min(timings),
+        "loaded": ",".join(loaded),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--modules", nargs="+", default=MODULES)
+    args = parser.parse_args(argv)
+
+    for module in args.modules:
+        result = time_import(module, args.repeat)
+        print(
+            f"{result['module']:<24} median {result['median_s'] * 1000:8.1f} ms  "
+            f"min {result['min_s'] * 1000:8.1f} ms  loaded: {result['loaded']}"
+        )
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
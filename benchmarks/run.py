@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+
+"""
+Runs the pyopendatato benchmark suite against a local CKAN stand-in server.
+
+Usage:
+
+    python -m benchmarks.run --rows 1000 100000 --repeat 5 --output results.json
+    python -m benchmarks.run --baseline results.json
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+
+from pyopendatato.ckanTO import ckanTO
+from pyopendatato.ratelimit import RateLimiter
+from pyopendatato.utils import read_datastore
+
+from .datasets import FORMATS, make_datastore, make_frame, make_payload
+from .server import StandInCKAN
+
+PACKAGE_ID = "benchmark-package"
+
+
+def measure(func, repeat):
+    """
+    Calls func repeat times, recording wall clock latency and peak traced memory.
+
+    Returns
+    ----------
+    dict:
+        Median and maximum latency in seconds, and peak memory in bytes
+    """
+
+    latencies = []
+    peak = 0
+
+    for _ in range(repeat):
+        tracemalloc.start()
+        start = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - start)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    return {
+        "median_s": statistics.median(latencies),
+        "max_s": max(latencies),
+        "peak_bytes": peak,
+    }
+
+
+def populate(server, rows, formats):
+    """
+    Registers one resource per format and row count, plus a DataStore resource.
+
+    Returns
+    ----------
+    list:
+        Tuples of (benchmark name, format, row count, payload size, resource id)
+    """
+
+    server.add_package(PACKAGE_ID, title="Benchmark package")
+    cases = []
+
+    for n_rows in rows:
+        frame = make_frame(n_rows)
+
+        for file_format in formats:
+            resource_id = f"{file_format.lower()}-{n_rows}"
+            payload = make_payload(file_format, frame)
+            server.add_resource(PACKAGE_ID, resource_id, file_format, payload=payload)
+            cases.append(
+                ("get_resource", file_format, n_rows, len(payload), resource_id)
+            )
+            if file_format == "CSV":
+                cases.append(
+                    ("get_resource_arrow", "CSV", n_rows, len(payload), resource_id)
+                )
+
+        resource_id = f"datastore-{n_rows}"
+        fields, records = make_datastore(frame)
+        server.add_resource(
+            PACKAGE_ID, resource_id, "CSV", records=records, fields=fields
+        )
+        size = len(json.dumps(records))
+        cases.append(("get_resource", "DATASTORE", n_rows, size, resource_id))
+        cases.append(("get_resource_arrow", "DATASTORE", n_rows, size, resource_id))
+        cases.append(("read_datastore", "DATASTORE", n_rows, size, resource_id))
+
+    return cases
+
+
+def run(rows, formats, repeat):
+    results = []
+
+    with StandInCKAN() as server:
+        cases = populate(server, rows, formats)
+        ct = ckanTO(
+            url=server.url, rate_limiter=RateLimiter(rate=None, max_concurrency=64)
+        )
+        datastore_search_url = server.url + "/api/action/datastore_search"
+
+        for name, file_format, n_rows, size, resource_id in cases:
+            if name == "read_datastore":
+                func = lambda: read_datastore(  # noqa: E731
+                    resource_id,
+                    datastore_search_url=datastore_search_url,
+                    session=ct.session,
+                )
+            elif name == "get_resource_arrow":
+                func = lambda: ct.get_resource(resource_id, arrow=True)  # noqa: E731
+            else:
+                func = lambda: ct.get_resource(resource_id)  # noqa: E731
+
+            stats = measure(func, repeat)
+            results.append(
+                dict(
+                    name=name,
+                    format=file_format,
+                    rows=n_rows,
+                    bytes=size,
+                    mb_per_s=size / stats["median_s"] / 1e6,
+                    rows_per_s=n_rows / stats["median_s"],
+                    **stats,
+                )
+            )
+
+        metadata_calls = [
+            ("list_packages", lambda: ct.list_packages(limit=10)),
+            ("search_packages", lambda: ct.search_packages("Benchmark")),
+            ("get_package_metadata", lambda: ct.get_package_metadata(PACKAGE_ID)),
+            ("list_package_resources", lambda: ct.list_package_resources(PACKAGE_ID)),
+        ]
+        for name, func in metadata_calls:
+            stats = measure(func, repeat)
+            results.append(dict(name=name, format="", rows=0, bytes=0, **stats))
+
+    return pd.DataFrame(results)
+
+
+def compare(results, baseline):
+    """
+    Adds the ratio of each median latency to the one recorded in a baseline run.
+    """
+
+    keys = ["name", "format", "rows"]
+    baseline = baseline[keys + ["median_s"]].rename(columns={"median_s": "baseline_s"})
+    merged = results.merge(baseline, on=keys, how="left")
+    merged["speedup"] = merged["baseline_s"] / merged["median_s"]
+    return merged
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--formats", nargs="+", default=FORMATS, choices=FORMATS)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument(
+        "--baseline", help="Compare against results from a previous run"
+    )
+    args = parser.parse_args(argv)
+
+    results = run(args.rows, args.formats, args.repeat)
+
+    if args.baseline:
+        results = compare(results, pd.read_json(args.baseline))
+
+    if args.output:
+        results.to_json(args.output, orient="records", indent=2)
+
+    with pd.option_context("display.width", 200, "display.max_columns", None):
+        print(results.round(4).to_string(index=False))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
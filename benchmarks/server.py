@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+
+import csv
+import io
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qsl, urlparse
+
+ACTION_PREFIX = "/api/action/"
+DOWNLOAD_PREFIX = "/download/"
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self._dispatch(dict(parse_qsl(urlparse(self.path).query)))
+
+    def do_HEAD(self):
+        self._dispatch({}, head=True)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        params = json.loads(body.decode("utf-8")) if body else {}
+        params.update(dict(parse_qsl(urlparse(self.path).query)))
+        self._dispatch(params)
+
+    def _dispatch(self, params, head=False):
+        path = urlparse(self.path).path
+        ckan = self.server.ckan
+
+        if path.startswith(DOWNLOAD_PREFIX):
+            resource_id = path[len(DOWNLOAD_PREFIX) :]
+            if resource_id not in ckan.payloads:
+                return self._send_json(404, _error("Not Found Error"))
+            return self._send_payload(ckan.payloads[resource_id], head=head)
+
+        if path.startswith(ACTION_PREFIX):
+            action = getattr(ckan, "action_" + path[len(ACTION_PREFIX) :], None)
+            if action is None:
+                return self._send_json(400, _error("Bad Request"))
+            try:
+                result = action(**params)
+            except KeyError:
+                return self._send_json(404, _error("Not Found Error"))
+            return self._send_json(200, {"help": "", "success": True, "result": result})
+
+        self._send_json(404, _error("Not Found Error"))
+
+    def _send_json(self, status, body):
+        content = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json;charset=utf-8")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def _send_payload(self, payload, head=False):
+        start, end, status = 0, len(payload) - 1, 200
+
+        byte_range = self.headers.get("Range")
+        if byte_range and byte_range.startswith("bytes="):
+            first, _, last = byte_range[len("bytes=") :].partition("-")
+            if first:
+                start, end = int(first), int(last) if last else end
+            else:
+                start = max(len(payload) - int(last), 0)
+            end, status = min(end, len(payload) - 1), 206
+
+        content = payload[start : end + 1]
+        self.send_response(status)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(len(content)))
+        self.send_header("Accept-Ranges", "bytes")
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(payload)}")
+        self.end_headers()
+        if not head:
+            self.wfile.write(content)
+
+
+def _error(error_type):
+    return {"success": False, "error": {"__type": error_type, "message": error_type}}
+
+
+class StandInCKAN(object):
+    """
+    A local HTTP server imitating the parts of the CKAN API used by pyopendatato.
+
+    It answers the package_show, resource_show, datastore_search,
+    current_package_list_with_resources and package_search actions,
+    and serves resource files (with byte range support) under /download/.
+
+    Parameters
+    ----------
+    host: str, optional (default="127.0.0.1")
+        Interface to bind to
+    port: int, optional (default=0)
+        Port to bind to, 0 picks a free port
+
+    Examples
+    ----------
+    >>> from benchmarks.server import StandInCKAN
+    >>> from pyopendatato.ckanTO import ckanTO
+    >>> with StandInCKAN() as server:
+    ...     server.add_package("pkg")
+    ...     server.add_resource("pkg", "res", "TXT", payload=b"hello\\nworld")
+    ...     ckanTO(url=server.url).get_resource("res")
+    """
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.packages = {}
+        self.resources = {}
+        self.payloads = {}
+        self.datastore = {}
+
+        self._server = _ThreadingHTTPServer((host, port), _Handler)
+        self._server.ckan = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def add_package(
+        self,
+        package_id,
+        title=None,
+        refresh_rate="Daily",
+        last_refreshed="2019-09-28T00:00:00.000000",
+    ):
+        """
+        Registers an (initially empty) package.
+        """
+
+        self.packages[package_id] = {
+            "id": package_id,
+            "name": package_id,
+            "title": title or package_id,
+            "topics": "",
+            "excerpt": "",
+            "formats": "",
+            "num_resources": 0,
+            "refresh_rate": refresh_rate,
+            "last_refreshed": last_refreshed,
+            "metadata_modified": last_refreshed,
+            "notes": "",
+            "resources": [],
+        }
+
+    def add_resource(
+        self,
+        package_id,
+        resource_id,
+        file_format,
+        payload=None,
+        records=None,
+        fields=None,
+        name=None,
+        last_modified="2019-09-28T00:00:00.000000",
+    ):
+        """
+        Registers a resource under a package.
+
+        Either a file payload (bytes served under /download/) or DataStore
+        records (served through datastore_search) should be given.
+        """
+
+        package = self.packages[package_id]
+        resource = {
+            "id": resource_id,
+            "name": name or resource_id,
+            "format": file_format,
+            "datastore_active": records is not None,
+            "last_modified": last_modified,
+            "package_id": package_id,
+            "url": self.url + DOWNLOAD_PREFIX + resource_id,
+        }
+
+        if records is not None:
+            self.datastore[resource_id] = (fields or [], records)
+        else:
+            self.payloads[resource_id] = payload
+
+        self.resources[resource_id] = resource
+        package["resources"].append(resource)
+        package["num_resources"] = len(package["resources"])
+        package["formats"] = ",".join(
+            sorted(set(r["format"] for r in package["resources"]))
+        )
+
+    def action_package_show(self, id, **kwargs):
+        return self.packages[id]
+
+    def action_resource_show(self, id, **kwargs):
+        return self.resources[id]
+
+    def action_current_package_list_with_resources(self, limit=10, offset=0, **kwargs):
+        packages = list(self.packages.values())
+        return packages[int(offset) : int(offset) + int(limit)]
+
+    def action_package_search(self, fq="", q="", rows=10, start=0, **kwargs):
+        query = fq.partition(":")[2].strip('"').lower() if fq else q.lower()
+        matches = [p for p in self.packages.values() if query in p["title"].lower()]
+        return {
+            "count": len(matches),
+            "results": matches[int(start) : int(start) + int(rows)],
+        }
+
+    def action_datastore_search(
+        self, resource_id, limit=100, offset=0, records_format="objects", **kwargs
+    ):
+        fields, records = self.datastore[resource_id]
+        offset, limit = int(offset), int(limit)
+        page = records[offset : offset + limit]
+
+        if records_format == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for record in page:
+                writer.writerow([record.get(field["id"]) for field in fields])
+            page = buffer.getvalue()
+
+        return {
+            "resource_id": resource_id,
+            "fields": fields,
+            "records": page,
+            "records_format": records_format,
+            "limit": limit,
+            "offset": offset,
+            "total": len(records),
+        }
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+import threading
+from datetime import datetime, timezone
+
+import pandas as pd
+
+SEARCH_PAGE_SIZE = 1000
+
+
+def _solr_timestamp(value):
+    # CKAN stores metadata_modified as a naive UTC timestamp
+    return value.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def _parse_timestamp(value):
+    timestamp = pd.Timestamp(value)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.tz_convert("UTC").tz_localize(None)
+    return timestamp.to_pydatetime()
+
+
+class ChangeTracker(object):
+    """
+    Keeps a client's cached metadata fresh by polling the portal for recently changed packages,
+    and invalidating only the affected package and resource entries.
+
+    Each poll is a single package_search request (per 1000 changed packages) for packages
+    with a metadata_modified date later than the previous poll, whatever the number of
+    packages and resources tracked by the client.
+
+    Parameters
+    ----------
+    client: pyopendatato.ckanTO.ckanTO
+        Client whose caches are invalidated, usually created with cache_metadata=True
+    interval: float, optional (default=300)
+        Seconds between polls when running in the background
+    since: datetime.datetime, optional
+        Changes made before this time (naive, in UTC) are ignored. Defaults to now
+
+    Examples
+    ----------
+    >>> from pyopendatato.ckanTO import ckanTO
+    >>> from pyopendatato.changes import ChangeTracker
+    >>> ct = ckanTO(cache_metadata=True)
+    >>> tracker = ChangeTracker(ct, interval=60)
+    >>> tracker.start()
+    """
+
+    def __init__(self, client, interval=300, since=None):
+        self.client = client
+        self.interval = interval
+        self.since = since or datetime.now(timezone.utc).replace(tzinfo=None)
+
+        self._stop = threading.Event()
+        self._thread = None
+
+    def poll(self):
+        """
+        Retrieves packages changed since the previous poll and invalidates them in the client.
+
+        Returns
+        ----------
+        list:
+            Ids of the packages that changed
+        """
+
+        since = _solr_timestamp(self.since)
+        changed = []
+        latest = self.since
+
+        start = 0
+        while True:
+            results = self.client.remoteckan.action.package_search(
+                fq=f"metadata_modified:{{{since} TO *]",
+                sort="metadata_modified asc",
+                rows=SEARCH_PAGE_SIZE,
+                start=start,
+            )
+
+            for package in results["results"]:
+                changed.append(package["id"])
+                latest = max(latest, _parse_timestamp(package["metadata_modified"]))
+
+            start += len(results["results"])
+            if not results["results"] or start >= results["count"]:
+                break
+
+        for package_id in changed:
+            self.client.invalidate_package(package_id)
+
+        self.since = latest
+
+        return changed
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as error:
+                print(f"Encountered an error - {error}")
+
+    def start(self):
+        """
+        Starts polling in a background thread.
+        """
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stops the background thread.
+        """
+
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
@@ -1,17 +1,59 @@
 # -*- coding: utf-8 -*-
 
+import importlib.util
+import io
+import json
+import re
 import shutil
-import tempfile
+import threading
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from functools import partial
 from pathlib import Path
-import requests
 
 import ckanapi
 import pandas as pd
 
-from .utils import download_extract_zipped_file, read_datastore, read_file
+from .ratelimit import RateLimitedSession
+from .scratch import DEFAULT_SCRATCH
+from .singleflight import SingleFlight, copy_result
+from .store import DownloadStore
+from .utils import (
+    DOWNLOAD_CHUNK_SIZE,
+    IDENTITY_ENCODING,
+    SPILL_THRESHOLD,
+    apply_schema,
+    datastore_search,
+    download_datastore_records,
+    download_file,
+    download_head,
+    download_scratch_file,
+    extract_archive,
+    extracted_size,
+    memory_usage,
+    fields_to_schema,
+    frame_schema,
+    iter_datastore,
+    open_download,
+    open_file,
+    open_ranged,
+    read_datastore_arrow,
+    read_datastore_page,
+    read_file,
+    read_file_arrow,
+    read_file_csv,
+    read_file_csv_chunks,
+    records_to_arrow,
+    records_to_dataframe,
+    union_frames,
+)
 
 OPEN_DATA_TORONTO_URL = "https://ckan0.cf.opendata.inter.prod-toronto.ca"
 
+DATASTORE_SEARCH_PATH = "/api/action/datastore_search"
+
 PACKAGE_INFO_COLS = [
     "id",
     "title",
@@ -34,14 +76,206 @@ RESOURCE_INFO_COLS = [
     "url",
 ]
 
+# Cheapest to most expensive way of loading a resource, used by get_package_data
+FORMAT_PREFERENCE = [
+    "DATASTORE",
+    "CSV",
+    "JSON",
+    "TXT",
+    "GEOJSON",
+    "XLSX",
+    "XLSM",
+    "XLS",
+    "SHP",
+    "ZIP",
+    "GZ",
+    "RAR",
+]
+
+
+# Rows parsed to estimate the memory taken by DataStore and CSV resources
+MEMORY_SAMPLE_ROWS = 1000
+
+# Rough ratio between the memory taken by parsed data and the size of the file,
+# for formats whose footprint is not estimated from a sample of rows
+FILE_EXPANSION = {
+    "XLS": 4,
+    "XLSX": 10,
+    "XLSM": 10,
+    "GEOJSON": 4,
+    "JSON": 4,
+    "TXT": 3,
+    "SHP": 10,
+    "GZ": 10,
+    "RAR": 10,
+    "ZIP": 10,
+}
+
+
+# Most memory in bytes taken by parsed files kept for resources publishing the same file
+PARSED_CACHE_BYTES = 256 * 1024**2
+
+# Formats of the files get_resource can parse
+FILE_FORMATS = [
+    "CSV",
+    "XLS",
+    "XLSX",
+    "XLSM",
+    "GEOJSON",
+    "JSON",
+    "TXT",
+    "SHP",
+    "GZ",
+    "RAR",
+    "ZIP",
+]
+
+
+class MemoryBudgetError(MemoryError):
+    """
+    Raised when loading a resource would take more memory than the budget of the client.
+    """
+
+
+# Files inside archives that can be previewed (shapefiles need their sidecar files)
+PREVIEW_MEMBER_FORMATS = ["csv", "xls", "xlsx", "xlsm", "geojson", "json", "txt"]
+
+
+def _file_suffix(file_format):
+    # Suffix of the downloaded file of a resource, shapefiles are published zipped
+    file_format = str(file_format)
+    return ".zip" if file_format.upper() == "SHP" else "." + file_format.lower()
+
+
+def _resource_table(packages):
+    # One row per resource of the packages, with the RESOURCE_INFO_COLS columns
+    resource_list = []
+    for package in packages:
+        for resource in package["resources"]:
+            resource_list.append(
+                {k: (resource[k] if k in resource else "") for k in RESOURCE_INFO_COLS}
+            )
+
+    return pd.DataFrame(resource_list, columns=RESOURCE_INFO_COLS)
+
+
+def _preview_zip(archive, nrows):
+    # Only the central directory and the previewed member are read from the archive
+    data_list = {}
+    for name in sorted(archive.namelist()):
+        file_ext = Path(name).suffix[1:].lower()
+        if name.endswith("/"):
+            continue
+        if file_ext in PREVIEW_MEMBER_FORMATS and not any(
+            data is not None for data in data_list.values()
+        ):
+            with archive.open(name) as member:
+                # CSV members are parsed as they are decompressed, and stop after nrows
+                source = member if file_ext == "csv" else io.BytesIO(member.read())
+                data_list[Path(name).name] = read_file(source, file_ext, nrows=nrows)
+        else:
+            data_list[Path(name).name] = None
+
+    return data_list
+
+
+def _resource_group(name):
+    """
+    Normalizes a resource name so that the same data published in several formats
+    (e.g. "Bike Share 2019.csv", "bike-share-2019 (JSON)") falls in the same group.
+    """
+
+    name = str(name).lower()
+    formats = "|".join(f.lower() for f in FORMAT_PREFERENCE + ["XML", "WGS84", "4326"])
+    name = re.sub(rf"[\s._()\[\]-]*\b({formats})\b[\s._()\[\]-]*", " ", name)
+    return " ".join(re.findall(r"[a-z0-9]+", name))
+
 
 class ckanTO(object):
     """
     The ckanTO class is the interface for retrieving information from Toronto's Open Data Portal, which runs on CKAN.
+
+    Parameters
+    ----------
+    url: str, optional (default=OPEN_DATA_TORONTO_URL)
+        Address of the CKAN instance to connect to
+    rate_limiter: pyopendatato.ratelimit.RateLimiter, optional
+        Limiter applied to every request sent by this instance.
+        Defaults to a limiter shared by all instances in the process
+    cache_dir: str or pathlib.Path, optional
+        Directory where downloaded resources are kept and reused until a new version
+        is published. It can be shared by several processes on the same host,
+        each version of a resource is then downloaded only once.
+        Identical files published under several resources are stored, extracted
+        and parsed once.
+        By default, resources are downloaded to temporary files and discarded
+    cache_metadata: boolean, optional (default=False)
+        Option for whether to keep package and resource metadata in memory, instead of
+        retrieving it again on every call. Cached metadata is trusted until it is
+        invalidated, typically by a pyopendatato.changes.ChangeTracker
+    spill_threshold: int, optional (default=SPILL_THRESHOLD)
+        Files up to this size in bytes are parsed straight from memory,
+        larger ones are streamed to disk first
+    memory_budget: int, optional
+        Most memory in bytes a resource may take once loaded. When set, get_resource
+        estimates the footprint of a resource before loading it (from a sample of rows
+        and the number of rows or file size), and handles resources over budget
+        according to over_budget. Estimates and actual footprints are kept
+        in memory_reports
+    over_budget: str, optional (default="chunks")
+        "chunks" returns DataStore and CSV resources over budget as an iterator of chunks
+        that fit in the budget (see get_resource), and raises MemoryBudgetError for other
+        formats. "raise" always raises MemoryBudgetError
+    scratch: pyopendatato.scratch.ScratchSpace, optional
+        Where files are downloaded and archives extracted when they are not kept in the store,
+        with an optional byte quota. Defaults to a scratch space shared by all instances
+        in the process, in the system temporary directory
+    cache_compression: str, optional (default="gzip")
+        How text files (CSV, JSON, GeoJSON, TXT and DataStore records) are compressed
+        in the cache_dir: "gzip", "zstd" (which needs the zstandard package), or None
     """
 
-    def __init__(self):
-        self.remoteckan = ckanapi.RemoteCKAN(OPEN_DATA_TORONTO_URL)
+    def __init__(
+        self,
+        url=OPEN_DATA_TORONTO_URL,
+        rate_limiter=None,
+        cache_dir=None,
+        cache_metadata=False,
+        spill_threshold=SPILL_THRESHOLD,
+        memory_budget=None,
+        over_budget="chunks",
+        scratch=None,
+        cache_compression="gzip",
+    ):
+        if over_budget not in ["chunks", "raise"]:
+            raise Exception(
+                f'over_budget should be "chunks" or "raise", not {over_budget}.'
+            )
+
+        self.url = url.rstrip("/")
+        self.session = RateLimitedSession(rate_limiter)
+        self.remoteckan = ckanapi.RemoteCKAN(self.url, session=self.session)
+        self.store = (
+            DownloadStore(cache_dir, compression=cache_compression)
+            if cache_dir is not None
+            else None
+        )
+        self.cache_metadata = cache_metadata
+        self.spill_threshold = spill_threshold
+        self.scratch = scratch or DEFAULT_SCRATCH
+        self.memory_budget = memory_budget
+        self.over_budget = over_budget
+        self.memory_reports = {}
+        self._single_flight = SingleFlight()
+        self._prefetched = {}
+        self._spatial_indexes = {}
+        self._schemas = {}
+        self._parsed = OrderedDict()
+        self._parsed_bytes = 0
+        self._parsed_lock = threading.Lock()
+        self._packages = {}
+        self._resources = {}
+        self._lazy_files = ExitStack()
 
     def __enter__(self):
         return self
@@ -49,6 +283,248 @@ class ckanTO(object):
     def __exit__(self, *args):
         self.remoteckan.close()
 
+        # Files kept for lazily evaluated results, see get_resource_dask
+        self._lazy_files.close()
+
+    def _package_show(self, package_id):
+        if self.cache_metadata and package_id in self._packages:
+            return self._packages[package_id]
+
+        # Concurrent lookups of the same package share one package_show request
+        package, _ = self._single_flight.do(
+            ("package_show", package_id),
+            self.remoteckan.action.package_show,
+            id=package_id,
+        )
+
+        self._cache_package(package_id, package)
+
+        return package
+
+    def _cache_package(self, package_id, package):
+        if self.cache_metadata:
+            self._packages[package_id] = package
+            for resource in package.get("resources", []):
+                if "id" in resource:
+                    self._resources[resource["id"]] = resource
+
+    def _packages_show(self, package_ids, batch_size=100, max_workers=8):
+        # Packages are retrieved in batches with package_search, and those it does not find
+        # (e.g. private packages) with concurrent package_show requests
+        packages = {}
+        missing = []
+        for package_id in dict.fromkeys(package_ids):
+            if self.cache_metadata and package_id in self._packages:
+                packages[package_id] = self._packages[package_id]
+            else:
+                missing.append(package_id)
+
+        for start in range(0, len(missing), batch_size):
+            batch = missing[start : start + batch_size]
+            terms = " OR ".join(f'"{package_id}"' for package_id in batch)
+
+            try:
+                results = self.remoteckan.action.package_search(
+                    fq=f"id:({terms}) OR name:({terms})", rows=len(batch)
+                )["results"]
+            except ckanapi.CKANAPIError as error:
+                print(f"Encountered an error - {error}")
+                results = []
+
+            for package in results:
+                # Packages can be requested by id or by name
+                for package_id in (package.get("id"), package.get("name")):
+                    if package_id in batch:
+                        packages[package_id] = package
+                        self._cache_package(package_id, package)
+
+        remaining = [package_id for package_id in missing if package_id not in packages]
+        if remaining:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                results = executor.map(self._package_show, remaining)
+                packages.update(zip(remaining, results))
+
+        return [packages[package_id] for package_id in package_ids]
+
+    def _resource_show(self, resource_id):
+        if self.cache_metadata and resource_id in self._resources:
+            return self._resources[resource_id]
+
+        resource, _ = self._single_flight.do(
+            ("resource_show", resource_id),
+            self.remoteckan.action.resource_show,
+            id=resource_id,
+        )
+
+        if self.cache_metadata:
+            self._resources[resource_id] = resource
+
+        return resource
+
+    def invalidate_package(self, package_id):
+        """
+        This drops the cached metadata of a package and of its resources,
+        so that it is retrieved again from the portal on next use.
+
+        Parameters
+        ----------
+        package_id: str
+            Id or name for package
+        """
+
+        # Packages are cached under the id or name they were requested with
+        ids = {package_id}
+        for key, package in list(self._packages.items()):
+            if package_id in (key, package.get("id"), package.get("name")):
+                ids.add(package.get("id"))
+                self._packages.pop(key, None)
+
+        for resource_id, resource in list(self._resources.items()):
+            if resource.get("package_id") in ids:
+                self._resources.pop(resource_id, None)
+
+    def invalidate_resource(self, resource_id):
+        """
+        This drops the cached metadata, prefetched data, schema and spatial index of a resource.
+
+        Parameters
+        ----------
+        resource_id: str
+            Id for resource
+        """
+
+        self._resources.pop(resource_id, None)
+        self._prefetched.pop(resource_id, None)
+        self._spatial_indexes.pop(resource_id, None)
+        self._schemas.pop(resource_id, None)
+
+    def _use_store(self, resource_info):
+        # Without a last_modified date there is no way to tell when a stored copy is stale
+        return self.store is not None and bool(resource_info["last_modified"])
+
+    @contextmanager
+    def _resource_file(self, resource_id, resource_info, suffix):
+        """
+        Downloads the file of a resource, into the store if there is one,
+        otherwise to a scratch file which is removed when the context exits.
+        """
+
+        def download(out_file):
+            download_file(resource_info["url"], out_file, session=self.session)
+
+        if self._use_store(resource_info):
+            yield self.store.fetch(
+                resource_id, resource_info["last_modified"], suffix, download
+            )
+            return
+
+        with download_scratch_file(
+            resource_info["url"], suffix, session=self.session, scratch=self.scratch
+        ) as temp_file:
+            yield temp_file
+
+    @contextmanager
+    def _extracted_resource(self, resource_id, resource_info, suffix):
+        """
+        Downloads and extracts the archive of a resource to a scratch directory,
+        which is removed when the context exits, even if reading the files fails.
+        Archives in the store are extracted once per content, and kept there.
+        """
+
+        if self._use_store(resource_info):
+            with self._resource_file(
+                resource_id, resource_info, suffix
+            ) as archive_path:
+                yield self.store.extract(archive_path, extract_archive)
+            return
+
+        with self._resource_file(resource_id, resource_info, suffix) as archive_path:
+            with self.scratch.directory(
+                nbytes=extracted_size(archive_path)
+            ) as temp_dir:
+                yield extract_archive(archive_path, out_dir=temp_dir)
+
+    def _read_datastore(self, resource_id, resource_info, arrow=False):
+        if arrow and not self._use_store(resource_info):
+            return read_datastore_arrow(
+                resource_id,
+                datastore_search_url=self.url + DATASTORE_SEARCH_PATH,
+                session=self.session,
+            )
+
+        to_table = records_to_arrow if arrow else records_to_dataframe
+
+        def download_records():
+            return download_datastore_records(
+                resource_id,
+                datastore_search_url=self.url + DATASTORE_SEARCH_PATH,
+                session=self.session,
+            )
+
+        if not self._use_store(resource_info):
+            return to_table(download_records())
+
+        path = self.store.fetch(
+            resource_id,
+            resource_info["last_modified"],
+            ".datastore.json",
+            lambda out_file: out_file.write(
+                json.dumps(download_records()).encode("utf-8")
+            ),
+        )
+        with open_file(path) as in_file:
+            return to_table(json.load(in_file))
+
+    def _cached_schema(self, resource_id, resource_info):
+        # Schemas are only trusted for the version of the resource they were recorded from
+        version = resource_info["last_modified"]
+        if not version:
+            return None
+
+        cached_version, schema = self._schemas.get(resource_id, (None, None))
+        if schema is not None and cached_version == version:
+            return schema
+
+        if self._use_store(resource_info):
+            path = self.store.get(resource_id, version, ".schema.json")
+            if path is not None:
+                with open_file(path) as in_file:
+                    schema = json.load(in_file)
+                self._schemas[resource_id] = (version, schema)
+                return schema
+
+        return None
+
+    def _record_schema(self, resource_id, resource_info, schema):
+        version = resource_info["last_modified"]
+        if not version:
+            return
+
+        self._schemas[resource_id] = (version, schema)
+
+        if self._use_store(resource_info):
+            self.store.fetch(
+                resource_id,
+                version,
+                ".schema.json",
+                lambda out_file: out_file.write(json.dumps(schema).encode("utf-8")),
+            )
+
+    def _read_csv(self, resource_id, resource_info, source):
+        schema = self._cached_schema(resource_id, resource_info)
+
+        if schema is not None:
+            try:
+                return read_file_csv(source, schema=schema)
+            except (TypeError, ValueError):
+                # The recorded schema does not fit the file, infer the dtypes again
+                if hasattr(source, "seek"):
+                    source.seek(0)
+
+        data = read_file_csv(source)
+        self._record_schema(resource_id, resource_info, frame_schema(data))
+        return data
+
     def list_packages(self, limit=10):
         """
         This lists current packages in the portal.
@@ -162,7 +638,7 @@ class ckanTO(object):
         """
 
         try:
-            package = self.remoteckan.action.package_show(id=package_id)
+            package = self._package_show(package_id)
         except ckanapi.CKANAPIError as error:
             print(f"Encountered an error - {error}")
             raise
@@ -184,6 +660,100 @@ class ckanTO(object):
 
         return package_dict
 
+    def get_packages_metadata(self, package_ids, batch_size=100, max_workers=8):
+        """
+        This retrieves metadata about many packages at once,
+        in as few requests as possible.
+
+        Parameters
+        ----------
+        package_ids: list
+            Ids (or names) of packages
+        batch_size: int, optional (default=100)
+            Number of packages retrieved per package_search request
+        max_workers: int, optional (default=8)
+            Number of package_show requests sent at the same time,
+            for packages the search does not return
+
+        Returns
+        ----------
+        pandas.DataFrame:
+            Table of packages, in the order of package_ids, along with information
+            about them, such as refresh date and number of resources
+
+        Raises
+        ----------
+        CKANAPIError:
+            When attempt to retrieve package information returns a CKANAPIError error,
+            likely because a package was not found
+
+        Examples
+        ----------
+        >>> from pyopendatato import ckanTO as ckanTO
+        >>> ct = ckanTO()
+        >>> ct.get_packages_metadata(["e28bc818-43d5-43f7-b5d9-bdfb4eda5feb", "ttc-routes-and-schedules"])
+        """
+
+        try:
+            packages = self._packages_show(
+                package_ids, batch_size=batch_size, max_workers=max_workers
+            )
+        except ckanapi.CKANAPIError as error:
+            print(f"Encountered an error - {error}")
+            raise
+
+        packages_list = []
+        for package in packages:
+            packages_list.append(
+                {k: (package[k] if k in package else "") for k in PACKAGE_INFO_COLS}
+            )
+
+        return pd.DataFrame(packages_list, columns=PACKAGE_INFO_COLS)
+
+    def list_packages_resources(self, package_ids, batch_size=100, max_workers=8):
+        """
+        This lists the resources of many packages at once,
+        in as few requests as possible (see get_packages_metadata).
+
+        Parameters
+        ----------
+        package_ids: list
+            Ids (or names) of packages
+        batch_size: int, optional (default=100)
+            Number of packages retrieved per package_search request
+        max_workers: int, optional (default=8)
+            Number of package_show requests sent at the same time,
+            for packages the search does not return
+
+        Returns
+        ----------
+        pandas.DataFrame:
+            Table of the resources of all packages, along with information about them,
+            such as format and URL
+
+        Raises
+        ----------
+        CKANAPIError:
+            When attempt to retrieve package information returns a CKANAPIError error,
+            likely because a package was not found
+
+        Examples
+        ----------
+        >>> from pyopendatato import ckanTO as ckanTO
+        >>> ct = ckanTO()
+        >>> ct.list_packages_resources(["e28bc818-43d5-43f7-b5d9-bdfb4eda5feb", "ttc-routes-and-schedules"])
+        """
+
+        try:
+            packages = self._packages_show(
+                package_ids, batch_size=batch_size, max_workers=max_workers
+            )
+        except ckanapi.CKANAPIError as error:
+            print(f"Encountered an error - {error}")
+            raise
+
+        return _resource_table(packages)
+
     def list_package_resources(self, package_id):
         """
         This retrieves information on available resources from a package.
@@ -213,7 +783,7 @@ class ckanTO(object):
         """
 
         try:
-            package = self.remoteckan.action.package_show(id=package_id)
+            package = self._package_show(package_id)
         except ckanapi.CKANAPIError as error:
             print(f"Encountered an error - {error}")
             raise
@@ -226,147 +796,1102 @@ class ckanTO(object):
 
         return pd.DataFrame(resource_list)
 
-    def get_resource_metadata(self, resource_id):
+    def choose_package_resources(self, package_id, prefer="fastest"):
         """
-        This retrieves metadata about resources.
+        This groups the resources of a package that hold the same data in different formats,
+        and chooses the cheapest one to load from each group.
 
         Parameters
         ----------
-        resource_id: str
-            Id for resource
+        package_id: str
+            Id for package
+        prefer: str or list, optional (default="fastest")
+            Order of preference for formats. "fastest" uses FORMAT_PREFERENCE
+            (DataStore, then CSV, JSON, TXT, GEOJSON, Excel, SHP and archives).
+            A list of formats, where "DATASTORE" stands for resources in the DataStore,
+            overrides it; formats not in the list are never chosen
 
         Returns
         ----------
-        dict:
-            Dictionary with metadata about resource specified,
-            such as format and URL
+        pandas.DataFrame:
+            DataFrame with metadata about the chosen resources, one per group,
+            along with the name of the group and the format they are loaded as
+            ("DATASTORE" or the format of their file)
 
         Raises
         ----------
         CKANAPIError:
-            When attempt to retrieve resource information returns a CKANAPIError error,
-            likely because the resource was not found
+            When attempt to retrieve package information returns a CKANAPIError error,
+            likely because the package was not found
 
         Examples
         ----------
         >>> from pyopendatato import ckanTO as ckanTO
         >>> ct = ckanTO()
-        >>> ct.get_resource_metadata("4d985c1d-9c7e-4f74-9864-73214f45eb4a")
+        >>> ct.choose_package_resources("e28bc818-43d5-43f7-b5d9-bdfb4eda5feb", prefer=["CSV", "DATASTORE"])
         """
 
+        if prefer == "fastest":
+            prefer = FORMAT_PREFERENCE
+        elif isinstance(prefer, str):
+            raise Exception(
+                f'prefer should be "fastest" or a list of formats, not {prefer}.'
+            )
+
+        ranks = {f.upper(): rank for rank, f in enumerate(prefer)}
+
         try:
-            resource = self.remoteckan.action.resource_show(id=resource_id)
+            package = self._package_show(package_id)
         except ckanapi.CKANAPIError as error:
             print(f"Encountered an error - {error}")
             raise
 
-        return {k: (resource[k] if k in resource else "") for k in RESOURCE_INFO_COLS}
+        chosen = {}
+        for resource in package["resources"]:
+            resource = {
+                k: (resource[k] if k in resource else "") for k in RESOURCE_INFO_COLS
+            }
 
-    def get_resource(self, resource_id):
+            # DataStore resources can also be loaded as their own format, if preferred
+            options = [str(resource["format"]).upper()]
+            if resource["datastore_active"]:
+                options.insert(0, "DATASTORE")
+
+            load_as = min(
+                (f for f in options if f in ranks), key=ranks.get, default=None
+            )
+            if load_as is None:
+                continue
+
+            group = _resource_group(resource["name"])
+            rank = ranks[load_as]
+            if group not in chosen or rank < chosen[group][0]:
+                chosen[group] = (rank, dict(resource, group=group, load_as=load_as))
+
+        return pd.DataFrame(
+            [resource for _, resource in chosen.values()],
+            columns=RESOURCE_INFO_COLS + ["group", "load_as"],
+        )
+
+    def get_package_data(self, package_id, prefer="fastest"):
         """
-        This downloads data from a given resource.
+        This downloads the data of a package, loading each dataset from the cheapest
+        of the formats it is published in (see choose_package_resources).
 
         Parameters
         ----------
-        resource_id: str
-            Id for resoruce
+        package_id: str
+            Id for package
+        prefer: str or list, optional (default="fastest")
+            Order of preference for formats, see choose_package_resources
 
         Returns
         ----------
-        A pandas.DataFrame, list or dict,
-        or a dict where the values can be a pd.DataFrame, list or dict,
-        depending on the resource file format
+        The data of the only dataset in the package, in the same form as get_resource,
+        or a dict where the keys are resource names and the values the data,
+        if the package holds several datasets
 
         Raises
         ----------
         CKANAPIError:
-            When attempt to retrieve resource information returns a CKANAPIError error,
-            likely because the resource was not found
+            When attempt to retrieve package information returns a CKANAPIError error,
+            likely because the package was not found
         Exception:
-            When the resource file format is not one of the following accepted values
-            (csv, xls, xlsx, xlsm, geojson, json, txt, shp)
+            When none of the resources of the package is in one of the preferred formats
 
         Examples
         ----------
         >>> from pyopendatato import ckanTO as ckanTO
         >>> ct = ckanTO()
-        >>> ct.get_resource("4d985c1d-9c7e-4f74-9864-73214f45eb4a")
-        >>> ct.get_resource("f1bf1cef-7d09-407c-80c2-bb2a8b75abfa")
+        >>> ct.get_package_data("e28bc818-43d5-43f7-b5d9-bdfb4eda5feb")
         """
 
+        resources = self.choose_package_resources(package_id, prefer=prefer)
+
+        if resources.empty:
+            raise Exception(
+                f"Package {package_id} has no resources in the preferred formats. "
+                "Please visit Open Data Toronto's website."
+            )
+
+        data = {
+            resource["name"]: self._get_package_resource(resource)
+            for _, resource in resources.iterrows()
+        }
+
+        if len(data) == 1:
+            data = data[next(iter(data))]
+
+        return data
+
+    def _get_package_resource(self, resource):
+        # DataStore resources chosen for the format of their file are loaded from the file
+        if resource["load_as"] == "DATASTORE" or not resource["datastore_active"]:
+            return self.get_resource(resource["id"])
+
         try:
-            resource_info = self.get_resource_metadata(resource_id=resource_id)
+            resource_info = self.get_resource_metadata(resource_id=resource["id"])
         except ckanapi.CKANAPIError as error:
             print(f"Encountered an error - {error}")
             raise
 
-        if resource_info["datastore_active"]:
-            return read_datastore(resource_id)
-
-        elif resource_info["format"] in [
-            "CSV",
-            "XLS",
-            "XLSX",
-            "XLSM",
-            "GEOJSON",
-            "JSON",
-            "TXT",
-        ]:
+        return self._load_resource(
+            resource["id"], dict(resource_info, datastore_active=False)
+        )
 
-            temp_file = Path(
-                tempfile.NamedTemporaryFile(suffix=resource_info["format"]).name
-            )
+    def get_package_union(
+        self, package_id, name=None, format=None, source_column="source", max_workers=4
+    ):
+        """
+        This downloads the resources of a package that are split by period (e.g. one per year)
+        concurrently, and combines them into a single table.
 
-            with requests.get(resource_info["url"]) as response:
-                with open(temp_file, "wb") as out_file:
-                    out_file.write(response.content)
+        Columns are matched across resources ignoring case, spacing and punctuation,
+        and their dtypes are widened to a common dtype (see utils.union_frames).
 
-            data = read_file(temp_file, resource_info["format"])
+        Parameters
+        ----------
+        package_id: str
+            Id for package
+        name: str, optional
+            Regular expression that resource names must contain (case insensitive)
+        format: str, optional
+            Format of the resources to combine, "DATASTORE" for resources in the DataStore
+        source_column: str, optional (default="source")
+            Name of the column recording which resource each row comes from.
+            None leaves it out
+        max_workers: int, optional (default=4)
+            Number of resources downloaded at the same time
 
-            temp_file.unlink()
-            return data
+        Returns
+        ----------
+        pandas.DataFrame:
+            Rows of all the matching resources, in the order of the package
 
-        elif resource_info["format"] in ["SHP"]:
+        Raises
+        ----------
+        CKANAPIError:
+            When attempt to retrieve package information returns a CKANAPIError error,
+            likely because the package was not found
+        Exception:
+            When no resource matches, or a matching resource is not a single table
 
-            temp_dir = download_extract_zipped_file(
-                url=resource_info["url"], file_ext="ZIP"
-            )
+        Examples
+        ----------
+        >>> from pyopendatato import ckanTO as ckanTO
+        >>> ct = ckanTO()
+        >>> ct.get_package_union("ttc-subway-delay-data", name=r"20\d\d", format="XLSX")
+        """
 
-            temp_file = next(temp_dir.glob("*.shp"))
+        # Packages without resources give a table without columns
+        resources = self.list_package_resources(package_id).reindex(
+            columns=RESOURCE_INFO_COLS
+        )
 
-            data = read_file(temp_file, resource_info["format"])
+        if name is not None:
+            resources = resources[
+                resources["name"].str.contains(name, case=False, regex=True)
+            ]
+
+        if format is not None:
+            if format.upper() == "DATASTORE":
+                resources = resources[resources["datastore_active"].astype(bool)]
+            else:
+                resources = resources[
+                    resources["format"].astype(str).str.upper() == format.upper()
+                ]
+
+        if resources.empty:
+            raise Exception(f"No resource of package {package_id} matches the filters.")
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            frames = list(executor.map(self.get_resource, resources["id"]))
+
+        for frame, resource_name in zip(frames, resources["name"]):
+            if not isinstance(frame, pd.DataFrame):
+                raise Exception(
+                    f"{resource_name} holds several tables and cannot be combined."
+                )
 
-            shutil.rmtree(temp_dir)
-            return data
+        return union_frames(
+            frames, list(resources["name"]), source_column=source_column
+        )
 
-        elif resource_info["format"] in ["GZ", "RAR", "ZIP"]:
+    def get_resource_metadata(self, resource_id):
+        """
+        This retrieves metadata about resources.
 
-            temp_dir = download_extract_zipped_file(
-                url=resource_info["url"], file_ext=resource_info["format"]
-            )
+        Parameters
+        ----------
+        resource_id: str
+            Id for resource
 
-            data_list = {}
-            for file in temp_dir.iterdir():
-
-                if file.suffix[1:] not in [
-                    "csv",
-                    "xls",
-                    "xlsx",
-                    "xlsm",
-                    "geojson",
-                    "json",
-                    "txt",
-                    "shp",
-                ]:
-                    raise Exception(
-                        f"{file.suffix[1:]} cannot be downloaded using pyopendatato. "
-                        "Please visit Open Data Toronto's website."
-                    )
+        Returns
+        ----------
+        dict:
+            Dictionary with metadata about resource specified,
+            such as format and URL
 
-                data_list[file.name] = read_file(file, file.suffix.upper()[1:])
+        Raises
+        ----------
+        CKANAPIError:
+            When attempt to retrieve resource information returns a CKANAPIError error,
+            likely because the resource was not found
+
+        Examples
+        ----------
+        >>> from pyopendatato import ckanTO as ckanTO
+        >>> ct = ckanTO()
+        >>> ct.get_resource_metadata("4d985c1d-9c7e-4f74-9864-73214f45eb4a")
+        """
+
+        try:
+            resource = self._resource_show(resource_id)
+        except ckanapi.CKANAPIError as error:
+            print(f"Encountered an error - {error}")
+            raise
+
+        return {k: (resource[k] if k in resource else "") for k in RESOURCE_INFO_COLS}
+
+    def get_resources_metadata(self, resource_ids, max_workers=8):
+        """
+        This retrieves metadata about many resources at once,
+        sending resource_show requests concurrently.
+
+        Parameters
+        ----------
+        resource_ids: list
+            Ids for resources
+        max_workers: int, optional (default=8)
+            Number of requests sent at the same time
+
+        Returns
+        ----------
+        pandas.DataFrame:
+            Table of resources, in the order of resource_ids, along with information
+            about them, such as format and URL
+
+        Raises
+        ----------
+        CKANAPIError:
+            When attempt to retrieve resource information returns a CKANAPIError error,
+            likely because a resource was not found
+
+        Examples
+        ----------
+        >>> from pyopendatato import ckanTO as ckanTO
+        >>> ct = ckanTO()
+        >>> ct.get_resources_metadata(["4d985c1d-9c7e-4f74-9864-73214f45eb4a"])
+        """
+
+        # CKAN has no action retrieving several resources by id in one request
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            resource_list = list(executor.map(self.get_resource_metadata, resource_ids))
+
+        return pd.DataFrame(resource_list, columns=RESOURCE_INFO_COLS)
+
+    def get_resource(self, resource_id, chunksize=None, arrow=False, nrows=None):
+        """
+        This downloads data from a given resource.
+
+        Parameters
+        ----------
+        resource_id: str
+            Id for resoruce
+        chunksize: int, optional
+            Option for reading the data in chunks of this many rows, instead of all at once.
+            Only DataStore and CSV resources can be read in chunks
+        arrow: boolean, optional (default=False)
+            Option for returning a pyarrow.Table, parsed by Arrow's multithreaded readers,
+            instead of a pandas.DataFrame. Only DataStore and CSV resources can be
+            returned as Arrow tables. Requires pyarrow to be installed
+        nrows: int, optional
+            Option for returning only the first rows of the data, downloading as little
+            as possible (see preview_resource)
+
+        Returns
+        ----------
+        A pandas.DataFrame, list or dict,
+        or a dict where the values can be a pd.DataFrame, list or dict,
+        depending on the resource file format.
+        If chunksize is given, an iterator of pandas.DataFrame instead.
+        If arrow is True, a pyarrow.Table instead.
+        If nrows is given, only the first rows of the data.
+        If the client has a memory_budget which the resource would exceed,
+        an iterator of pandas.DataFrame chunks instead (see ckanTO's over_budget)
+
+        Raises
+        ----------
+        CKANAPIError:
+            When attempt to retrieve resource information returns a CKANAPIError error,
+            likely because the resource was not found
+        Exception:
+            When the resource file format is not one of the following accepted values
+            (csv, xls, xlsx, xlsm, geojson, json, txt, shp)
+        MemoryBudgetError:
+            When the resource would exceed the memory_budget of the client,
+            and cannot be returned in chunks
+
+        Examples
+        ----------
+        >>> from pyopendatato import ckanTO as ckanTO
+        >>> ct = ckanTO()
+        >>> ct.get_resource("4d985c1d-9c7e-4f74-9864-73214f45eb4a")
+        >>> ct.get_resource("f1bf1cef-7d09-407c-80c2-bb2a8b75abfa")
+        >>> ct.get_resource("4d985c1d-9c7e-4f74-9864-73214f45eb4a", nrows=5)
+        >>> for chunk in ct.get_resource("4d985c1d-9c7e-4f74-9864-73214f45eb4a", chunksize=10000):
+        ...     print(len(chunk))
+        """
+
+        if nrows is not None:
+            if chunksize is not None or arrow:
+                raise Exception("nrows cannot be used with chunksize or arrow.")
+            return self.preview_resource(resource_id, nrows=nrows)
+
+        if chunksize is not None:
+            if arrow:
+                raise Exception("chunksize and arrow cannot be used together.")
+            return self._iter_resource(resource_id, chunksize)
+
+        estimate = None
+        if self.memory_budget is not None:
+            estimate = self.estimate_resource_memory(resource_id)
+            if estimate["bytes"] is not None and estimate["bytes"] > self.memory_budget:
+                return self._over_budget(resource_id, estimate, arrow)
+
+        # Concurrent requests for the same resource share a single download and parse,
+        # and each of them receives its own copy of the result
+        data, shared = self._single_flight.do(
+            ("get_resource", resource_id, arrow),
+            self._get_resource,
+            resource_id,
+            arrow=arrow,
+        )
+
+        if estimate is not None:
+            self.memory_reports[resource_id] = {
+                "estimated_bytes": estimate["bytes"],
+                "actual_bytes": memory_usage(data),
+            }
+
+        return copy_result(data) if shared else data
+
+    def estimate_resource_memory(self, resource_id):
+        """
+        This estimates the memory a resource would take once loaded by get_resource,
+        without downloading all of it.
+
+        DataStore and CSV resources are estimated from the footprint of a sample of rows,
+        scaled by the number of rows (or by the size of the file). Other formats are
+        estimated from the size of the file, using rough expansion ratios (FILE_EXPANSION).
+
+        Parameters
+        ----------
+        resource_id: str
+            Id for resource
+
+        Returns
+        ----------
+        dict:
+            Estimated number of rows, bytes per row and total bytes.
+            Values are None when they cannot be estimated, e.g. if the portal
+            does not report the size of the file
+
+        Raises
+        ----------
+        CKANAPIError:
+            When attempt to retrieve resource information returns a CKANAPIError error,
+            likely because the resource was not found
+
+        Examples
+        ----------
+        >>> from pyopendatato import ckanTO as ckanTO
+        >>> ct = ckanTO()
+        >>> ct.estimate_resource_memory("4d985c1d-9c7e-4f74-9864-73214f45eb4a")
+        """
+
+        try:
+            resource_info = self.get_resource_metadata(resource_id=resource_id)
+        except ckanapi.CKANAPIError as error:
+            print(f"Encountered an error - {error}")
+            raise
+
+        file_format = str(resource_info["format"]).upper()
+        estimate = {"rows": None, "bytes_per_row": None, "bytes": None}
+
+        if resource_info["datastore_active"]:
+            result = datastore_search(
+                resource_id,
+                MEMORY_SAMPLE_ROWS,
+                datastore_search_url=self.url + DATASTORE_SEARCH_PATH,
+                session=self.session,
+            )
+            sample = records_to_dataframe(result["records"])
+            estimate["rows"] = result["total"]
+            estimate["bytes_per_row"] = memory_usage(sample) / max(len(sample), 1)
+            estimate["bytes"] = int(estimate["rows"] * estimate["bytes_per_row"])
+            return estimate
+
+        size = self._resource_size(resource_id, resource_info)
+        if size is None:
+            return estimate
+
+        if file_format == "CSV":
+            head = download_head(
+                resource_info["url"], MEMORY_SAMPLE_ROWS + 1, session=self.session
+            )
+            head_size = len(head.getvalue())
+            sample = read_file_csv(head)
+            if len(sample):
+                # The header line is counted as a row, which slightly overestimates
+                estimate["rows"] = int(size / (head_size / (len(sample) + 1)))
+                estimate["bytes_per_row"] = memory_usage(sample) / len(sample)
+                estimate["bytes"] = int(estimate["rows"] * estimate["bytes_per_row"])
+                return estimate
+
+        estimate["bytes"] = int(size * FILE_EXPANSION.get(file_format, 1))
+        return estimate
+
+    def _resource_size(self, resource_id, resource_info):
+        # Size of the file of a resource, from the store or the Content-Length header
+        if self._use_store(resource_info):
+            suffix = _file_suffix(resource_info["format"])
+            path = self.store.get(resource_id, resource_info["last_modified"], suffix)
+            if path is not None:
+                # Stored text files are compressed
+                return self.store.content_size(path)
+
+        response = self.session.head(
+            resource_info["url"], allow_redirects=True, headers=IDENTITY_ENCODING
+        )
+        content_length = response.headers.get("Content-Length")
+        if not response.ok or content_length is None:
+            return None
+        return int(content_length)
+
+    def _over_budget(self, resource_id, estimate, arrow):
+        self.memory_reports[resource_id] = {
+            "estimated_bytes": estimate["bytes"],
+            "actual_bytes": None,
+        }
+
+        if self.over_budget == "chunks" and not arrow and estimate["bytes_per_row"]:
+            # Chunks take a quarter of the budget, leaving room for what is done with them
+            chunksize = max(1, int(self.memory_budget / 4 / estimate["bytes_per_row"]))
+            self.memory_reports[resource_id]["chunksize"] = chunksize
+            return self._iter_resource(resource_id, chunksize)
+
+        raise MemoryBudgetError(
+            f"Resource {resource_id} would take about {estimate['bytes'] / 1e6:.1f} MB "
+            f"in memory, over the budget of {self.memory_budget / 1e6:.1f} MB. "
+            "Read it in chunks with get_resource(chunksize=...) if it is a DataStore "
+            "or CSV resource, or raise the memory_budget."
+        )
+
+    def preview_resource(self, resource_id, nrows=10):
+        """
+        This downloads the first rows of a resource, transferring only what is needed where
+        the format allows it, to inspect its columns and dtypes without downloading all of it.
+
+        DataStore resources are limited on the portal, CSV and TXT files are streamed until
+        enough lines are received, and the members of ZIP archives are listed and the first
+        one is previewed using range requests. Other formats are downloaded in full,
+        but only the first rows are parsed.
+
+        Parameters
+        ----------
+        resource_id: str
+            Id for resource
+        nrows: int, optional (default=10)
+            Number of rows to return
+
+        Returns
+        ----------
+        The first rows of the data, in the same form as get_resource.
+        For archives, a dict where the keys are the filenames and the values are the preview
+        of the first supported file, or None for the other files
+
+        Raises
+        ----------
+        CKANAPIError:
+            When attempt to retrieve resource information returns a CKANAPIError error,
+            likely because the resource was not found
+        Exception:
+            When the resource file format is not one of the following accepted values
+            (csv, xls, xlsx, xlsm, geojson, json, txt, shp, gz, rar, zip)
+
+        Examples
+        ----------
+        >>> from pyopendatato import ckanTO as ckanTO
+        >>> ct = ckanTO()
+        >>> ct.preview_resource("4d985c1d-9c7e-4f74-9864-73214f45eb4a", nrows=5).dtypes
+        """
+
+        try:
+            resource_info = self.get_resource_metadata(resource_id=resource_id)
+        except ckanapi.CKANAPIError as error:
+            print(f"Encountered an error - {error}")
+            raise
+
+        file_format = str(resource_info["format"]).upper()
+
+        if resource_info["datastore_active"]:
+            return read_datastore_page(
+                resource_id,
+                0,
+                nrows,
+                datastore_search_url=self.url + DATASTORE_SEARCH_PATH,
+                session=self.session,
+            )
+
+        elif file_format in ["CSV", "TXT"]:
+            # A stored copy is read locally, otherwise only the first lines are downloaded
+            suffix = "." + file_format.lower()
+            if self._use_store(resource_info):
+                source = self.store.get(
+                    resource_id, resource_info["last_modified"], suffix
+                )
+                if source is not None:
+                    return read_file(source, file_format, nrows=nrows)
+
+            # CSV files have a header line
+            nlines = nrows + 1 if file_format == "CSV" else nrows
+            source = download_head(resource_info["url"], nlines, session=self.session)
+            return read_file(source, file_format, nrows=nrows)
+
+        elif file_format in ["XLS", "XLSX", "XLSM", "GEOJSON", "JSON"]:
+
+            suffix = "." + file_format.lower()
+
+            if self._use_store(resource_info):
+                with self._resource_file(
+                    resource_id, resource_info, suffix
+                ) as file_path:
+                    return read_file(file_path, file_format, nrows=nrows)
+
+            with open_download(
+                resource_info["url"],
+                suffix,
+                spill_threshold=self.spill_threshold,
+                session=self.session,
+                scratch=self.scratch,
+            ) as source:
+                return read_file(source, file_format, nrows=nrows)
+
+        elif file_format in ["SHP"]:
+
+            with self._extracted_resource(
+                resource_id, resource_info, ".zip"
+            ) as temp_dir:
+                return read_file(next(temp_dir.glob("*.shp")), file_format, nrows=nrows)
+
+        elif file_format in ["GZ", "RAR", "ZIP"]:
+
+            if file_format == "ZIP" and not self._use_store(resource_info):
+                remote_file = open_ranged(resource_info["url"], session=self.session)
+                if remote_file is not None:
+                    with remote_file, zipfile.ZipFile(remote_file) as archive:
+                        return _preview_zip(archive, nrows)
+
+            with self._extracted_resource(
+                resource_id, resource_info, "." + file_format.lower()
+            ) as temp_dir:
+                data_list = {}
+                for file in sorted(temp_dir.iterdir()):
+                    file_ext = file.suffix[1:].lower()
+                    if file_ext in PREVIEW_MEMBER_FORMATS and not any(
+                        data is not None for data in data_list.values()
+                    ):
+                        data_list[file.name] = read_file(file, file_ext, nrows=nrows)
+                    else:
+                        data_list[file.name] = None
+                return data_list
+
+        else:
+            raise Exception(
+                f"{resource_info['format']} cannot be downloaded using pyopendatato. "
+                "Please visit Open Data Toronto's website."
+            )
+
+    def get_resource_dask(self, resource_id, chunksize=100000):
+        """
+        This returns the data of a resource as a lazily evaluated, partitioned Dask DataFrame,
+        for tables too large to fit in memory. Requires dask to be installed.
+
+        For DataStore resources, each partition is a page of chunksize records,
+        fetched when the partition is computed. CSV resources are downloaded and split
+        into partitions by dask; without a cache_dir (or when it is compressed in the
+        cache_dir, as dask cannot split compressed files), the file is kept in the
+        scratch space until the ckanTO context exits.
+
+        Parameters
+        ----------
+        resource_id: str
+            Id for resource
+        chunksize: int, optional (default=100000)
+            Number of records per partition, for DataStore resources
+
+        Returns
+        ----------
+        dask.dataframe.DataFrame:
+            Data in table format
+
+        Raises
+        ----------
+        ImportError:
+            When dask is not installed
+        Exception:
+            When the resource is neither in the DataStore nor a CSV file
+
+        Examples
+        ----------
+        >>> from pyopendatato import ckanTO as ckanTO
+        >>> ct = ckanTO()
+        >>> df = ct.get_resource_dask("4d985c1d-9c7e-4f74-9864-73214f45eb4a")
+        >>> df.groupby("WARD").size().compute()
+        """
+
+        try:
+            import dask
+            import dask.dataframe as dd
+        except ImportError:
+            raise ImportError(
+                "get_resource_dask requires dask, "
+                "which can be installed with pip install dask[dataframe]"
+            )
+
+        resource_info = self.get_resource_metadata(resource_id=resource_id)
+
+        if resource_info["datastore_active"]:
+            datastore_search_url = self.url + DATASTORE_SEARCH_PATH
+            result = datastore_search(
+                resource_id,
+                1,
+                datastore_search_url=datastore_search_url,
+                session=self.session,
+            )
+
+            # Pages are cast to the declared column types, as the dtypes inferred
+            # from each page depend on its data (e.g. a null in a numeric column)
+            schema = fields_to_schema(result["fields"]) or None
+
+            partitions = [
+                dask.delayed(read_datastore_page)(
+                    resource_id,
+                    offset,
+                    chunksize,
+                    datastore_search_url=datastore_search_url,
+                    session=self.session,
+                    schema=schema,
+                )
+                for offset in range(0, max(result["total"], 1), chunksize)
+            ]
+
+            meta = apply_schema(pd.DataFrame(), schema) if schema else None
+            return dd.from_delayed(partitions, meta=meta)
+
+        elif resource_info["format"] == "CSV":
+            # The file is kept until the client is closed, as dask reads it lazily
+            file_path = self._lazy_files.enter_context(
+                self._resource_file(resource_id, resource_info, ".csv")
+            )
+
+            # dask cannot split compressed files into partitions,
+            # so files compressed in the store are decompressed to the scratch space
+            if file_path.suffix != ".csv":
+                compressed_path = file_path
+                file_path = self._lazy_files.enter_context(
+                    self.scratch.file(".csv", nbytes=extracted_size(compressed_path))
+                )
+                with open_file(compressed_path) as in_file, open(
+                    file_path, "wb"
+                ) as out_file:
+                    shutil.copyfileobj(in_file, out_file, DOWNLOAD_CHUNK_SIZE)
+
+            return dd.read_csv(str(file_path))
+
+        raise Exception(
+            f"{resource_info['format']} cannot be read in partitions using pyopendatato, "
+            "only DataStore and CSV resources can."
+        )
+
+    def _iter_resource(self, resource_id, chunksize):
+
+        resource_info = self.get_resource_metadata(resource_id=resource_id)
+
+        if resource_info["datastore_active"]:
+            return iter_datastore(
+                resource_id,
+                chunksize,
+                datastore_search_url=self.url + DATASTORE_SEARCH_PATH,
+                session=self.session,
+            )
+
+        elif resource_info["format"] == "CSV":
+            return self._iter_csv(resource_id, resource_info, chunksize)
+
+        raise Exception(
+            f"{resource_info['format']} cannot be read in chunks using pyopendatato, "
+            "only DataStore and CSV resources can."
+        )
+
+    def _iter_csv(self, resource_id, resource_info, chunksize):
+
+        schema = self._cached_schema(resource_id, resource_info)
+
+        if self._use_store(resource_info):
+            with self._resource_file(resource_id, resource_info, ".csv") as file_path:
+                yield from read_file_csv_chunks(file_path, chunksize, schema=schema)
+            return
+
+        # The temporary file is removed once the iterator is exhausted or closed
+        with open_download(
+            resource_info["url"],
+            ".csv",
+            spill_threshold=self.spill_threshold,
+            session=self.session,
+            scratch=self.scratch,
+        ) as source:
+            yield from read_file_csv_chunks(source, chunksize, schema=schema)
+
+    def get_spatial_index(self, resource_id):
+        """
+        This returns a spatial index over the features of a GEOJSON or SHP resource,
+        for fast batched point-to-feature lookups (e.g. finding the ward of addresses).
+
+        The index is kept in memory. If the client has a cache_dir (and pyarrow is installed),
+        its features are also stored as GeoParquet next to the downloaded file, keyed by
+        the version of the resource, so that other processes rebuild the index from them
+        instead of downloading and parsing the resource again.
+
+        Parameters
+        ----------
+        resource_id: str
+            Id for resource
+
+        Returns
+        ----------
+        pyopendatato.spatial.SpatialIndex:
+            Index over the features of the resource
+
+        Raises
+        ----------
+        CKANAPIError:
+            When attempt to retrieve resource information returns a CKANAPIError error,
+            likely because the resource was not found
+        Exception:
+            When the resource is not in a spatial format
+
+        Examples
+        ----------
+        >>> from pyopendatato import ckanTO as ckanTO
+        >>> ct = ckanTO(cache_dir="/var/cache/pyopendatato")
+        >>> wards = ct.get_spatial_index("1d2bf8d3-8e9a-4f5b-a1c5-7ab4c2f1a0e2")
+        >>> wards.lookup([(-79.3832, 43.6532), (-79.4163, 43.7001)])
+        """
+
+        # shapely is only needed for spatial resources
+        from .spatial import INDEX_FORMAT_VERSION, SpatialIndex
+
+        try:
+            resource_info = self.get_resource_metadata(resource_id=resource_id)
+        except ckanapi.CKANAPIError as error:
+            print(f"Encountered an error - {error}")
+            raise
+
+        if str(resource_info["format"]).upper() not in ["GEOJSON", "SHP"]:
+            raise Exception(
+                f"Spatial index is not available for {resource_info['format']} resources."
+            )
+
+        version = resource_info["last_modified"]
+        cached_version, index = self._spatial_indexes.get(resource_id, (None, None))
+        if index is not None and version and version == cached_version:
+            return index
+
+        def build_index():
+            return SpatialIndex(self._get_resource(resource_id))
+
+        built = []
+
+        def save_index(out_file):
+            built.append(build_index())
+            built[0].save(out_file)
+
+        # Features are stored as GeoParquet, which needs pyarrow
+        if self._use_store(resource_info) and importlib.util.find_spec("pyarrow"):
+            path = self.store.fetch(
+                resource_id,
+                version,
+                f".spatial-v{INDEX_FORMAT_VERSION}.parquet",
+                save_index,
+            )
+            index = built[0] if built else SpatialIndex.load(path)
+        else:
+            index, _ = self._single_flight.do(
+                ("spatial_index", resource_id), build_index
+            )
+
+        self._spatial_indexes[resource_id] = (version, index)
+        return index
+
+    def get_resource_schema(self, resource_id):
+        """
+        This returns the dtype of each column of a resource.
+
+        For DataStore resources, these are the column types declared on the portal,
+        which Arrow output and get_resource_dask are cast to (DataFrames returned by
+        get_resource keep the dtypes inferred from the records).
+        For other resources, these are the dtypes resolved when the resource was first read
+        (reading it now if needed), which are reused by later reads of CSV resources
+        instead of inferring them again. Schemas are kept for each version of a resource,
+        in memory and in the store if the client has a cache_dir.
+
+        Parameters
+        ----------
+        resource_id: str
+            Id for resource
+
+        Returns
+        ----------
+        dict:
+            pandas dtype for each column
+
+        Raises
+        ----------
+        CKANAPIError:
+            When attempt to retrieve resource information returns a CKANAPIError error,
+            likely because the resource was not found
+        Exception:
+            When the resource does not hold a single table
+
+        Examples
+        ----------
+        >>> from pyopendatato import ckanTO as ckanTO
+        >>> ct = ckanTO()
+        >>> ct.get_resource_schema("4d985c1d-9c7e-4f74-9864-73214f45eb4a")
+        """
+
+        try:
+            resource_info = self.get_resource_metadata(resource_id=resource_id)
+        except ckanapi.CKANAPIError as error:
+            print(f"Encountered an error - {error}")
+            raise
+
+        schema = self._cached_schema(resource_id, resource_info)
+        if schema is not None:
+            return schema
+
+        if resource_info["datastore_active"]:
+            fields = datastore_search(
+                resource_id,
+                0,
+                datastore_search_url=self.url + DATASTORE_SEARCH_PATH,
+                session=self.session,
+            )["fields"]
+            schema = fields_to_schema(fields)
+        else:
+            data = self.get_resource(resource_id)
+            # Reading a CSV resource records its schema
+            schema = self._cached_schema(resource_id, resource_info)
+            if schema is None:
+                if not isinstance(data, pd.DataFrame):
+                    raise Exception(
+                        f"Resource {resource_id} does not hold a single table."
+                    )
+                schema = frame_schema(data)
+
+        self._record_schema(resource_id, resource_info, schema)
+        return schema
+
+    def prefetch_resource(self, resource_id, resource_info=None):
+        """
+        This downloads and parses a resource ahead of time, and keeps the data in memory
+        so that later calls to get_resource return it without downloading it again,
+        until a new version of the resource is published.
+
+        Parameters
+        ----------
+        resource_id: str
+            Id for resource
+        resource_info: dict, optional
+            Metadata about the resource, as returned by get_resource_metadata.
+            Retrieved from the portal if not given
+
+        Examples
+        ----------
+        >>> from pyopendatato import ckanTO as ckanTO
+        >>> ct = ckanTO()
+        >>> ct.prefetch_resource("4d985c1d-9c7e-4f74-9864-73214f45eb4a")
+        """
+
+        if resource_info is None:
+            resource_info = self.get_resource_metadata(resource_id=resource_id)
+
+        data = self._load_resource(resource_id, resource_info)
+        self._prefetched[resource_id] = (resource_info["last_modified"], data)
+
+    def _get_resource(self, resource_id, arrow=False):
+
+        try:
+            resource_info = self.get_resource_metadata(resource_id=resource_id)
+        except ckanapi.CKANAPIError as error:
+            print(f"Encountered an error - {error}")
+            raise
+
+        if arrow:
+            return self._load_resource_arrow(resource_id, resource_info)
+
+        version, data = self._prefetched.get(resource_id, (None, None))
+        if data is not None and version and version == resource_info["last_modified"]:
+            return copy_result(data)
+
+        return self._load_resource(resource_id, resource_info)
+
+    def _load_resource_arrow(self, resource_id, resource_info):
+
+        if resource_info["datastore_active"]:
+            return self._read_datastore(resource_id, resource_info, arrow=True)
+
+        elif resource_info["format"] == "CSV":
+
+            if self._use_store(resource_info):
+                with self._resource_file(
+                    resource_id, resource_info, ".csv"
+                ) as file_path:
+                    return read_file_arrow(file_path, "CSV")
+
+            with open_download(
+                resource_info["url"],
+                ".csv",
+                spill_threshold=self.spill_threshold,
+                session=self.session,
+                scratch=self.scratch,
+            ) as source:
+                return read_file_arrow(source, "CSV")
+
+        raise Exception(
+            f"{resource_info['format']} cannot be returned as an Arrow table using "
+            "pyopendatato, only DataStore and CSV resources can."
+        )
+
+    def _load_resource(self, resource_id, resource_info):
+
+        file_format = resource_info["format"]
+        if (
+            resource_info["datastore_active"]
+            or file_format not in FILE_FORMATS
+            or not self._use_store(resource_info)
+        ):
+            return self._parse_resource(resource_id, resource_info)
+
+        suffix = _file_suffix(file_format)
+        with self._resource_file(resource_id, resource_info, suffix) as file_path:
+            digest = self.store.digest(file_path)
+            shared = self.store.is_shared(file_path)
+
+        parse = partial(self._parse_resource, resource_id, resource_info)
+        if not shared:
+            return parse()
+
+        return self._parse_once((digest, file_format), parse)
+
+    def _parse_once(self, key, parse):
+        """
+        Parses a file published under several resources once for its content,
+        keeping the result in memory (up to PARSED_CACHE_BYTES) for the other resources.
+        """
+
+        with self._parsed_lock:
+            if key in self._parsed:
+                self._parsed.move_to_end(key)
+                return copy_result(self._parsed[key][0])
+
+        data, _ = self._single_flight.do(("parse",) + key, parse)
+        size = memory_usage(data)
+
+        with self._parsed_lock:
+            if key not in self._parsed and size <= PARSED_CACHE_BYTES:
+                self._parsed[key] = (data, size)
+                self._parsed_bytes += size
+                while self._parsed_bytes > PARSED_CACHE_BYTES:
+                    _, (_, evicted_size) = self._parsed.popitem(last=False)
+                    self._parsed_bytes -= evicted_size
+
+        return copy_result(data)
+
+    def _parse_resource(self, resource_id, resource_info):
+
+        if resource_info["datastore_active"]:
+            return self._read_datastore(resource_id, resource_info)
+
+        elif resource_info["format"] in [
+            "CSV",
+            "XLS",
+            "XLSX",
+            "XLSM",
+            "GEOJSON",
+            "JSON",
+            "TXT",
+        ]:
+
+            suffix = "." + resource_info["format"].lower()
+
+            if resource_info["format"] == "CSV":
+                read = partial(self._read_csv, resource_id, resource_info)
+            else:
+                read = partial(read_file, file_ext=resource_info["format"])
+
+            if self._use_store(resource_info):
+                with self._resource_file(
+                    resource_id, resource_info, suffix
+                ) as file_path:
+                    return read(file_path)
+
+            with open_download(
+                resource_info["url"],
+                suffix,
+                spill_threshold=self.spill_threshold,
+                session=self.session,
+                scratch=self.scratch,
+            ) as source:
+                return read(source)
+
+        elif resource_info["format"] in ["SHP"]:
+
+            with self._extracted_resource(
+                resource_id, resource_info, ".zip"
+            ) as temp_dir:
+                temp_file = next(temp_dir.glob("*.shp"))
+
+                return read_file(temp_file, resource_info["format"])
+
+        elif resource_info["format"] in ["GZ", "RAR", "ZIP"]:
 
-            shutil.rmtree(temp_dir)
-            return data_list
+            with self._extracted_resource(
+                resource_id, resource_info, "." + resource_info["format"].lower()
+            ) as temp_dir:
+                data_list = {}
+                for file in sorted(temp_dir.iterdir()):
+
+                    if file.suffix[1:] not in [
+                        "csv",
+                        "xls",
+                        "xlsx",
+                        "xlsm",
+                        "geojson",
+                        "json",
+                        "txt",
+                        "shp",
+                    ]:
+                        raise Exception(
+                            f"{file.suffix[1:]} cannot be downloaded using pyopendatato. "
+                            "Please visit Open Data Toronto's website."
+                        )
+
+                    data_list[file.name] = read_file(file, file.suffix.upper()[1:])
+
+                return data_list
 
         else:
             raise Exception(
@@ -0,0 +1,450 @@
+# -*- coding: utf-8 -*-
+
+"""
+Command line interface for pyopendatato.
+
+Usage:
+
+    pyopendatato mirror all --output-dir mirror/
+    pyopendatato mirror ttc-subway-delay-data --search "bike share" --workers 8 --format parquet
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+import pandas as pd
+
+from .ckanTO import _resource_table, ckanTO
+from .store import _safe_name
+from .utils import DOWNLOAD_CHUNK_SIZE, download_file, open_file
+
+# Exit codes, so that cron jobs can tell partial failures from complete ones
+# (argparse exits with 2 on invalid arguments)
+EXIT_OK = 0
+EXIT_PARTIAL = 1
+EXIT_FAILED = 3
+
+OUTPUT_FORMATS = ["raw", "csv", "parquet"]
+
+# Formats that get_resource can parse, for the csv and parquet output formats
+TABLE_FORMATS = [
+    "CSV",
+    "XLS",
+    "XLSX",
+    "XLSM",
+    "GEOJSON",
+    "JSON",
+    "TXT",
+    "SHP",
+    "GZ",
+    "RAR",
+    "ZIP",
+]
+
+MANIFEST_NAME = "manifest.json"
+
+SEARCH_PAGE_SIZE = 1000
+
+
+def resolve_packages(client, targets, searches=(), max_workers=8):
+    """
+    Retrieves the packages to mirror, with their resources.
+
+    Parameters
+    ----------
+    client: pyopendatato.ckanTO.ckanTO
+        Client to query the portal with
+    targets: list
+        Package ids or names, or "all" for every package in the portal
+    searches: list, optional
+        Search terms, matched against package titles
+    max_workers: int, optional (default=8)
+        Number of package_show requests sent at the same time,
+        for packages the search does not return
+
+    Returns
+    ----------
+    list:
+        Package metadata, as returned by package_search, without duplicates
+    """
+
+    queries = [f'title:"{term}"' for term in searches]
+    names = [target for target in targets if target != "all"]
+
+    if "all" in targets:
+        queries = [None]
+
+    packages = {}
+    for fq in queries:
+        start = 0
+        while True:
+            results = client.remoteckan.action.package_search(
+                fq=fq or "", rows=SEARCH_PAGE_SIZE, start=start
+            )
+            for package in results["results"]:
+                # The search results are complete, so later lookups need no requests
+                packages[package["id"]] = package
+                client._cache_package(package["id"], package)
+                client._cache_package(package["name"], package)
+
+            start += len(results["results"])
+            if not results["results"] or start >= results["count"]:
+                break
+
+    found = {
+        key for package in packages.values() for key in (package["id"], package["name"])
+    }
+    missing = [name for name in dict.fromkeys(names) if name not in found]
+    if missing:
+        for package in client._packages_show(missing, max_workers=max_workers):
+            packages.setdefault(package["id"], package)
+
+    return list(packages.values())
+
+
+def _write_atomic(path, write):
+    # Readers of the mirror never see partially written files
+    temp_path = path.parent / f".{path.name}.tmp"
+    try:
+        with open(temp_path, "wb") as out_file:
+            write(out_file)
+        os.replace(temp_path, path)
+    finally:
+        if temp_path.exists():
+            temp_path.unlink()
+
+
+def _write_table(data, path, output_format):
+    if output_format == "parquet":
+        _write_atomic(path, lambda out_file: data.to_parquet(out_file))
+    else:
+        _write_atomic(
+            path,
+            lambda out_file: out_file.write(data.to_csv(index=False).encode("utf-8")),
+        )
+
+
+def _has_table(data):
+    if isinstance(data, pd.DataFrame):
+        return True
+    return isinstance(data, dict) and any(_has_table(value) for value in data.values())
+
+
+def _write_data(data, base, output_format):
+    # Tables are written in the output format, other data (JSON, text) as JSON.
+    # Archives mixing both are written member by member, so that no table is written as JSON
+    if isinstance(data, pd.DataFrame):
+        path = base.with_name(base.name + "." + output_format)
+        _write_table(data, path, output_format)
+        return [path]
+
+    if _has_table(data):
+        paths = []
+        for key, value in data.items():
+            paths += _write_data(
+                value, base.with_name(f"{base.name}-{_safe_name(key)}"), output_format
+            )
+        return paths
+
+    path = base.with_name(base.name + ".json")
+    _write_atomic(
+        path,
+        lambda out_file: out_file.write(json.dumps(data, default=str).encode("utf-8")),
+    )
+    return [path]
+
+
+def mirror_resource(client, resource, package_dir, output_format="raw"):
+    """
+    Writes a resource to the mirror.
+
+    Parameters
+    ----------
+    client: pyopendatato.ckanTO.ckanTO
+        Client to download the resource with
+    resource: dict
+        Metadata about the resource, as returned by get_resource_metadata
+    package_dir: pathlib.Path
+        Directory of the package the resource belongs to
+    output_format: str, optional (default="raw")
+        "raw" keeps the files as published (DataStore resources are written as CSV),
+        "csv" and "parquet" write the parsed tables.
+        Files are downloaded through the store of the client if it has one
+
+    Returns
+    ----------
+    list:
+        Paths of the files written
+    """
+
+    package_dir.mkdir(parents=True, exist_ok=True)
+    # Resources of a package can share a name, e.g. the same data in several formats
+    base = package_dir / f"{_safe_name(resource['name'])}-{_safe_name(resource['id'])}"
+    file_format = str(resource["format"]).upper()
+
+    if output_format == "raw" and not resource["datastore_active"]:
+        # Zipped shapefiles are published with the SHP format
+        suffix = "zip" if file_format == "SHP" else file_format.lower() or "bin"
+        path = base.with_name(base.name + "." + suffix)
+
+        if not client._use_store(resource):
+            _write_atomic(
+                path,
+                lambda out_file: download_file(
+                    resource["url"], out_file, session=client.session
+                ),
+            )
+            return [path]
+
+        # Files in the store are copied from there, decompressing them if needed
+        with client._resource_file(resource["id"], resource, "." + suffix) as source:
+            with open_file(source) as in_file:
+                _write_atomic(
+                    path,
+                    lambda out_file: shutil.copyfileobj(
+                        in_file, out_file, DOWNLOAD_CHUNK_SIZE
+                    ),
+                )
+        return [path]
+
+    data = client.get_resource(resource["id"])
+    return _write_data(data, base, "csv" if output_format == "raw" else output_format)
+
+
+def _load_manifest(path):
+    if not path.exists():
+        return {}
+    with open(path, "r", encoding="utf-8") as in_file:
+        return json.load(in_file)
+
+
+def _is_unchanged(entry, resource, output_format, output_dir):
+    return (
+        entry is not None
+        and bool(resource["last_modified"])
+        and entry["last_modified"] == resource["last_modified"]
+        and entry["output_format"] == output_format
+        and all((output_dir / name).exists() for name in entry["files"])
+    )
+
+
+def mirror(
+    client,
+    targets,
+    output_dir,
+    searches=(),
+    formats=None,
+    output_format="raw",
+    workers=4,
+    out=None,
+):
+    """
+    Downloads every resource of the matching packages to a directory,
+    skipping resources that have not changed since the previous run.
+
+    Parameters
+    ----------
+    client: pyopendatato.ckanTO.ckanTO
+        Client to download the resources with
+    targets: list
+        Package ids or names, or "all" for every package in the portal
+    output_dir: str or pathlib.Path
+        Directory to write the mirror to, with one directory per package (named by its id)
+        and a manifest of the versions mirrored
+    searches: list, optional
+        Search terms, matched against package titles
+    formats: list, optional
+        Formats of the resources to mirror, "DATASTORE" for resources in the DataStore.
+        Defaults to all formats
+    output_format: str, optional (default="raw")
+        One of OUTPUT_FORMATS, see mirror_resource
+    workers: int, optional (default=4)
+        Number of resources downloaded at the same time
+    out: file object, optional
+        Where failed resources are reported (defaults to sys.stderr)
+
+    Returns
+    ----------
+    dict:
+        Number of resources mirrored, unchanged, skipped and failed,
+        bytes written and elapsed seconds
+    """
+
+    start = time.perf_counter()
+    out = out or sys.stderr
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    manifest_path = output_dir / MANIFEST_NAME
+    manifest = _load_manifest(manifest_path)
+
+    packages = resolve_packages(client, targets, searches, max_workers=workers)
+    resources = _resource_table(packages)
+
+    formats = [f.upper() for f in formats] if formats else None
+    stats = {"mirrored": 0, "unchanged": 0, "skipped": 0, "failed": 0, "bytes": 0}
+
+    to_mirror = []
+    for resource in resources.to_dict("records"):
+        file_format = str(resource["format"]).upper()
+        keys = [file_format] + (["DATASTORE"] if resource["datastore_active"] else [])
+
+        if formats is not None and not set(keys) & set(formats):
+            stats["skipped"] += 1
+        elif (
+            output_format != "raw"
+            and not resource["datastore_active"]
+            and file_format not in TABLE_FORMATS
+        ):
+            stats["skipped"] += 1
+        elif _is_unchanged(
+            manifest.get(resource["id"]), resource, output_format, output_dir
+        ):
+            stats["unchanged"] += 1
+        else:
+            to_mirror.append(resource)
+
+    def mirror_one(resource):
+        package_dir = output_dir / _safe_name(resource["package_id"])
+        return mirror_resource(client, resource, package_dir, output_format)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(mirror_one, resource): resource for resource in to_mirror
+        }
+        for future in as_completed(futures):
+            resource = futures[future]
+            try:
+                paths = future.result()
+            except Exception as error:
+                stats["failed"] += 1
+                print(
+                    f"Failed {resource['id']} ({resource['name']}) - {error}", file=out
+                )
+                continue
+
+            stats["mirrored"] += 1
+            stats["bytes"] += sum(path.stat().st_size for path in paths)
+            manifest[resource["id"]] = {
+                "package_id": resource["package_id"],
+                "last_modified": resource["last_modified"],
+                "output_format": output_format,
+                "files": [str(path.relative_to(output_dir)) for path in paths],
+            }
+
+    _write_atomic(
+        manifest_path,
+        lambda out_file: out_file.write(json.dumps(manifest, indent=2).encode("utf-8")),
+    )
+
+    stats["seconds"] = time.perf_counter() - start
+    return stats
+
+
+def print_summary(stats, out=None):
+    """
+    Prints the throughput of a mirror run.
+    """
+
+    out = out or sys.stdout
+    seconds = max(stats["seconds"], 1e-9)
+    print(
+        f"Mirrored {stats['mirrored']} resources ({stats['unchanged']} unchanged, "
+        f"{stats['skipped']} skipped, {stats['failed']} failed) "
+        f"in {stats['seconds']:.1f} s: {stats['mirrored'] / seconds:.2f} resources/s, "
+        f"{stats['bytes'] / seconds / 1e6:.2f} MB/s",
+        file=out,
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="pyopendatato",
+        description="Download data from City of Toronto's Open Data Portal.",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    mirror_parser = subparsers.add_parser(
+        "mirror",
+        help="Download every resource of the matching packages to a directory",
+        epilog=(
+            f"Exit codes: {EXIT_OK} if every resource was mirrored or unchanged, "
+            f"{EXIT_PARTIAL} if some resources failed, 2 for invalid arguments, "
+            f"{EXIT_FAILED} if every resource failed or the packages could not be listed."
+        ),
+    )
+    mirror_parser.add_argument(
+        "packages", nargs="*", help='Package ids or names, or "all" for every package'
+    )
+    mirror_parser.add_argument(
+        "--search",
+        action="append",
+        default=[],
+        help="Also mirror packages whose title matches these terms (repeatable)",
+    )
+    mirror_parser.add_argument(
+        "--output-dir", "-o", default=".", help="Directory to write to"
+    )
+    mirror_parser.add_argument(
+        "--format",
+        dest="output_format",
+        choices=OUTPUT_FORMATS,
+        default="raw",
+        help="Keep files as published (raw), or write parsed tables as csv or parquet",
+    )
+    mirror_parser.add_argument(
+        "--resource-formats",
+        nargs="+",
+        help="Only mirror resources in these formats (DATASTORE for DataStore resources)",
+    )
+    mirror_parser.add_argument(
+        "--workers", type=int, default=4, help="Number of parallel downloads"
+    )
+    mirror_parser.add_argument(
+        "--cache-dir", help="Download store shared with other ckanTO clients"
+    )
+    mirror_parser.add_argument("--url", help="Address of the CKAN instance")
+
+    args = parser.parse_args(argv)
+
+    if not args.packages and not args.search:
+        mirror_parser.error("give package ids, search terms or all")
+    if args.workers < 1:
+        mirror_parser.error("--workers must be at least 1")
+
+    kwargs = {"cache_dir": args.cache_dir, "cache_metadata": True}
+    if args.url:
+        kwargs["url"] = args.url
+
+    with ckanTO(**kwargs) as client:
+        try:
+            stats = mirror(
+                client,
+                args.packages,
+                args.output_dir,
+                searches=args.search,
+                formats=args.resource_formats,
+                output_format=args.output_format,
+                workers=args.workers,
+            )
+        except Exception as error:
+            print(f"Encountered an error - {error}", file=sys.stderr)
+            return EXIT_FAILED
+
+    print_summary(stats)
+
+    if stats["failed"] and not stats["mirrored"] and not stats["unchanged"]:
+        return EXIT_FAILED
+    if stats["failed"]:
+        return EXIT_PARTIAL
+    return EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
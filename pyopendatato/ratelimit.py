@@ -0,0 +1,318 @@
+# -*- coding: utf-8 -*-
+
+import email.utils
+import random
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import requests
+from urllib3.util import make_headers
+
+RETRY_STATUS_CODES = (429, 503)
+
+# Compressions the responses can be decoded from as they are streamed: gzip and deflate,
+# and br or zstd when the brotli or zstandard packages are installed
+ACCEPT_ENCODING = make_headers(accept_encoding=True)["accept-encoding"]
+
+
+class TokenBucket(object):
+    """
+    Token bucket limiting the rate at which requests are sent.
+
+    Parameters
+    ----------
+    rate: float or None
+        Number of tokens added per second. None disables rate limiting
+    capacity: float
+        Maximum number of tokens that can accumulate, i.e. the largest burst allowed
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Blocks until a token is available, then takes it.
+        """
+
+        if self.rate is None and self._paused_until <= time.monotonic():
+            return
+
+        while True:
+            with self._lock:
+                now = time.monotonic()
+
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                elif self.rate is None:
+                    return
+                else:
+                    self._tokens = min(
+                        self.capacity, self._tokens + (now - self._updated) * self.rate
+                    )
+                    self._updated = now
+
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+
+                    wait = (1 - self._tokens) / self.rate
+
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """
+        Stops handing out tokens for the given number of seconds, and empties the bucket.
+        """
+
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0
+            self._updated = self._paused_until
+
+
+class AIMDLimiter(object):
+    """
+    Concurrency limit with additive increase and multiplicative decrease (AIMD).
+
+    The limit grows by roughly one slot for every `limit` successful requests,
+    and is cut by `decrease` whenever the server signals that it is overloaded.
+
+    Parameters
+    ----------
+    initial: int
+        Starting number of requests allowed in flight
+    minimum: int
+        Lowest the limit can be cut to
+    maximum: int
+        Highest the limit can grow to
+    decrease: float
+        Factor the limit is multiplied by when throttled
+    """
+
+    def __init__(self, initial=4, minimum=1, maximum=16, decrease=0.5):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease = decrease
+        self._in_flight = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self._in_flight >= int(self.limit):
+                self._condition.wait()
+            self._in_flight += 1
+
+    def release(self):
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self):
+        with self._condition:
+            self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._condition.notify_all()
+
+    def on_throttle(self):
+        with self._condition:
+            self.limit = max(self.minimum, self.limit * self.decrease)
+
+
+class RateLimiter(object):
+    """
+    Shared limit on outbound requests, combining a token bucket (requests per second)
+    with an AIMD concurrency limit (requests in flight).
+
+    Parameters
+    ----------
+    rate: float or None, optional (default=10)
+        Sustained requests per second. None disables the rate limit
+    burst: float, optional (default=20)
+        Number of requests that can be sent at once after a quiet period
+    max_concurrency: int, optional (default=16)
+        Upper bound for the number of requests in flight
+    """
+
+    def __init__(self, rate=10, burst=20, max_concurrency=16):
+        self.bucket = TokenBucket(rate, burst)
+        self.concurrency = AIMDLimiter(
+            initial=min(4, max_concurrency), maximum=max_concurrency
+        )
+
+    def acquire(self):
+        """
+        Blocks until a request can be sent.
+
+        Returns
+        ----------
+        callable:
+            Function releasing the slot taken by the request, which can be called repeatedly
+        """
+
+        self.concurrency.acquire()
+        try:
+            self.bucket.acquire()
+        except BaseException:
+            self.concurrency.release()
+            raise
+
+        lock = threading.Lock()
+        released = []
+
+        def release():
+            with lock:
+                if released:
+                    return
+                released.append(True)
+            self.concurrency.release()
+
+        return release
+
+    @contextmanager
+    def slot(self):
+        """
+        Context manager held for the duration of a single request.
+        """
+
+        release = self.acquire()
+        try:
+            yield
+        finally:
+            release()
+
+    def on_success(self):
+        self.concurrency.on_success()
+
+    def on_throttle(self, delay):
+        self.concurrency.on_throttle()
+        self.bucket.pause(delay)
+
+
+class RateLimitedSession(requests.Session):
+    """
+    requests.Session sending every request through a RateLimiter,
+    and retrying throttled (429) or unavailable (503) responses.
+
+    Every compression that can be decoded is accepted (see ACCEPT_ENCODING),
+    responses are decoded as they are read.
+
+    The Retry-After header is honoured when present, otherwise requests are retried
+    with exponential backoff and jitter.
+
+    Streamed requests (stream=True) hold their slot of the concurrency limit
+    until the response is closed, so that the limit also applies to body transfers.
+
+    Parameters
+    ----------
+    rate_limiter: RateLimiter, optional
+        Limiter to share with other sessions (defaults to DEFAULT_RATE_LIMITER)
+    max_retries: int, optional (default=5)
+        Number of retries before the throttled response is returned to the caller
+    backoff: float, optional (default=1)
+        Base delay in seconds for exponential backoff
+    max_backoff: float, optional (default=60)
+        Longest delay in seconds between retries
+    """
+
+    def __init__(self, rate_limiter=None, max_retries=5, backoff=1, max_backoff=60):
+        super().__init__()
+        self.headers["Accept-Encoding"] = ACCEPT_ENCODING
+        self.rate_limiter = rate_limiter or DEFAULT_RATE_LIMITER
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    def request(self, method, url, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            release = self.rate_limiter.acquire()
+            try:
+                response = super().request(method, url, **kwargs)
+            except BaseException:
+                release()
+                raise
+
+            if response.status_code not in RETRY_STATUS_CODES:
+                # Server errors other than throttling do not grow the limit
+                if response.status_code < 400:
+                    self.rate_limiter.on_success()
+
+                if kwargs.get("stream"):
+                    _release_on_close(response, release)
+                else:
+                    release()
+                return response
+
+            release()
+
+            delay = retry_after(response)
+            if delay is None:
+                delay = min(self.max_backoff, self.backoff * 2**attempt)
+                delay *= random.uniform(0.5, 1)
+            self.rate_limiter.on_throttle(delay)
+
+            if attempt == self.max_retries:
+                return response
+            response.close()
+
+
+def _release_on_close(response, release):
+    # The body of a streamed response is still being transferred after request returns
+    close = response.close
+
+    def close_and_release():
+        try:
+            close()
+        finally:
+            release()
+
+    response.close = close_and_release
+    # Responses that are never closed release their slot once garbage collected
+    weakref.finalize(response, release)
+
+
+def retry_after(response):
+    """
+    Reads the Retry-After header of a response.
+
+    Parameters
+    ----------
+    response: requests.Response
+        Throttled response
+
+    Returns
+    ----------
+    float or None:
+        Number of seconds to wait, or None if the header is missing or invalid
+    """
+
+    value = response.headers.get("Retry-After")
+    if value is None:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+DEFAULT_RATE_LIMITER = RateLimiter()
+
+DEFAULT_SESSION = RateLimitedSession(DEFAULT_RATE_LIMITER)
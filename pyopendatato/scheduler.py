@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+
+# Time between refreshes for the refresh_rate values used by the portal.
+# None means the package is not expected to change
+REFRESH_INTERVALS = {
+    "real-time": timedelta(minutes=15),
+    "daily": timedelta(days=1),
+    "weekly": timedelta(weeks=1),
+    "bi-weekly": timedelta(weeks=2),
+    "monthly": timedelta(days=30),
+    "quarterly": timedelta(days=91),
+    "semi-annually": timedelta(days=182),
+    "bi-annually": timedelta(days=182),
+    "annually": timedelta(days=365),
+    "will not be refreshed": None,
+}
+
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class PrefetchScheduler(object):
+    """
+    Watches packages and resources, and prefetches new versions in the background
+    as they are published, so that reads through the client always hit warm data.
+
+    How often a package is polled depends on its refresh_rate and last_refreshed date:
+    it is checked when the next refresh is due, then every retry_interval until the
+    new version appears. Packages refreshed "As available" are polled every
+    default_interval.
+
+    Parameters
+    ----------
+    client: pyopendatato.ckanTO.ckanTO
+        Client to prefetch resources into (see ckanTO.prefetch_resource)
+    package_ids: list, optional
+        Packages for which all resources are watched
+    resource_ids: list, optional
+        Individual resources to watch
+    default_interval: float, optional (default=3600)
+        Seconds between polls for packages without a regular refresh rate
+    retry_interval: float, optional (default=900)
+        Seconds between polls for packages whose refresh is overdue
+    max_workers: int, optional (default=4)
+        Number of resources prefetched at the same time
+
+    Examples
+    ----------
+    >>> from pyopendatato.ckanTO import ckanTO
+    >>> from pyopendatato.scheduler import PrefetchScheduler
+    >>> ct = ckanTO()
+    >>> scheduler = PrefetchScheduler(ct, package_ids=["e28bc818-43d5-43f7-b5d9-bdfb4eda5feb"])
+    >>> scheduler.start()
+    >>> ct.get_resource("4d985c1d-9c7e-4f74-9864-73214f45eb4a")
+    """
+
+    def __init__(
+        self,
+        client,
+        package_ids=(),
+        resource_ids=(),
+        default_interval=3600,
+        retry_interval=900,
+        max_workers=4,
+    ):
+        self.client = client
+        self.default_interval = timedelta(seconds=default_interval)
+        self.retry_interval = timedelta(seconds=retry_interval)
+        self.max_workers = max_workers
+
+        self._watched = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+        for package_id in package_ids:
+            self.watch_package(package_id)
+        for resource_id in resource_ids:
+            self.watch_resource(resource_id)
+
+    def watch_package(self, package_id):
+        """
+        Starts watching all resources of a package.
+        """
+
+        with self._lock:
+            state = self._watched.setdefault(package_id, self._new_state())
+            state["resource_ids"] = None
+
+    def watch_resource(self, resource_id):
+        """
+        Starts watching a single resource.
+        """
+
+        package_id = self.client.get_resource_metadata(resource_id)["package_id"]
+
+        with self._lock:
+            state = self._watched.setdefault(package_id, self._new_state(set()))
+            if state["resource_ids"] is not None:
+                state["resource_ids"].add(resource_id)
+
+    @staticmethod
+    def _new_state(resource_ids=None):
+        # Newly watched packages are polled on the next pass
+        return {
+            "resource_ids": resource_ids,
+            "versions": {},
+            "next_poll": datetime.min,
+        }
+
+    def next_poll(self, refresh_rate, last_refreshed, now=None):
+        """
+        Works out when a package should next be polled.
+
+        Parameters
+        ----------
+        refresh_rate: str
+            Refresh rate of the package, e.g. "Daily"
+        last_refreshed: str
+            Date the package was last refreshed
+        now: datetime.datetime, optional
+            Current time (naive, in UTC)
+
+        Returns
+        ----------
+        datetime.datetime or None:
+            Time of the next poll, or None if the package is not expected to change
+        """
+
+        now = now or _utcnow()
+        key = str(refresh_rate or "").strip().lower()
+
+        if key not in REFRESH_INTERVALS:
+            return now + self.default_interval
+
+        interval = REFRESH_INTERVALS[key]
+        if interval is None:
+            return None
+
+        try:
+            due = pd.Timestamp(last_refreshed).to_pydatetime() + interval
+        except (TypeError, ValueError):
+            return now + min(interval, self.default_interval)
+
+        if due.tzinfo is not None:
+            due = due.astimezone(timezone.utc).replace(tzinfo=None)
+
+        return due if due > now else now + min(interval, self.retry_interval)
+
+    def run_pending(self, now=None):
+        """
+        Polls the packages that are due, and prefetches resources with new versions.
+
+        Parameters
+        ----------
+        now: datetime.datetime, optional
+            Current time (naive, in UTC)
+
+        Returns
+        ----------
+        list:
+            Ids of the resources that were prefetched
+        """
+
+        now = now or _utcnow()
+
+        with self._lock:
+            due = [
+                (package_id, state)
+                for package_id, state in self._watched.items()
+                if state["next_poll"] is not None and state["next_poll"] <= now
+            ]
+
+        to_prefetch = []
+        for package_id, state in due:
+            # Polling must see the current metadata, not a cached copy
+            self.client.invalidate_package(package_id)
+            try:
+                package = self.client.get_package_metadata(package_id)
+            except Exception as error:
+                print(f"Encountered an error - {error}")
+                state["next_poll"] = now + self.retry_interval
+                continue
+
+            for resource in package["resources"]:
+                watched = state["resource_ids"]
+                if watched is not None and resource["id"] not in watched:
+                    continue
+                if state["versions"].get(resource["id"]) != resource["last_modified"]:
+                    to_prefetch.append((state, resource))
+
+            state["next_poll"] = self.next_poll(
+                package["refresh_rate"], package["last_refreshed"], now=now
+            )
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = executor.map(self._prefetch, to_prefetch)
+
+        return [resource_id for resource_id in results if resource_id is not None]
+
+    def _prefetch(self, state_and_resource):
+        state, resource = state_and_resource
+
+        try:
+            self.client.prefetch_resource(resource["id"], resource_info=resource)
+        except Exception as error:
+            print(f"Encountered an error - {error}")
+            return None
+
+        state["versions"][resource["id"]] = resource["last_modified"]
+        return resource["id"]
+
+    def _seconds_until_next_poll(self):
+        with self._lock:
+            polls = [s["next_poll"] for s in self._watched.values() if s["next_poll"]]
+
+        if not polls:
+            return self.default_interval.total_seconds()
+        return max(0.0, (min(polls) - _utcnow()).total_seconds())
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.run_pending()
+            # Wake up at least once a minute to pick up newly watched packages
+            self._stop.wait(min(60.0, self._seconds_until_next_poll()))
+
+    def start(self):
+        """
+        Starts polling in a background thread.
+        """
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stops the background thread, waiting for the current pass to finish.
+        """
+
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
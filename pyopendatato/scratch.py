@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+
+import atexit
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+# Bytes reserved for downloads whose size is not known in advance (without a Content-Length)
+UNSIZED_RESERVATION = 256 * 1024 * 1024
+
+
+class ScratchSpace(object):
+    """
+    Directory for the temporary files and extracted archives of downloads,
+    with a byte quota and cleanup that also runs when reading a file fails.
+
+    Downloads reserve their size (from the Content-Length header, or the uncompressed size
+    of an archive) before writing to disk, and wait while the quota is taken by others.
+    A thread that already holds a reservation, such as an archive being extracted,
+    never waits for another one, so that downloads cannot block each other forever.
+
+    Parameters
+    ----------
+    root: str or pathlib.Path, optional
+        Directory under which scratch files are created, e.g. on a fast local disk or tmpfs.
+        Defaults to the system temporary directory
+    quota: int, optional
+        Largest number of bytes reserved at the same time. None leaves it unlimited
+    unsized_reservation: int, optional (default=UNSIZED_RESERVATION)
+        Number of bytes reserved for downloads of unknown size (at most the quota).
+        Such downloads are not stopped if they grow beyond it
+
+    Examples
+    ----------
+    >>> from pyopendatato.ckanTO import ckanTO
+    >>> from pyopendatato.scratch import ScratchSpace
+    >>> scratch = ScratchSpace("/mnt/nvme/tmp", quota=20 * 1024**3)
+    >>> ct = ckanTO(scratch=scratch)
+    """
+
+    def __init__(self, root=None, quota=None, unsized_reservation=UNSIZED_RESERVATION):
+        self.root = Path(root) if root is not None else None
+        self.quota = quota
+        self.unsized_reservation = unsized_reservation
+        self.reserved = 0
+
+        self._path = None
+        self._condition = threading.Condition()
+        self._held = threading.local()
+
+    @property
+    def path(self):
+        """
+        Private directory holding the scratch files, created on first use.
+        """
+
+        with self._condition:
+            if self._path is None or not self._path.exists():
+                if self.root is not None:
+                    self.root.mkdir(parents=True, exist_ok=True)
+                self._path = Path(
+                    tempfile.mkdtemp(prefix="pyopendatato-", dir=self.root)
+                )
+            return self._path
+
+    @contextmanager
+    def reserve(self, nbytes):
+        """
+        Reserves space against the quota for the duration of the context,
+        blocking until enough of it is free.
+
+        Parameters
+        ----------
+        nbytes: int or None
+            Number of bytes to reserve, None when the size is not known
+            (unsized_reservation is then reserved)
+
+        Raises
+        ----------
+        Exception:
+            When more bytes are requested than the whole quota
+        """
+
+        if nbytes is None:
+            nbytes = self.unsized_reservation
+            if self.quota is not None:
+                nbytes = min(nbytes, self.quota)
+
+        nbytes = max(0, int(nbytes))
+
+        if self.quota is not None and nbytes > self.quota:
+            raise Exception(
+                f"{nbytes} bytes do not fit in the scratch space quota of {self.quota} bytes."
+            )
+
+        held = getattr(self._held, "count", 0)
+
+        with self._condition:
+            while (
+                not held
+                and self.quota is not None
+                and self.reserved + nbytes > self.quota
+            ):
+                self._condition.wait()
+            self.reserved += nbytes
+        self._held.count = held + 1
+
+        try:
+            yield
+        finally:
+            self._held.count = held
+            with self._condition:
+                self.reserved -= nbytes
+                self._condition.notify_all()
+
+    @contextmanager
+    def file(self, suffix="", nbytes=0):
+        """
+        Context manager giving the path of a new scratch file, removed when the context exits.
+
+        Parameters
+        ----------
+        suffix: str, optional
+            File extension, including the leading dot
+        nbytes: int, optional (default=0)
+            Number of bytes to reserve for the file, None when its size is not known
+        """
+
+        with self.reserve(nbytes):
+            fd, name = tempfile.mkstemp(suffix=suffix, dir=self.path)
+            os.close(fd)
+            path = Path(name)
+            try:
+                yield path
+            finally:
+                if path.exists():
+                    path.unlink()
+
+    @contextmanager
+    def directory(self, nbytes=0):
+        """
+        Context manager giving the path of a new scratch directory,
+        removed with its content when the context exits.
+
+        Parameters
+        ----------
+        nbytes: int, optional (default=0)
+            Number of bytes to reserve for the content of the directory
+        """
+
+        with self.reserve(nbytes):
+            path = Path(tempfile.mkdtemp(dir=self.path))
+            try:
+                yield path
+            finally:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def cleanup(self):
+        """
+        Removes all scratch files, including those of downloads still in progress.
+        """
+
+        with self._condition:
+            if self._path is not None:
+                shutil.rmtree(self._path, ignore_errors=True)
+                self._path = None
+
+
+DEFAULT_SCRATCH = ScratchSpace()
+
+atexit.register(DEFAULT_SCRATCH.cleanup)
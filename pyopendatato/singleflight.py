@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+
+import copy
+import threading
+
+import pandas as pd
+
+
+class _Call(object):
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight(object):
+    """
+    Coalesces concurrent calls with the same key, so that only one of them does the work.
+
+    The first caller for a key runs the function, while callers arriving before it
+    finishes wait for, and share, its result (or exception).
+
+    Examples
+    ----------
+    >>> from pyopendatato.singleflight import SingleFlight
+    >>> group = SingleFlight()
+    >>> group.do("key", sum, [1, 2, 3])
+    (6, False)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func, *args, **kwargs):
+        """
+        Runs func(*args, **kwargs), unless a call with the same key is already in flight.
+
+        Parameters
+        ----------
+        key: hashable
+            Identifies calls that are interchangeable
+        func: callable
+            Function to run
+
+        Returns
+        ----------
+        tuple:
+            The result, and whether it is shared with another caller
+            (in which case it should be copied before being modified).
+            The caller that ran func shares it too when others waited for it
+        """
+
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = func(*args, **kwargs)
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+        # No caller can join once the key is removed, so the count of waiters is final
+        return call.result, call.waiters > 0
+
+
+def copy_result(data):
+    """
+    Copies data returned by ckanTO, so that callers sharing a result can modify it independently.
+
+    Parameters
+    ----------
+    data: pandas.DataFrame, pyarrow.Table, list or dict
+        Data to copy
+
+    Returns
+    ----------
+    A copy of data
+    """
+
+    if isinstance(data, pd.DataFrame):
+        return data.copy()
+
+    # Arrow tables are immutable, so they can be shared as they are
+    if type(data).__module__.startswith("pyarrow"):
+        return data
+
+    if isinstance(data, dict):
+        return {k: copy_result(v) for k, v in data.items()}
+
+    return copy.deepcopy(data)
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pandas as pd
+import shapely
+from shapely import STRtree
+
+# Part of the name of stored indexes, bumped whenever the stored layout of SpatialIndex changes
+# so that files written by older versions are not read
+INDEX_FORMAT_VERSION = 2
+
+
+class SpatialIndex(object):
+    """
+    STRtree over the features of a spatial resource (GEOJSON or SHP), for fast batched
+    point-to-feature assignment, such as finding the ward or neighbourhood of addresses.
+
+    Parameters
+    ----------
+    features: geopandas.GeoDataFrame
+        Features to index, e.g. as returned by ckanTO.get_resource
+
+    Examples
+    ----------
+    >>> from pyopendatato.ckanTO import ckanTO
+    >>> ct = ckanTO()
+    >>> wards = ct.get_spatial_index("1d2bf8d3-8e9a-4f5b-a1c5-7ab4c2f1a0e2")
+    >>> wards.lookup([(-79.3832, 43.6532), (-79.4163, 43.7001)])
+    """
+
+    def __init__(self, features):
+        self.features = features
+        self.tree = STRtree(np.asarray(features.geometry.values))
+
+    def save(self, out_file):
+        """
+        Writes the features of the index to an open binary file object, as GeoParquet
+        (geometries as WKB). Requires pyarrow to be installed.
+
+        The tree itself cannot be stored, and is rebuilt when the features are loaded,
+        which is much faster than downloading and parsing the resource again.
+        """
+
+        self.features.to_parquet(out_file)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Reads an index written by save, building its tree.
+        """
+
+        import geopandas
+
+        return cls(geopandas.read_parquet(path))
+
+    def _to_geometries(self, points):
+        # GeoSeries are reprojected to the CRS of the features, coordinates are assumed to match it
+        crs = getattr(points, "crs", None)
+        if (
+            crs is not None
+            and self.features.crs is not None
+            and crs != self.features.crs
+        ):
+            points = points.to_crs(self.features.crs)
+
+        values = np.asarray(getattr(points, "values", points), dtype=object)
+        if values.ndim == 2:
+            return shapely.points(values.astype(float))
+
+        return values
+
+    def _attributes(self, points, matches):
+        attributes = self.features.drop(columns=self.features.geometry.name)
+        attributes = attributes.reset_index(drop=True).reindex(matches)
+        if isinstance(points, pd.Series):
+            attributes.index = points.index
+        else:
+            attributes = attributes.reset_index(drop=True)
+        return attributes
+
+    def lookup(self, points, predicate="intersects"):
+        """
+        Assigns each point to the feature containing it.
+
+        Parameters
+        ----------
+        points: geopandas.GeoSeries, sequence of shapely geometries or array of (x, y)
+            Points to assign
+        predicate: str, optional (default="intersects")
+            Spatial predicate tested between each point and the features,
+            "intersects" also matches points lying on a boundary
+
+        Returns
+        ----------
+        pandas.DataFrame:
+            Attributes of the matching feature for each point (in the same order),
+            missing where no feature matches. When several features match,
+            the first one in the resource is used
+        """
+
+        geometries = self._to_geometries(points)
+        point_idx, feature_idx = self.tree.query(geometries, predicate=predicate)
+
+        # Assigning in reverse order leaves the first match for each point
+        matches = np.full(len(geometries), -1)
+        matches[point_idx[::-1]] = feature_idx[::-1]
+
+        return self._attributes(points, matches)
+
+    def nearest(self, points, max_distance=None):
+        """
+        Assigns each point to its nearest feature.
+
+        Parameters
+        ----------
+        points: geopandas.GeoSeries, sequence of shapely geometries or array of (x, y)
+            Points to assign
+        max_distance: float, optional
+            Points further than this from every feature (in the units of the features' CRS)
+            are left unassigned
+
+        Returns
+        ----------
+        pandas.DataFrame:
+            Attributes of the nearest feature for each point (in the same order),
+            missing where no feature is within max_distance
+        """
+
+        geometries = self._to_geometries(points)
+        point_idx, feature_idx = self.tree.query_nearest(
+            geometries, max_distance=max_distance, all_matches=False
+        )
+
+        matches = np.full(len(geometries), -1)
+        matches[point_idx] = feature_idx
+
+        return self._attributes(points, matches)
@@ -0,0 +1,469 @@
+# -*- coding: utf-8 -*-
+
+import gzip
+import hashlib
+import os
+import re
+import shutil
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+from .utils import extracted_size
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+@contextmanager
+def file_lock(path):
+    """
+    Holds an exclusive advisory lock on a file, blocking until it is available.
+
+    The lock is shared between processes (and between threads that open the file separately).
+
+    Parameters
+    ----------
+    path: pathlib.Path
+        Path to the lock file, which is created if needed
+    """
+
+    with open(path, "a+b") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    pass
+
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _safe_name(name):
+    return re.sub(r"[^A-Za-z0-9._-]", "_", str(name)) or "_"
+
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Directories of the store holding files by content hash, which cannot clash with
+# resource directories as resource ids never start with a dot
+OBJECTS_DIR = ".objects"
+EXTRACTED_DIR = ".extracted"
+
+DIGEST_SUFFIX = ".sha256"
+
+# Size of the content of stored files, which may be compressed
+SIZE_SUFFIX = ".size"
+
+# Text files, which compress well, are kept compressed. Other formats
+# are compressed already (zip, xlsx) or have to be read in place (shapefiles)
+COMPRESSIBLE_SUFFIXES = (".csv", ".json", ".geojson", ".txt")
+
+COMPRESSION_SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+
+# Level 6 is gzip's default, level 3 zstd's
+COMPRESSION_LEVELS = {"gzip": 6, "zstd": 3}
+
+
+def file_digest(path):
+    """
+    Returns the SHA-256 hex digest of the content of a file.
+    """
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as in_file:
+        for chunk in iter(lambda: in_file.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class _HashingWriter(object):
+    # Hashes and counts what is written to a file object, so that downloads are not read again
+    def __init__(self, out_file):
+        self.out_file = out_file
+        self.digest = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self.digest.update(data)
+        self.size += len(data)
+        return self.out_file.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.out_file, name)
+
+
+def _import_zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError(
+            "zstd compression requires zstandard, "
+            "which can be installed with pip install zstandard"
+        )
+
+    return zstandard
+
+
+@contextmanager
+def _compressing(out_file, compression):
+    # gzip headers are written without a name or time, so that identical content
+    # compresses to identical bytes
+    if compression == "gzip":
+        with gzip.GzipFile(
+            filename="",
+            mode="wb",
+            fileobj=out_file,
+            compresslevel=COMPRESSION_LEVELS["gzip"],
+            mtime=0,
+        ) as compressed_file:
+            yield compressed_file
+    elif compression == "zstd":
+        compressor = _import_zstandard().ZstdCompressor(
+            level=COMPRESSION_LEVELS["zstd"]
+        )
+        with compressor.stream_writer(out_file, closefd=False) as compressed_file:
+            yield compressed_file
+    else:
+        yield out_file
+
+
+def _link(source, path):
+    # Hard links share the bytes of identical files, copies are the fallback
+    # on file systems without them
+    temp_path = path.parent / (
+        f".{path.name}.{os.getpid()}.{threading.get_ident()}.link.tmp"
+    )
+    try:
+        try:
+            os.link(source, temp_path)
+        except OSError:
+            shutil.copyfile(source, temp_path)
+        os.replace(temp_path, path)
+    finally:
+        if temp_path.exists():
+            temp_path.unlink()
+
+
+class DownloadStore(object):
+    """
+    On-disk store of downloaded resources, keyed by resource id and version,
+    which can be shared by several processes on the same host.
+
+    A file is downloaded by a single process while holding a lock, written to a temporary
+    file and renamed into place once complete. Other processes wait for the lock and then
+    read the finished file instead of downloading it again.
+
+    Files are kept once per content, by their SHA-256 hash, and the entry of each resource
+    version is a hard link to them, so that the same file published under several resources
+    takes its space only once. Archives are extracted once per content as well, and their
+    members are kept by hash too. Files no longer used by any resource are removed
+    when a new version replaces an old one, or when a resource is invalidated.
+
+    Text files (CSV, JSON, GeoJSON, TXT) are compressed as they are written, and stored
+    with an extra .gz or .zst extension, which the readers of pyopendatato.utils
+    (and pandas) decompress as they read.
+
+    Parameters
+    ----------
+    root: str or pathlib.Path
+        Directory where downloaded files are kept
+    compression: str, optional (default="gzip")
+        How text files are compressed: "gzip", "zstd" (which needs the zstandard package)
+        or None to keep them uncompressed
+
+    Examples
+    ----------
+    >>> from pyopendatato.store import DownloadStore
+    >>> store = DownloadStore("/var/cache/pyopendatato")
+    >>> store.fetch("123", "2019-09-28", ".txt", lambda f: f.write(b"hello"))
+    """
+
+    def __init__(self, root, compression="gzip"):
+        if compression is not None and compression not in COMPRESSION_SUFFIXES:
+            raise Exception(
+                f'compression should be "gzip", "zstd" or None, not {compression}.'
+            )
+        if compression == "zstd":
+            _import_zstandard()
+
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.compression = compression
+
+    def _compression(self, suffix):
+        if suffix.lower().endswith(COMPRESSIBLE_SUFFIXES):
+            return self.compression
+        return None
+
+    def path(self, resource_id, version, suffix):
+        """
+        Returns where a given version of a resource is (or would be) stored,
+        including the extension of its compression if it is compressed.
+        """
+
+        suffix += COMPRESSION_SUFFIXES.get(self._compression(suffix), "")
+        return self.root / _safe_name(resource_id) / (_safe_name(version) + suffix)
+
+    def get(self, resource_id, version, suffix):
+        """
+        Returns the path to a stored version of a resource, or None if it is not stored.
+        """
+
+        path = self.path(resource_id, version, suffix)
+        return path if path.exists() else None
+
+    def fetch(self, resource_id, version, suffix, download):
+        """
+        Returns the path to a stored version of a resource, downloading it first if needed.
+
+        Parameters
+        ----------
+        resource_id: str
+            Id for resource
+        version: str
+            Version of the resource, such as its last_modified date
+        suffix: str
+            File extension, including the leading dot
+        download: callable
+            Function writing the content of the resource to the binary file object it is given
+
+        Returns
+        ----------
+        pathlib.Path:
+            Path to the stored file, with an extra .gz or .zst extension if it is compressed
+        """
+
+        compression = self._compression(suffix)
+        path = self.path(resource_id, version, suffix)
+        if path.exists():
+            return path
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        with file_lock(path.parent / (path.name + ".lock")):
+            # Another process may have finished downloading while we waited for the lock
+            if path.exists():
+                return path
+
+            temp_path = path.parent / (
+                f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp"
+            )
+            try:
+                # The digest is that of the content, whether or not it is compressed
+                with open(temp_path, "wb") as out_file:
+                    with _compressing(out_file, compression) as compressed_file:
+                        writer = _HashingWriter(compressed_file)
+                        download(writer)
+                digest = writer.digest.hexdigest()
+
+                # Recorded before the file is in place, where readers can find it
+                _write_text(path.parent / (path.name + DIGEST_SUFFIX), digest)
+                _write_text(path.parent / (path.name + SIZE_SUFFIX), str(writer.size))
+
+                self._add_object(
+                    temp_path,
+                    digest + COMPRESSION_SUFFIXES.get(compression, ""),
+                    path,
+                )
+            finally:
+                if temp_path.exists():
+                    temp_path.unlink()
+
+        self._remove_other_versions(path, _safe_name(version))
+        return path
+
+    def digest(self, path):
+        """
+        Returns the SHA-256 hex digest of a stored file, as recorded when it was stored.
+
+        Parameters
+        ----------
+        path: pathlib.Path
+            Path to the file, as returned by fetch or get
+
+        Returns
+        ----------
+        str:
+            Hex digest of the content of the file
+        """
+
+        digest_path = path.parent / (path.name + DIGEST_SUFFIX)
+        try:
+            return digest_path.read_text().strip()
+        except OSError:
+            # Stored before digests were recorded
+            digest = file_digest(path)
+            _write_text(digest_path, digest)
+            return digest
+
+    def content_size(self, path):
+        """
+        Returns the size in bytes of the content of a stored file, once decompressed.
+
+        Parameters
+        ----------
+        path: pathlib.Path
+            Path to the file, as returned by fetch or get
+
+        Returns
+        ----------
+        int:
+            Size of the content, as recorded when the file was stored
+        """
+
+        try:
+            return int((path.parent / (path.name + SIZE_SUFFIX)).read_text())
+        except (OSError, ValueError):
+            # Stored before sizes were recorded
+            return extracted_size(path)
+
+    def is_shared(self, path):
+        """
+        Returns whether a stored file is also stored for another resource or version.
+        """
+
+        # Linked from the objects and from at least two entries
+        return path.stat().st_nlink > 2
+
+    def extract(self, path, extract):
+        """
+        Returns the directory a stored archive is extracted to, extracting it first if needed.
+
+        Archives are extracted once per content, whichever resources they were stored for,
+        and the directory is shared, so the files in it should not be modified.
+
+        Parameters
+        ----------
+        path: pathlib.Path
+            Path to the archive, as returned by fetch
+        extract: callable
+            Function extracting the archive it is given to the directory it is given,
+            e.g. pyopendatato.utils.extract_archive
+
+        Returns
+        ----------
+        pathlib.Path:
+            Path to the directory holding the extracted files
+        """
+
+        digest = self.digest(path)
+        out_dir = self.root / EXTRACTED_DIR / digest
+        if out_dir.exists():
+            return out_dir
+
+        out_dir.parent.mkdir(parents=True, exist_ok=True)
+
+        with file_lock(out_dir.parent / (digest + ".lock")):
+            if out_dir.exists():
+                return out_dir
+
+            temp_dir = out_dir.parent / (
+                f".{digest}.{os.getpid()}.{threading.get_ident()}.tmp"
+            )
+            temp_dir.mkdir()
+            try:
+                extract(path, out_dir=temp_dir)
+
+                # Identical members of different archives are also kept once
+                for member in sorted(temp_dir.rglob("*")):
+                    if member.is_file() and not member.is_symlink():
+                        self._add_object(member, file_digest(member), member)
+
+                os.replace(temp_dir, out_dir)
+            finally:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+
+        return out_dir
+
+    def _object_path(self, name):
+        # Named by digest, with the extension of their compression if they are compressed
+        return self.root / OBJECTS_DIR / name[:2] / name
+
+    def _add_object(self, source, name, path):
+        # Moves a complete file into the objects (unless the same content is already there)
+        # and links it at path. Holding the lock keeps prune from removing the object between
+        # the two steps
+        objects_dir = self.root / OBJECTS_DIR
+        objects_dir.mkdir(parents=True, exist_ok=True)
+        object_path = self._object_path(name)
+
+        with file_lock(objects_dir / ".lock"):
+            if not object_path.exists():
+                object_path.parent.mkdir(exist_ok=True)
+                os.replace(source, object_path)
+            _link(object_path, path)
+
+    def prune(self):
+        """
+        Removes the files and extracted archives that no resource entry uses any more.
+        """
+
+        objects_dir = self.root / OBJECTS_DIR
+        if not objects_dir.exists():
+            return
+
+        with file_lock(objects_dir / ".lock"):
+            extracted_dir = self.root / EXTRACTED_DIR
+            if extracted_dir.exists():
+                for out_dir in extracted_dir.iterdir():
+                    if out_dir.name.endswith((".lock", ".tmp")):
+                        continue
+                    archive = self._object_path(out_dir.name)
+                    if not archive.exists() or archive.stat().st_nlink <= 1:
+                        shutil.rmtree(out_dir, ignore_errors=True)
+
+            # Objects only linked from the objects directory are no longer used
+            for object_path in objects_dir.glob("*/*"):
+                try:
+                    if object_path.stat().st_nlink <= 1:
+                        object_path.unlink()
+                except OSError:
+                    pass
+
+    def invalidate(self, resource_id):
+        """
+        Removes all stored versions of a resource.
+        """
+
+        shutil.rmtree(self.root / _safe_name(resource_id), ignore_errors=True)
+        self.prune()
+
+    def _remove_other_versions(self, path, version):
+        # Files being read by other processes stay readable after they are unlinked (on POSIX)
+        removed = False
+        for other in path.parent.iterdir():
+            if not other.name.startswith(version + ".") and not other.name.endswith(
+                (".lock", ".tmp")
+            ):
+                try:
+                    if other.is_dir():
+                        shutil.rmtree(other)
+                    else:
+                        other.unlink()
+                    removed = True
+                except OSError:
+                    pass
+
+        if removed:
+            self.prune()
+
+
+def _write_text(path, text):
+    temp_path = path.parent / f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp"
+    temp_path.write_text(text)
+    os.replace(temp_path, path)
@@ -1,31 +1,445 @@
 # -*- coding: utf-8 -*-
 
+import gzip
 import io
+import itertools
 import json
+import re
 import shutil
+import sys
 import tempfile
+import zipfile
+from contextlib import contextmanager
 from pathlib import Path
-import requests
 
+import numpy as np
 import pandas as pd
-import geopandas
-import patoolib
+
+# geopandas and patoolib are slow to import, and only needed for some formats,
+# so they are imported inside the functions that use them
+
+from .ratelimit import DEFAULT_SESSION
+from .scratch import DEFAULT_SCRATCH
 
 DATASTORE_SEARCH_URL = (
     "https://ckan0.cf.opendata.inter.prod-toronto.ca/api/action/datastore_search"
 )
 
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Files up to this size (according to their Content-Length) are parsed from memory,
+# larger ones are written to disk first
+SPILL_THRESHOLD = 4 * 1024 * 1024
+
+# pandas and Arrow types for the column types of the CKAN DataStore (PostgreSQL types).
+# Integers are nullable in the DataStore, other types are left to the parser
+DATASTORE_DTYPES = {
+    "int": "Int64",
+    "int4": "Int64",
+    "int8": "Int64",
+    "bigint": "Int64",
+    "numeric": "float64",
+    "float8": "float64",
+    "text": "object",
+    "bool": "boolean",
+    "timestamp": "datetime64[ns]",
+    "date": "datetime64[ns]",
+}
+
+DATASTORE_ARROW_TYPES = {
+    "int": "int64",
+    "int4": "int64",
+    "int8": "int64",
+    "bigint": "int64",
+    "numeric": "float64",
+    "float8": "float64",
+    "text": "string",
+    "bool": "bool",
+}
+
+# Previews read remote files in small pieces, so that little more than needed is transferred
+HEAD_CHUNK_SIZE = 64 * 1024
+
+# Compressed transfers are assumed to expand by up to this ratio once decoded,
+# as their Content-Length is the size of the compressed content
+ENCODED_EXPANSION = 10
 
-def download_extract_zipped_file(url, file_ext):
+# Range requests and sizes from HEAD requests refer to the content as stored on the server
+IDENTITY_ENCODING = {"Accept-Encoding": "identity"}
+
+
+def download_file(url, out_file, session=None):
     """
-    Download a zipped folder to a temporary location, extract it to a temporary directory
+    Download a file, streaming it to an open binary file object
 
     Parameters
     ----------
     url: str
         Url for where to download the file from
-    file_ext:
-        File extension
+    out_file: file object
+        File opened for writing in binary mode
+    session: requests.Session, optional
+        Session to send the request with (defaults to the shared rate limited session)
+    """
+
+    session = session or DEFAULT_SESSION
+
+    with session.get(url, stream=True) as response:
+        response.raise_for_status()
+        for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+            out_file.write(chunk)
+
+
+@contextmanager
+def open_download(
+    url, suffix, spill_threshold=SPILL_THRESHOLD, session=None, scratch=None
+):
+    """
+    Download a file into memory if it is small, or stream it to a temporary file otherwise
+
+    Parameters
+    ----------
+    url: str
+        Url for where to download the file from
+    suffix: str
+        File extension of the temporary file, including the leading dot
+    spill_threshold: int, optional (default=SPILL_THRESHOLD)
+        Largest Content-Length in bytes for which the file is kept in memory.
+        Files without a Content-Length are always written to disk
+    session: requests.Session, optional
+        Session to send the request with (defaults to the shared rate limited session)
+    scratch: pyopendatato.scratch.ScratchSpace, optional
+        Where temporary files are written (defaults to the shared scratch space)
+
+    Yields
+    ----------
+    io.BytesIO or pathlib.Path:
+        Buffer holding the file content, or path to the temporary file,
+        which is removed when the context exits
+    """
+
+    session = session or DEFAULT_SESSION
+    scratch = scratch or DEFAULT_SCRATCH
+
+    with session.get(url, stream=True) as response:
+        response.raise_for_status()
+
+        content_length = decoded_length(response)
+        if content_length is not None and content_length <= spill_threshold:
+            # Closing the response releases its slot of the concurrency limit while parsing
+            content = response.content
+            response.close()
+            yield io.BytesIO(content)
+            return
+
+        # Decoded sizes of compressed transfers are only estimated, so they reserve
+        # at most the quota (unless the compressed content alone exceeds it)
+        nbytes = content_length
+        if nbytes is not None and scratch.quota is not None and _is_encoded(response):
+            encoded_length = int(response.headers["Content-Length"])
+            nbytes = min(nbytes, max(scratch.quota, encoded_length))
+
+        with scratch.file(suffix, nbytes=nbytes) as temp_file:
+            with open(temp_file, "wb") as out_file:
+                for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    out_file.write(chunk)
+            response.close()
+
+            yield temp_file
+
+
+def decoded_length(response):
+    """
+    Estimate the size of the content of a response once decoded
+
+    Parameters
+    ----------
+    response: requests.Response
+        Response, whose content is decoded as it is read when it was compressed for transfer
+
+    Returns
+    ----------
+    int or None:
+        Content-Length of the response, scaled by ENCODED_EXPANSION if it was compressed
+        for transfer, or None if the response has no Content-Length
+    """
+
+    content_length = response.headers.get("Content-Length")
+    if content_length is None:
+        return None
+
+    if _is_encoded(response):
+        return int(content_length) * ENCODED_EXPANSION
+
+    return int(content_length)
+
+
+def _is_encoded(response):
+    return response.headers.get("Content-Encoding", "identity").lower() != "identity"
+
+
+@contextmanager
+def download_scratch_file(url, suffix, session=None, scratch=None):
+    """
+    Download a file to the scratch space, reserving its size against the quota
+
+    Parameters
+    ----------
+    url: str
+        Url for where to download the file from
+    suffix: str
+        File extension of the temporary file, including the leading dot
+    session: requests.Session, optional
+        Session to send the request with (defaults to the shared rate limited session)
+    scratch: pyopendatato.scratch.ScratchSpace, optional
+        Where the file is written (defaults to the shared scratch space)
+
+    Yields
+    ----------
+    pathlib.Path:
+        Path to the temporary file, which is removed when the context exits
+    """
+
+    # A negative threshold keeps even empty files out of memory
+    with open_download(
+        url, suffix, spill_threshold=-1, session=session, scratch=scratch
+    ) as temp_file:
+        yield temp_file
+
+
+def download_head(url, nlines, session=None):
+    """
+    Download the first lines of a text file, stopping the transfer once they are received
+
+    Parameters
+    ----------
+    url: str
+        Url for where to download the file from
+    nlines: int
+        Number of complete lines to download
+    session: requests.Session, optional
+        Session to send the request with (defaults to the shared rate limited session)
+
+    Returns
+    ----------
+    io.BytesIO:
+        Buffer holding the first nlines lines (or the whole file, if it is shorter)
+    """
+
+    session = session or DEFAULT_SESSION
+
+    head = bytearray()
+    with session.get(url, stream=True) as response:
+        response.raise_for_status()
+        for chunk in response.iter_content(chunk_size=HEAD_CHUNK_SIZE):
+            head += chunk
+            if head.count(b"\n") >= nlines:
+                break
+
+    end = 0
+    for _ in range(nlines):
+        end = head.find(b"\n", end) + 1
+        if end == 0:
+            end = len(head)
+            break
+
+    return io.BytesIO(bytes(head[:end]))
+
+
+class RangeFile(io.RawIOBase):
+    """
+    Read-only, seekable file over HTTP, fetching the bytes that are read with Range requests.
+
+    Parameters
+    ----------
+    url: str
+        Url of the file
+    size: int
+        Size of the file in bytes
+    session: requests.Session, optional
+        Session to send the requests with (defaults to the shared rate limited session)
+    """
+
+    def __init__(self, url, size, session=None):
+        self.url = url
+        self.size = size
+        self.session = session or DEFAULT_SESSION
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        self._position = max(0, offset)
+        return self._position
+
+    def readinto(self, buffer):
+        if self._position >= self.size or len(buffer) == 0:
+            return 0
+
+        end = min(self.size, self._position + len(buffer)) - 1
+        response = self.session.get(
+            self.url,
+            headers={"Range": f"bytes={self._position}-{end}", **IDENTITY_ENCODING},
+        )
+        response.raise_for_status()
+        if response.status_code != 206:
+            raise OSError(f"{self.url} does not support range requests.")
+
+        data = response.content
+        buffer[: len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+
+def open_ranged(url, session=None):
+    """
+    Opens a remote file for random access, if the server supports range requests
+
+    Parameters
+    ----------
+    url: str
+        Url of the file
+    session: requests.Session, optional
+        Session to send the requests with (defaults to the shared rate limited session)
+
+    Returns
+    ----------
+    io.BufferedReader or None:
+        Seekable binary file reading the remote file on demand,
+        or None if the server does not support range requests
+    """
+
+    session = session or DEFAULT_SESSION
+
+    response = session.head(url, allow_redirects=True, headers=IDENTITY_ENCODING)
+    if not response.ok:
+        return None
+
+    content_length = response.headers.get("Content-Length")
+    if response.headers.get("Accept-Ranges") != "bytes" or content_length is None:
+        return None
+
+    return io.BufferedReader(
+        RangeFile(response.url or url, int(content_length), session=session),
+        buffer_size=HEAD_CHUNK_SIZE,
+    )
+
+
+def open_file(filepath):
+    """
+    Open a file for reading in binary mode, decompressing it as it is read
+    if it is compressed (gz or zst extension), as in the store of ckanTO
+
+    Parameters
+    ----------
+    filepath: pathlib.Path
+        Path to the file
+
+    Returns
+    ----------
+    file object:
+        File opened in binary mode
+    """
+
+    suffix = Path(filepath).suffix.lower()
+
+    if suffix == ".gz":
+        return gzip.open(filepath, "rb")
+
+    if suffix == ".zst":
+        import zstandard
+
+        return zstandard.ZstdDecompressor().stream_reader(
+            open(filepath, "rb"), closefd=True
+        )
+
+    return open(filepath, "rb")
+
+
+def _is_compressed(filepath):
+    return not hasattr(filepath, "read") and Path(filepath).suffix.lower() in [
+        ".gz",
+        ".zst",
+    ]
+
+
+def _open_text(filepath):
+    # Files parsed from memory are given as binary buffers
+    if hasattr(filepath, "read"):
+        return io.TextIOWrapper(filepath, encoding="utf-8")
+    return io.TextIOWrapper(open_file(filepath), encoding="utf-8")
+
+
+def extracted_size(filepath):
+    """
+    Estimate the size of the files in an archive once extracted
+
+    Parameters
+    ----------
+    filepath: pathlib.Path
+        Path to the archive
+
+    Returns
+    ----------
+    int:
+        Uncompressed size in bytes for zip and gz archives, and zst files recording it,
+        the size of the archive otherwise
+    """
+
+    filepath = Path(filepath)
+
+    if zipfile.is_zipfile(filepath):
+        with zipfile.ZipFile(filepath) as archive:
+            return sum(info.file_size for info in archive.infolist())
+
+    # gzip records the uncompressed size (modulo 4 GiB) in its last 4 bytes
+    if filepath.suffix.lower() == ".gz" and filepath.stat().st_size >= 4:
+        with open(filepath, "rb") as in_file:
+            in_file.seek(-4, io.SEEK_END)
+            return int.from_bytes(in_file.read(4), "little")
+
+    # zstd records the uncompressed size in its frame header, when it was known
+    if filepath.suffix.lower() == ".zst":
+        try:
+            import zstandard
+        except ImportError:
+            return filepath.stat().st_size
+
+        # Frame headers take at most 18 bytes
+        with open(filepath, "rb") as in_file:
+            header = in_file.read(18)
+        try:
+            content_size = zstandard.frame_content_size(header)
+        except zstandard.ZstdError:
+            content_size = -1
+        if content_size >= 0:
+            return content_size
+
+    return filepath.stat().st_size
+
+
+def extract_archive(filepath, out_dir=None):
+    """
+    Extract an archive (zip, gz, rar) to a directory
+
+    Parameters
+    ----------
+    filepath: pathlib.Path
+        Path to the archive
+    out_dir: pathlib.Path, optional
+        Existing directory to extract the files to.
+        Defaults to a new temporary directory, which the caller should remove
 
     Returns
     ----------
@@ -33,29 +447,205 @@ def download_extract_zipped_file(url, file_ext):
         Path to where the extracted files are saved
     """
 
+    import patoolib
+
+    if out_dir is not None:
+        patoolib.extract_archive(str(filepath), outdir=str(out_dir), verbosity=0)
+        return Path(out_dir)
+
+    temp_dir = Path(tempfile.mkdtemp())
+    try:
+        patoolib.extract_archive(str(filepath), outdir=str(temp_dir), verbosity=0)
+    except BaseException:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise
+
+    return temp_dir
+
+
+@contextmanager
+def download_extract_zipped_file(url, file_ext, session=None, scratch=None):
+    """
+    Download a zipped folder to a temporary location, extract it to a temporary directory,
+    both in the scratch space and counted against its quota
+
+    Parameters
+    ----------
+    url: str
+        Url for where to download the file from
+    file_ext:
+        File extension
+    session: requests.Session, optional
+        Session to send the request with (defaults to the shared rate limited session)
+    scratch: pyopendatato.scratch.ScratchSpace, optional
+        Where the archive is downloaded and extracted (defaults to the shared scratch space)
+
+    Yields
+    ----------
+    pathlib.Path:
+        Path to where the extracted files are saved, which is removed when the context exits
+    """
+
     file_ext = file_ext.lower() if file_ext[0] == "." else "." + file_ext.lower()
+    scratch = scratch or DEFAULT_SCRATCH
 
-    temp_file = Path(tempfile.NamedTemporaryFile(suffix=file_ext).name)
-    temp_dir = Path(tempfile.TemporaryDirectory().name)
+    with download_scratch_file(
+        url, file_ext, session=session, scratch=scratch
+    ) as temp_file:
+        with scratch.directory(nbytes=extracted_size(temp_file)) as temp_dir:
+            yield extract_archive(temp_file, out_dir=temp_dir)
 
-    with requests.get(url) as response:
-        with open(temp_file, "wb") as out_file:
-            shutil.copyfileobj(io.BytesIO(response.content), out_file)
 
-    patoolib.extract_archive(str(temp_file), outdir=temp_dir, verbosity=0)
+def datastore_search(
+    resource_id,
+    limit,
+    offset=0,
+    records_format=None,
+    datastore_search_url=DATASTORE_SEARCH_URL,
+    session=None,
+):
+    """
+    Retrieves one page of records of a resource in the CKAN DataStore.
 
-    temp_file.unlink()
-    return temp_dir
+    Parameters
+    ----------
+    resource_id: str
+        Id for resource
+    limit: int
+        Maximum number of records to return
+    offset: int, optional (default=0)
+        Number of records to skip
+    records_format: str, optional
+        Format of the records ("objects", "lists", "csv" or "tsv"),
+        a list of dicts ("objects") by default
+    datastore_search_url: str, optional
+        Url for the datastore_search endpoint of the CKAN instance
+    session: requests.Session, optional
+        Session to send the request with (defaults to the shared rate limited session)
+
+    Returns
+    ----------
+    dict:
+        Result of the datastore_search action, including the records,
+        the fields and the total number of records
+    """
+
+    session = session or DEFAULT_SESSION
 
+    params = {"resource_id": resource_id, "limit": limit}
+    if offset:
+        params["offset"] = offset
+    if records_format:
+        params["records_format"] = records_format
 
-def read_datastore(resource_id):
+    r = session.get(datastore_search_url, params=params)
+    r.raise_for_status()
+
+    return json.loads(r.content)["result"]
+
+
+def download_datastore_records(
+    resource_id, datastore_search_url=DATASTORE_SEARCH_URL, session=None
+):
     """
-    Retrieves data when the resource is part of the CKAN DataStore.
+    Retrieves all records of a resource in the CKAN DataStore.
+
+    Parameters
+    ----------
+    resource_id: str
+        Id for resource
+    datastore_search_url: str, optional
+        Url for the datastore_search endpoint of the CKAN instance
+    session: requests.Session, optional
+        Session to send the requests with (defaults to the shared rate limited session)
+
+    Returns
+    ----------
+    list:
+        Data records, one dict per row
+    """
+
+    n_records = datastore_search(
+        resource_id, 1, datastore_search_url=datastore_search_url, session=session
+    )["total"]
+
+    return datastore_search(
+        resource_id,
+        n_records,
+        datastore_search_url=datastore_search_url,
+        session=session,
+    )["records"]
+
+
+def iter_datastore(
+    resource_id, chunksize, datastore_search_url=DATASTORE_SEARCH_URL, session=None
+):
+    """
+    Retrieves data from the CKAN DataStore one page at a time.
+
+    Parameters
+    ----------
+    resource_id: str
+        Id for resource
+    chunksize: int
+        Number of records per page
+    datastore_search_url: str, optional
+        Url for the datastore_search endpoint of the CKAN instance
+    session: requests.Session, optional
+        Session to send the requests with (defaults to the shared rate limited session)
+
+    Yields
+    ----------
+    pd.DataFrame:
+        Data records in table format, at most chunksize rows each
+    """
+
+    offset = 0
+    while True:
+        result = datastore_search(
+            resource_id,
+            chunksize,
+            offset=offset,
+            datastore_search_url=datastore_search_url,
+            session=session,
+        )
+
+        if not result["records"]:
+            return
+
+        yield records_to_dataframe(result["records"])
+
+        offset += len(result["records"])
+        if offset >= result["total"]:
+            return
+
+
+def read_datastore_page(
+    resource_id,
+    offset,
+    limit,
+    datastore_search_url=DATASTORE_SEARCH_URL,
+    session=None,
+    schema=None,
+):
+    """
+    Retrieves one page of data from the CKAN DataStore.
 
     Parameters
     ----------
     resource_id: str
         Id for resource
+    offset: int
+        Number of records to skip
+    limit: int
+        Maximum number of records to return
+    datastore_search_url: str, optional
+        Url for the datastore_search endpoint of the CKAN instance
+    session: requests.Session, optional
+        Session to send the request with (defaults to the shared rate limited session)
+    schema: dict, optional
+        dtype of each column (see fields_to_schema). When given, the page is cast to it
+        and missing values are kept, so that every page has the same dtypes
 
     Returns
     ----------
@@ -63,33 +653,419 @@ def read_datastore(resource_id):
         Data records in table format
     """
 
-    r = requests.get(
-        DATASTORE_SEARCH_URL, params={"resource_id": resource_id, "limit": 1}
+    records = datastore_search(
+        resource_id,
+        limit,
+        offset=offset,
+        datastore_search_url=datastore_search_url,
+        session=session,
+    )["records"]
+
+    if schema is not None:
+        return apply_schema(pd.DataFrame.from_records(records), schema)
+
+    return records_to_dataframe(records)
+
+
+def read_datastore(
+    resource_id, datastore_search_url=DATASTORE_SEARCH_URL, session=None, arrow=False
+):
+    """
+    Retrieves data when the resource is part of the CKAN DataStore.
+
+    Parameters
+    ----------
+    resource_id: str
+        Id for resource
+    datastore_search_url: str, optional
+        Url for the datastore_search endpoint of the CKAN instance
+    session: requests.Session, optional
+        Session to send the requests with (defaults to the shared rate limited session)
+    arrow: boolean, optional (default=False)
+        Option for returning a pyarrow.Table instead of a pandas.DataFrame
+
+    Returns
+    ----------
+    pd.DataFrame or pyarrow.Table:
+        Data records in table format
+    """
+
+    if arrow:
+        return read_datastore_arrow(
+            resource_id, datastore_search_url=datastore_search_url, session=session
+        )
+
+    data_json = download_datastore_records(
+        resource_id, datastore_search_url=datastore_search_url, session=session
+    )
+
+    return records_to_dataframe(data_json)
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.csv
+    except ImportError:
+        raise ImportError(
+            "Arrow output requires pyarrow, which can be installed with pip install pyarrow"
+        )
+
+    return pyarrow
+
+
+def read_datastore_arrow(
+    resource_id, datastore_search_url=DATASTORE_SEARCH_URL, session=None
+):
+    """
+    Retrieves data from the CKAN DataStore as an Arrow table.
+
+    The records are requested in CSV format and parsed by Arrow's multithreaded CSV reader,
+    without creating Python objects for every value.
+
+    Parameters
+    ----------
+    resource_id: str
+        Id for resource
+    datastore_search_url: str, optional
+        Url for the datastore_search endpoint of the CKAN instance
+    session: requests.Session, optional
+        Session to send the requests with (defaults to the shared rate limited session)
+
+    Returns
+    ----------
+    pyarrow.Table:
+        Data records in table format
+    """
+
+    pa = _import_pyarrow()
+
+    n_records = datastore_search(
+        resource_id, 1, datastore_search_url=datastore_search_url, session=session
+    )["total"]
+
+    result = datastore_search(
+        resource_id,
+        n_records,
+        records_format="csv",
+        datastore_search_url=datastore_search_url,
+        session=session,
     )
 
-    n_records = json.loads(r.content)["result"]["total"]
+    column_names = [field["id"] for field in result["fields"]]
+
+    if not result["records"]:
+        return pa.table({name: pa.array([], pa.string()) for name in column_names})
+
+    # Declared types spare Arrow from inferring them
+    column_types = {
+        field["id"]: DATASTORE_ARROW_TYPES[field["type"]]
+        for field in result["fields"]
+        if field.get("type") in DATASTORE_ARROW_TYPES
+    }
 
-    r = requests.get(
-        DATASTORE_SEARCH_URL, params={"resource_id": resource_id, "limit": n_records}
+    return pa.csv.read_csv(
+        io.BytesIO(result["records"].encode("utf-8")),
+        read_options=pa.csv.ReadOptions(column_names=column_names),
+        convert_options=pa.csv.ConvertOptions(column_types=column_types),
     )
-    r.encoding = "utf-8"
 
-    data_json = json.loads(r.content)["result"]["records"]
-    data_df = pd.DataFrame.from_records(data_json).fillna("")
 
-    return data_df
+def read_file_arrow(filepath, file_ext):
+    """
+    Retrieves tabular data as an Arrow table.
+
+    Parameters
+    ----------
+    filepath: pathlib.Path or io.BytesIO
+        Path to where the data file is temporarily downloaded, or buffer holding its content
+    file_ext: str
+        File extension, only csv files are supported
+
+    Returns
+    ----------
+    pyarrow.Table:
+        Data in table format
+    """
+
+    pa = _import_pyarrow()
+
+    if file_ext.lower() != "csv":
+        raise Exception(
+            f"{file_ext} cannot be returned as an Arrow table using pyopendatato, "
+            "only DataStore and CSV resources can."
+        )
+
+    if isinstance(filepath, Path):
+        filepath = str(filepath)
+
+    return pa.csv.read_csv(filepath)
+
+
+def records_to_arrow(records):
+    """
+    Converts DataStore records to an Arrow table.
+
+    Parameters
+    ----------
+    records: list
+        Data records, one dict per row
+
+    Returns
+    ----------
+    pyarrow.Table:
+        Data records in table format
+    """
+
+    pa = _import_pyarrow()
+
+    return pa.Table.from_pylist(records)
+
+
+def records_to_dataframe(records):
+    """
+    Converts DataStore records to a table.
+
+    Parameters
+    ----------
+    records: list
+        Data records, one dict per row
+
+    Returns
+    ----------
+    pd.DataFrame:
+        Data records in table format
+    """
+
+    return pd.DataFrame.from_records(records).fillna("")
+
+
+def _column_key(name):
+    # Matches columns renamed between releases, e.g. "Min Delay", "Min_Delay" and "min delay"
+    return re.sub(r"[^0-9a-z]+", "_", str(name).strip().lower()).strip("_")
+
+
+def _common_dtype(dtypes, complete):
+    # pandas extension dtypes (Int64, string, boolean...) are combined as pd.concat would,
+    # e.g. int64 and Int64 as Int64. find_common_type is not part of pandas' public API
+    from pandas.core.dtypes.cast import find_common_type
+
+    try:
+        if all(isinstance(dtype, np.dtype) for dtype in dtypes):
+            dtype = np.result_type(*dtypes)
+        else:
+            dtype = find_common_type(list(dtypes))
+    except (TypeError, ValueError):
+        return np.dtype(object)
+
+    # Rows from frames without the column are missing values,
+    # which extension dtypes can hold
+    if not complete and isinstance(dtype, np.dtype) and dtype.kind in "iub":
+        return np.dtype(float) if dtype.kind != "b" else np.dtype(object)
+
+    return dtype
+
+
+def _first_column(frame, name):
+    # Duplicate names after matching keep the first column
+    series = frame[name]
+    if isinstance(series, pd.DataFrame):
+        series = series.iloc[:, 0]
+    return series
+
+
+def union_frames(frames, sources, source_column="source"):
+    """
+    Stacks tables with drifting schemas into one table, such as the yearly resources of a package.
+
+    Columns are matched by name, ignoring case, spacing and punctuation, and keep the name
+    they have in the first table they appear in. Their dtypes are widened to a common dtype,
+    and the combined table is filled in place rather than built by repeated concatenation.
+
+    Parameters
+    ----------
+    frames: list
+        Tables to combine, as pd.DataFrame
+    sources: list
+        Name of the source of each table, e.g. the resource name
+    source_column: str, optional (default="source")
+        Name of the column recording the source of each row. None leaves it out
+
+    Returns
+    ----------
+    pd.DataFrame:
+        Combined table
+    """
+
+    lengths = [len(frame) for frame in frames]
+    offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(int)
+    total = int(offsets[-1])
+
+    columns = {}
+    for i, frame in enumerate(frames):
+        for name in frame.columns:
+            column = columns.setdefault(_column_key(name), {"name": name, "parts": {}})
+            column["parts"].setdefault(i, name)
+
+    data = {}
+
+    if source_column is not None:
+        categories = list(pd.unique(pd.Series(sources, dtype=object)))
+        codes = np.repeat([categories.index(source) for source in sources], lengths)
+        data[source_column] = pd.Categorical.from_codes(codes, categories=categories)
+
+    for column in columns.values():
+        parts = column["parts"]
+        dtype = _common_dtype(
+            [_first_column(frames[i], name).dtype for i, name in parts.items()],
+            complete=len(parts) == len(frames),
+        )
+
+        if isinstance(dtype, np.dtype):
+            values = np.empty(total, dtype=dtype)
+            if len(parts) < len(frames):
+                values[:] = np.datetime64("NaT") if dtype.kind in "mM" else None
+        else:
+            values = pd.array([None] * total, dtype=dtype)
+
+        for i, name in parts.items():
+            series = _first_column(frames[i], name)
+            if isinstance(dtype, np.dtype):
+                part = series.to_numpy(dtype=dtype)
+            else:
+                part = series.astype(dtype).array
+            values[offsets[i] : offsets[i + 1]] = part
+
+        data[column["name"]] = values
+
+    return pd.DataFrame(data, copy=False)
+
+
+def memory_usage(data):
+    """
+    Measures the memory taken by data returned by ckanTO.
+
+    Parameters
+    ----------
+    data: pd.DataFrame, pyarrow.Table, list or dict
+        Data, as returned by get_resource
+
+    Returns
+    ----------
+    int:
+        Size in bytes, including the Python objects held by object columns
+    """
+
+    if isinstance(data, pd.DataFrame):
+        return int(data.memory_usage(deep=True).sum())
+
+    if type(data).__module__.startswith("pyarrow"):
+        return int(data.nbytes)
+
+    if isinstance(data, dict):
+        return sys.getsizeof(data) + sum(
+            sys.getsizeof(k) + memory_usage(v) for k, v in data.items()
+        )
+
+    if isinstance(data, list):
+        return sys.getsizeof(data) + sum(memory_usage(v) for v in data)
+
+    return sys.getsizeof(data)
+
+
+def fields_to_schema(fields):
+    """
+    Converts the fields of a DataStore resource to a schema.
+
+    Parameters
+    ----------
+    fields: list
+        Fields returned by datastore_search, one dict per column with its id and type
+
+    Returns
+    ----------
+    dict:
+        pandas dtype for each column, object for types without an equivalent
+    """
+
+    return {
+        field["id"]: DATASTORE_DTYPES.get(field.get("type"), "object")
+        for field in fields
+    }
+
+
+def frame_schema(data):
+    """
+    Records the resolved dtypes of a table as a schema.
+
+    Parameters
+    ----------
+    data: pd.DataFrame
+        Table, as read from a resource
+
+    Returns
+    ----------
+    dict:
+        pandas dtype for each column
+    """
+
+    return {str(column): str(dtype) for column, dtype in data.dtypes.items()}
+
+
+def apply_schema(data, schema):
+    """
+    Casts a table to a schema, so that tables read separately
+    (such as the pages of a DataStore resource) have the same columns and dtypes.
+
+    Parameters
+    ----------
+    data: pd.DataFrame
+        Table to cast, where missing values are None or NaN
+    schema: dict
+        dtype of each column (see fields_to_schema)
+
+    Returns
+    ----------
+    pd.DataFrame:
+        Table with the columns of the schema, in its order
+    """
+
+    data = data.reindex(columns=list(schema))
+
+    for column, dtype in schema.items():
+        if dtype.startswith("datetime64"):
+            data[column] = pd.to_datetime(data[column], errors="coerce")
+        elif dtype in ["Int64", "float64"]:
+            data[column] = pd.to_numeric(data[column], errors="coerce").astype(dtype)
+        else:
+            data[column] = data[column].astype(dtype)
+
+    return data
 
 
-def read_file(filepath, file_ext):
+def _schema_read_args(schema):
+    # Dates are parsed by read_csv rather than given as a dtype
+    if not schema:
+        return {}
+
+    parse_dates = [c for c, dtype in schema.items() if dtype.startswith("datetime64")]
+    dtype = {c: dtype for c, dtype in schema.items() if c not in parse_dates}
+
+    return {"dtype": dtype, "parse_dates": parse_dates or None}
+
+
+def read_file(filepath, file_ext, nrows=None):
     """
     Retrieves data when the resource is not part of the CKAN DataStore.
 
     Parameters
     ----------
-    filepath: pathlib.Path
-        Path to where the data file is temporarily downloaded
+    filepath: pathlib.Path or io.BytesIO
+        Path to where the data file is temporarily downloaded, or buffer holding its content
     file_ext: str
         File extension
+    nrows: int, optional
+        Number of rows (or lines, or list items) to read. Defaults to all of them
 
     Returns
     ----------
@@ -111,17 +1087,21 @@ def read_file(filepath, file_ext):
         "shp": read_file_shp,
     }
 
-    return funcs[file_ext](filepath)
+    return funcs[file_ext](filepath, nrows=nrows)
 
 
-def read_file_csv(filepath):
+def read_file_csv(filepath, nrows=None, schema=None):
     """
     Retrieves csv format data.
 
     Parameters
     ----------
-    filepath: pathlib.Path
-        Path to where the data file is temporarily downloaded
+    filepath: pathlib.Path or io.BytesIO
+        Path to where the data file is temporarily downloaded, or buffer holding its content
+    nrows: int, optional
+        Number of rows to read. Defaults to all of them
+    schema: dict, optional
+        dtype of each column (see frame_schema), which spares pandas from inferring them
 
     Returns
     ----------
@@ -129,17 +1109,41 @@ def read_file_csv(filepath):
         Data in table format
     """
 
-    return pd.read_csv(filepath)
+    return pd.read_csv(filepath, nrows=nrows, **_schema_read_args(schema))
+
+
+def read_file_csv_chunks(filepath, chunksize, schema=None):
+    """
+    Retrieves csv format data in chunks.
+
+    Parameters
+    ----------
+    filepath: pathlib.Path or io.BytesIO
+        Path to where the data file is temporarily downloaded, or buffer holding its content
+    chunksize: int
+        Number of rows per chunk
+    schema: dict, optional
+        dtype of each column (see frame_schema), which also keeps dtypes the same across chunks
+
+    Returns
+    ----------
+    iterator:
+        pandas.DataFrame chunks of at most chunksize rows
+    """
+
+    return pd.read_csv(filepath, chunksize=chunksize, **_schema_read_args(schema))
 
 
-def read_file_excel(filepath):
+def read_file_excel(filepath, nrows=None):
     """
     Retrieves Excel (xls, xlsx, xlsm) format data.
 
     Parameters
     ----------
-    filepath: pathlib.Path
-        Path to where the data file is temporarily downloaded
+    filepath: pathlib.Path or io.BytesIO
+        Path to where the data file is temporarily downloaded, or buffer holding its content
+    nrows: int, optional
+        Number of rows to read from each sheet. Defaults to all of them
 
     Returns
     ----------
@@ -147,7 +1151,7 @@ def read_file_excel(filepath):
         Data in table format
     """
 
-    dfs = pd.read_excel(filepath, sheet_name=None)
+    dfs = pd.read_excel(filepath, sheet_name=None, nrows=nrows)
 
     if len(dfs) == 1:
         dfs = dfs[next(iter(dfs))]
@@ -155,31 +1159,42 @@ def read_file_excel(filepath):
     return dfs
 
 
-def read_file_geojson(filepath):
+def read_file_geojson(filepath, nrows=None):
     """
     Retrieves geojson format data.
 
     Parameters
     ----------
-    filepath: pathlib.Path
-        Path to where the data file is temporarily downloaded
+    filepath: pathlib.Path or io.BytesIO
+        Path to where the data file is temporarily downloaded, or buffer holding its content
+    nrows: int, optional
+        Number of features to read. Defaults to all of them
 
     Returns
     ----------
     pandas.DataFrame:
         Data in table format
     """
-    return geopandas.read_file(filepath)
+
+    import geopandas
+
+    if _is_compressed(filepath):
+        with open_file(filepath) as in_file:
+            return geopandas.read_file(in_file, rows=nrows)
+
+    return geopandas.read_file(filepath, rows=nrows)
 
 
-def read_file_json(filepath):
+def read_file_json(filepath, nrows=None):
     """
     Retrieves JSON format data.
 
     Parameters
     ----------
-    filepath: pathlib.Path
-        Path to where the data file is temporarily downloaded
+    filepath: pathlib.Path or io.BytesIO
+        Path to where the data file is temporarily downloaded, or buffer holding its content
+    nrows: int, optional
+        Number of items to keep, when the data is a list. Defaults to all of them
 
     Returns
     ----------
@@ -187,20 +1202,25 @@ def read_file_json(filepath):
         Data in dict format
     """
 
-    with open(filepath, "r") as in_file:
+    with _open_text(filepath) as in_file:
         data_json = json.load(in_file)
 
+    if nrows is not None and isinstance(data_json, list):
+        data_json = data_json[:nrows]
+
     return data_json
 
 
-def read_file_txt(filepath):
+def read_file_txt(filepath, nrows=None):
     """
     Retrieves text format data.
 
     Parameters
     ----------
-    filepath: pathlib.Path
-        Path to where the data file is temporarily downloaded
+    filepath: pathlib.Path or io.BytesIO
+        Path to where the data file is temporarily downloaded, or buffer holding its content
+    nrows: int, optional
+        Number of lines to read. Defaults to all of them
 
     Returns
     ----------
@@ -208,12 +1228,12 @@ def read_file_txt(filepath):
         Data in list format, where each list element representing a line of text
     """
 
-    with open(filepath, "r") as in_file:
-        data_txt = [l.strip() for l in in_file.readlines()]
+    with _open_text(filepath) as in_file:
+        data_txt = [l.strip() for l in itertools.islice(in_file, nrows)]
     return data_txt
 
 
-def read_file_shp(filepath):
+def read_file_shp(filepath, nrows=None):
     """
     Retrieves SHP format data.
 
@@ -221,6 +1241,8 @@ def read_file_shp(filepath):
     ----------
     filepath: pathlib.Path
         Path to where the data file is temporarily downloaded
+    nrows: int, optional
+        Number of features to read. Defaults to all of them
 
     Returns
     ----------
@@ -228,4 +1250,6 @@ def read_file_shp(filepath):
         Data in table format
     """
 
-    return geopandas.read_file(filepath)
+    import geopandas
+
+    return geopandas.read_file(filepath, rows=nrows)
@@ -14,6 +14,15 @@ def read_requirements(file_):
 
 install_requires = read_requirements("requirements.txt")
 
+# Optional features, with the oldest versions they work with
+extras_require = {
+    "spatial": ["shapely>=2.0"],
+    "arrow": ["pyarrow>=7.0"],
+    "dask": ["dask[dataframe]>=2023.9.0"],
+    "zstd": ["zstandard>=0.15"],
+}
+extras_require["all"] = sorted(set(sum(extras_require.values(), [])))
+
 
 with open(os.path.join(here, "VERSION")) as f:
     version = f.read().strip()
@@ -26,9 +35,11 @@ setup(
     author="Alex Wang",
     author_email="x249wang@uwaterloo.ca",
     install_requires=install_requires,
+    extras_require=extras_require,
     packages=["pyopendatato"],
     url="https://github.com/x249wang/pyopendatato",
     include_package_data=True,
+    entry_points={"console_scripts": ["pyopendatato=pyopendatato.cli:main"]},
     license="mit",
     classifiers=[
         "Programming Language :: Python :: 3 :: Only",
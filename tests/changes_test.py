@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+from datetime import datetime
+from unittest import mock
+
+from pyopendatato.changes import ChangeTracker
+from pyopendatato.ckanTO import ckanTO
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def test_cached_metadata_is_reused():
+
+    with mock.patch("ckanapi.RemoteCKAN") as mockCKAN:
+
+        mock_ckan = mockCKAN()
+        mock_ckan.action.package_show.return_value = json.load(
+            open(os.path.join(FIXTURES_DIR, "package_metadata.json"), "r")
+        )
+
+        c = ckanTO(cache_metadata=True)
+        first = c.get_package_metadata("1db34737-ffad-489d-a590-9171d500d453")
+        second = c.get_package_metadata("1db34737-ffad-489d-a590-9171d500d453")
+        resource = c.get_resource_metadata(first["resources"][0]["id"])
+
+        assert first == second
+        assert resource == first["resources"][0]
+        assert mock_ckan.action.package_show.call_count == 1
+        assert mock_ckan.action.resource_show.call_count == 0
+
+
+def test_change_tracker_invalidates_changed_packages():
+
+    package = json.load(open(os.path.join(FIXTURES_DIR, "package_metadata.json"), "r"))
+    resource_id = package["resources"][0]["id"]
+
+    with mock.patch("ckanapi.RemoteCKAN") as mockCKAN:
+
+        mock_ckan = mockCKAN()
+        mock_ckan.action.package_show.return_value = package
+        mock_ckan.action.package_search.return_value = {
+            "count": 1,
+            "results": [
+                {"id": package["id"], "metadata_modified": "2019-10-01T10:00:00.5"}
+            ],
+        }
+
+        c = ckanTO(cache_metadata=True)
+        c.get_package_metadata(package["id"])
+
+        tracker = ChangeTracker(c, since=datetime(2019, 10, 1))
+        assert tracker.poll() == [package["id"]]
+        assert tracker.since == datetime(2019, 10, 1, 10, 0, 0, 500000)
+
+        fq = mock_ckan.action.package_search.call_args[1]["fq"]
+        assert fq == "metadata_modified:{2019-10-01T00:00:00.000000Z TO *]"
+
+        c.get_resource_metadata(resource_id)
+        c.get_package_metadata(package["id"])
+
+        assert mock_ckan.action.resource_show.call_count == 1
+        assert mock_ckan.action.package_show.call_count == 2
+
+
+def test_change_tracker_invalidates_packages_cached_by_name():
+
+    package = json.load(open(os.path.join(FIXTURES_DIR, "package_metadata.json"), "r"))
+    resource_id = package["resources"][0]["id"]
+
+    with mock.patch("ckanapi.RemoteCKAN") as mockCKAN:
+
+        mock_ckan = mockCKAN()
+        mock_ckan.action.package_show.return_value = package
+        mock_ckan.action.package_search.return_value = {
+            "count": 1,
+            "results": [
+                {"id": package["id"], "metadata_modified": "2019-10-01T10:00:00.5"}
+            ],
+        }
+
+        c = ckanTO(cache_metadata=True)
+        c.get_package_metadata(package["name"])
+
+        tracker = ChangeTracker(c, since=datetime(2019, 10, 1))
+        assert tracker.poll() == [package["id"]]
+        assert package["name"] not in c._packages
+
+        c.get_resource_metadata(resource_id)
+        c.get_package_metadata(package["name"])
+
+        assert mock_ckan.action.resource_show.call_count == 1
+        assert mock_ckan.action.package_show.call_count == 2
+
+
+def test_change_tracker_leaves_unchanged_packages_cached():
+
+    package = json.load(open(os.path.join(FIXTURES_DIR, "package_metadata.json"), "r"))
+
+    with mock.patch("ckanapi.RemoteCKAN") as mockCKAN:
+
+        mock_ckan = mockCKAN()
+        mock_ckan.action.package_show.return_value = package
+        mock_ckan.action.package_search.return_value = {"count": 0, "results": []}
+
+        c = ckanTO(cache_metadata=True)
+        c.get_package_metadata(package["id"])
+
+        assert ChangeTracker(c).poll() == []
+
+        c.get_package_metadata(package["id"])
+        assert mock_ckan.action.package_show.call_count == 1
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+
+import io
+import json
+import zipfile
+from unittest import mock
+
+import pytest
+import responses
+
+from pyopendatato.cli import EXIT_FAILED, EXIT_OK, EXIT_PARTIAL, main
+
+
+def _package(*resources):
+    return {
+        "count": 1,
+        "results": [
+            {
+                "id": "pkg",
+                "name": "pkg",
+                "resources": [
+                    {
+                        "id": resource_id,
+                        "name": resource_id.upper(),
+                        "format": "CSV",
+                        "datastore_active": False,
+                        "last_modified": "2019-09-28",
+                        "package_id": "pkg",
+                        "url": "https://www.alink.com/" + resource_id,
+                    }
+                    for resource_id in resources
+                ],
+            }
+        ],
+    }
+
+
+@responses.activate
+def test_mirror(tmp_path, capsys):
+
+    responses.add(responses.GET, "https://www.alink.com/a", body="col1\n1\n")
+    responses.add(responses.GET, "https://www.alink.com/b", body="col1\n2\n")
+
+    with mock.patch("ckanapi.RemoteCKAN") as mockCKAN:
+
+        mock_ckan = mockCKAN()
+        mock_ckan.action.package_search.return_value = _package("a", "b")
+
+        code = main(["mirror", "all", "-o", str(tmp_path), "--format", "csv"])
+        again = main(["mirror", "all", "-o", str(tmp_path), "--format", "csv"])
+
+        # The search results are reused for the resources of the packages
+        assert mock_ckan.action.package_search.call_count == 2
+        mock_ckan.action.package_show.assert_not_called()
+
+    out = capsys.readouterr().out
+    manifest = json.loads((tmp_path / "manifest.json").read_text())
+
+    assert code == EXIT_OK
+    assert again == EXIT_OK
+    assert (tmp_path / "pkg" / "A-a.csv").read_text() == "col1\n1\n"
+    assert manifest["b"]["files"] == ["pkg/B-b.csv"]
+    assert "Mirrored 2 resources (0 unchanged" in out
+    assert "Mirrored 0 resources (2 unchanged" in out
+    assert len(responses.calls) == 2
+
+
+@pytest.mark.parametrize(
+    "statuses, expected", [((500, 200), EXIT_PARTIAL), ((500, 500), EXIT_FAILED)]
+)
+@responses.activate
+def test_mirror_exit_codes(tmp_path, capsys, statuses, expected):
+
+    responses.add(responses.GET, "https://www.alink.com/a", status=statuses[0])
+    responses.add(responses.GET, "https://www.alink.com/b", status=statuses[1])
+
+    with mock.patch("ckanapi.RemoteCKAN") as mockCKAN:
+
+        mock_ckan = mockCKAN()
+        mock_ckan.action.package_search.return_value = _package("a", "b")
+
+        code = main(["mirror", "pkg", "-o", str(tmp_path)])
+
+    captured = capsys.readouterr()
+
+    assert code == expected
+    assert "Failed a (A)" in captured.err
+    assert "Failed" not in captured.out
+
+
+def test_mirror_invalid_arguments():
+
+    with pytest.raises(SystemExit) as error:
+        main(["mirror"])
+
+    assert error.value.code == 2
+
+
+@responses.activate
+def test_mirror_archive_mixed_members(tmp_path):
+
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zip_file:
+        zip_file.writestr("a.csv", "col1\n" + "".join(f"{i}\n" for i in range(1000)))
+        zip_file.writestr("readme.txt", "line 1\nline 2\n")
+
+    responses.add(responses.GET, "https://www.alink.com/a", body=archive.getvalue())
+
+    package = _package("a")
+    package["results"][0]["resources"][0]["format"] = "ZIP"
+
+    with mock.patch("ckanapi.RemoteCKAN") as mockCKAN:
+
+        mock_ckan = mockCKAN()
+        mock_ckan.action.package_search.return_value = package
+        mock_ckan.action.resource_show.return_value = package["results"][0][
+            "resources"
+        ][0]
+
+        code = main(["mirror", "pkg", "-o", str(tmp_path), "--format", "csv"])
+
+    manifest = json.loads((tmp_path / "manifest.json").read_text())
+
+    assert code == EXIT_OK
+    assert sorted(manifest["a"]["files"]) == [
+        "pkg/A-a-a.csv.csv",
+        "pkg/A-a-readme.txt.json",
+    ]
+    assert len((tmp_path / "pkg" / "A-a-a.csv.csv").read_text().splitlines()) == 1001
+    assert json.loads((tmp_path / "pkg" / "A-a-readme.txt.json").read_text()) == [
+        "line 1",
+        "line 2",
+    ]
+
+
+@responses.activate
+def test_mirror_raw_cache_dir(tmp_path):
+
+    responses.add(responses.GET, "https://www.alink.com/a", body="col1\n1\n")
+
+    with mock.patch("ckanapi.RemoteCKAN") as mockCKAN:
+
+        mock_ckan = mockCKAN()
+        mock_ckan.action.package_search.return_value = _package("a")
+
+        for name in ["first", "second"]:
+            code = main(
+                [
+                    "mirror",
+                    "pkg",
+                    "-o",
+                    str(tmp_path / name),
+                    "--cache-dir",
+                    str(tmp_path / "cache"),
+                ]
+            )
+            assert code == EXIT_OK
+            assert (tmp_path / name / "pkg" / "A-a.csv").read_text() == "col1\n1\n"
+
+    assert len(responses.calls) == 1
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 
+import gzip
 import json
 import os
 import urllib
@@ -12,7 +13,8 @@ import pandas as pd
 import geopandas
 from shapely.geometry import Point
 
-from pyopendatato.ckanTO import ckanTO
+from pyopendatato.ckanTO import MemoryBudgetError, ckanTO
+from pyopendatato.utils import open_download, read_file_csv, union_frames
 
 DATASTORE_SEARCH_URL = (
     "https://ckan0.cf.opendata.inter.prod-toronto.ca/api/action/datastore_search"
@@ -353,3 +355,765 @@ def test_get_resource_zip():
         assert list(data.keys()) == ["sample_csv.csv", "sample_xlsx.xlsx"]
         assert data["sample_csv.csv"].equals(ref)
         assert data["sample_xlsx.xlsx"].equals(ref)
+
+
+@pytest.mark.parametrize("spill_threshold", [0, 1024])
+@responses.activate
+def test_get_resource_spill_threshold(spill_threshold):
+
+    url = "https://www.alink.com"
+
+    body = b'{"key1": "hello", "key2": "world"}'
+    responses.add(
+        responses.GET,
+        url,
+        status=200,
+        body=body,
+        headers={"Content-Length": str(len(body))},
+    )
+
+    with mock.patch("ckanapi.RemoteCKAN") as mockCKAN:
+
+        mock_ckan = mockCKAN()
+        mock_ckan.action.resource_show.return_value = {
+            "datastore_active": False,
+            "format": "JSON",
+            "url": url,
+            "id": "123",
+            "name": "Test data",
+            "last_modified": "2019-09-28",
+            "package_id": "ABC",
+        }
+
+        c = ckanTO(spill_threshold=spill_threshold)
+        data = c.get_resource(resource_id="123")
+
+        assert data == {"key1": "hello", "key2": "world"}
+
+
+@responses.activate
+def test_open_download():
+
+    url = "https://www.alink.com"
+    responses.add(
+        responses.GET,
+        url,
+        status=200,
+        body=b"hello\nworld",
+        headers={"Content-Length": "11"},
+    )
+
+    with open_download(url, ".txt", spill_threshold=1024) as source:
+        assert source.read() == b"hello\nworld"
+
+    with open_download(url, ".txt", spill_threshold=0) as source:
+        assert source.read_bytes() == b"hello\nworld"
+
+    assert not source.exists()
+
+
+@responses.activate
+def test_open_download_compressed():
+
+    url = "https://www.alink.com"
+    body = gzip.compress(b"hello\nworld")
+    responses.add(
+        responses.GET,
+        url,
+        status=200,
+        body=body,
+        headers={"Content-Encoding": "gzip", "Content-Length": str(len(body))},
+    )
+
+    # The decoded size is estimated as a multiple of the compressed one
+    with open_download(url, ".txt", spill_threshold=len(body) * 10) as source:
+        assert source.read() == b"hello\nworld"
+
+    with open_download(url, ".txt", spill_threshold=len(body) * 2) as source:
+        assert source.read_bytes() == b"hello\nworld"
+
+
+def _add_datastore_page(resource_id, offset, limit, records, total):
+
+    params = {"resource_id": resource_id, "limit": limit}
+    if offset:
+        params["offset"] = offset
+
+    responses.add(
+        responses.GET,
+        DATASTORE_SEARCH_URL + "?" + urllib.parse.urlencode(params),
+        status=200,
+        json={"result": {"records": records, "fields": [], "total": total}},
+    )
+
+
+@responses.activate
+def test_get_resource_datastore_chunks():
+
+    records = [{"_id": i, "col1": i * 10} for i in range(5)]
+
+    _add_datastore_page("123", 0, 2, records[0:2], 5)
+    _add_datastore_page("123", 2, 2, records[2:4], 5)
+    _add_datastore_page("123", 4, 2, records[4:5], 5)
+
+    with mock.patch("ckanapi.RemoteCKAN") as mockCKAN:
+
+        mock_ckan = mockCKAN()
+        mock_ckan.action.resource_show.return_value = {
+            "datastore_active": True,
+            "format": "CSV",
+        }
+
+        c = ckanTO()
+        chunks = list(c.get_resource(resource_id="123", chunksize=2))
+
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    assert pd.concat(chunks, ignore_index=True).equals(pd.DataFrame(records))
+
+
+@responses.activate
+def test_get_resource_csv_chunks():
+
+    url = "https://www.alink.com"
+    responses.add(responses.GET, url, status=200, body=b"col1,col2\n1,3\n2,4\n5,6")
+
+    with mock.patch("ckanapi.RemoteCKAN") as mockCKAN:
+
+        mock_ckan = mockCKAN()
+        mock_ckan.action.resource_show.return_value = {
+            "datastore_active": False,
+            "format": "CSV",
+            "url": url,
+            "last_modified": "2019-09-28",
+        }
+
+        c = ckanTO()
+        chunks = list(c.get_resource(resource_id="123", chunksize=2))
+
+    assert [len(chunk) for chunk in chunks] == [2, 1]
+    assert pd.concat(chunks, ignore_index=True).equals(
+        pd.DataFrame({"col1": [1, 2, 5], "col2": [3, 4, 6]})
+    )
+
+
+def test_get_resource_chunks_invalid_format():
+
+    with mock.patch("ckanapi.RemoteCKAN") as mockCKAN:
+
+        mock_ckan = mockCKAN()
+        mock_ckan.action.resource_show.return_value = {
+            "datastore_active": False,
+            "format": "XLSX",
+        }
+
+        c = ckanTO()
+
+        with pytest.raises(Exception):
+            c.get_resource(resource_id="123", chunksize=2)
+
+
+@responses.activate
+def test_get_resource_dask_datastore():
+
+    dd = pytest.importorskip("dask.dataframe")
+
+    records = [{"_id": i, "col1": i * 10} for i in range(5)]
+
+    _add_datastore_page("123", 0, 1, records[0:1], 5)
+    _add_datastore_page("123", 0, 3, records[0:3], 5)
+    _add_datastore_page("123", 3, 3, records[3:5], 5)
+
+    with mock.patch("ckanapi.RemoteCKAN") as mockCKAN:
+
+        mock_ckan = mockCKAN()
+        mock_ckan.action.resource_show.return_value = {
+            "datastore_active": True,
+            "format": "CSV",
+        }
+
+        c = ckanTO()
+        data = c.get_resource_dask(resource_id="123", chunksize=3)
+
+        assert isinstance(data, dd.DataFrame)
+        assert data.npartitions == 2
+        assert data["col1"].sum().compute() == 100
+
+
+@responses.activate
+def test_get_resource_dask_datastore_nulls():
+
+    pytest.importorskip("dask.dataframe")
+
+    records = [{"_id": i, "v": i * 0.5, "name": f"n{i}"} for i in range(4)]
+    records[3]["v"] = None
+    fields = [
+        {"id": "_id", "type": "int"},
+        {"id": "v", "type": "numeric"},
+        {"id": "name", "type": "text"},
+    ]
+
+    pages = [(0, 1, records[0:1]), (0, 2, records[0:2]), (2, 2, records[2:4])]
+    for offset, limit, page in pages:
+        params = {"resource_id": "123", "limit": limit}
+        if offset:
+            params["offset"] = offset
+        responses.add(
+            responses.GET,
+            DATASTORE_SEARCH_URL + "?" + urllib.parse.urlencode(params),
+            status=200,
+            json={"result": {"records": page, "fields": fields, "total": 4}},
+        )
+
+    with mock.patch("ckanapi.RemoteCKAN") as mockCKAN:
+
+        mock_ckan = mockCKAN()
+        mock_ckan.action.resource_show.return_value = {
+            "datastore_active": True,
+            "format": "CSV",
+        }
+
+        c = ckanTO()
+        data = c.get_resource_dask(resource_id="123", chunksize=2)
+
+        assert str(data["v"].dtype) == "float64"
+        assert str(data["_id"].dtype) == "Int64"
+        assert data["v"].sum().compute() == 1.5
+        assert data["v"].isna().sum().compute() == 1
+
+
+@responses.activate
+def test_get_resource_datastore_arrow():
+
+    pa = pytest.importorskip("pyarrow")
+
+    fields = [{"id": "_id", "type": "int"}, {"id": "col1", "type": "text"}]
+
+    responses.add(
+        responses.GET,
+        DATASTORE_SEARCH_URL
+        + "?"
+        + urllib.parse.urlencode({"resource_id": "123", "limit": 1}),
+        status=200,
+        json={"result": {"records": [], "fields": fields, "total": 2}},
+    )
+    responses.add(
+        responses.GET,
+        DATASTORE_SEARCH_URL
+        + "?"
+        + urllib.parse.urlencode(
+            {"resource_id": "123", "limit": 2, "records_format": "csv"}
+        ),
+        status=200,
+        json={"result": {"records": "1,a\n2,b\n", "fields": fields, "total": 2}},
+    )
+
+    with mock.patch("ckanapi.RemoteCKAN") as mockCKAN:
+
+        mock_ckan = mockCKAN()
+        mock_ckan.action.resource_show.return_value = {
+            "datastore_active": True,
+            "format": "CSV",
+        }
+
+        c = ckanTO()
+        data = c.get_resource(resource_id="123", arrow=True)
+
+    assert isinstance(data, pa.Table)
+    assert data.to_pydict() == {"_id": [1, 2], "col1": ["a", "b"]}
+
+
+@responses.activate
+def test_get_resource_csv_arrow():
+
+    pa = pytest.importorskip("pyarrow")
+
+    url = "https://www.alink.com"
+
+    with open(os.path.join(FIXTURES_DIR, "sample_csv.csv"), "rb") as content:
+        responses.add(responses.GET, url, status=200, body=content.read())
+
+    with mock.patch("ckanapi.RemoteCKAN") as mockCKAN:
+
+        mock_ckan = mockCKAN()
+        mock_ckan.action.resource_show.return_value = {
+            "datastore_active": False,
+            "format": "CSV",
+            "url": url,
+            "last_modified": "2019-09-28",
+        }
+
+        c = ckanTO()
+        data = c.get_resource(resource_id="123", arrow=True)
+
+    assert isinstance(data, pa.Table)
+    assert data.to_pydict() == {"col1": [1, 2], "col2": [3, 4]}
+
+
+def test_get_resource_arrow_invalid_format():
+
+    pytest.importorskip("pyarrow")
+
+    with mock.patch("ckanapi.RemoteCKAN") as mockCKAN:
+
+        mock_ckan = mockCKAN()
+        mock_ckan.action.resource_show.return_value = {
+            "datastore_active": False,
+            "format": "JSON",
+            "url": "https://www.alink.com",
+            "last_modified": "2019-09-28",
+        }
+
+        c = ckanTO()
+
+        with pytest.raises(Exception):
+            c.get_resource(resource_id="123", arrow=True)
+
+
+PACKAGE_RESOURCES = [
+    {
+        "id": "1",
+        "name": "Bike Share 2019.xlsx",
+        "format": "XLSX",
+        "datastore_active": False,
+        "url": "https://www.alink.com/1",
+        "last_modified": "2019-09-28",
+    },
+    {
+        "id": "2",
+        "name": "bike-share-2019",
+        "format": "CSV",
+        "datastore_active": False,
+        "url": "https://www.alink.com/2",
+        "last_modified": "2019-09-28",
+    },
+    {
+        "id": "3",
+        "name": "Bike Share 2019 Readme",
+        "format": "PDF",
+        "datastore_active": False,
+        "url": "https://www.alink.com/3",
+        "last_modified": "2019-09-28",
+    },
+]
+
+
+def test_choose_package_resources():
+
+    with mock.patch("ckanapi.RemoteCKAN") as mockCKAN:
+
+        mock_ckan = mockCKAN()
+        mock_ckan.action.package_show.return_value = {"resources": PACKAGE_RESOURCES}
+
+        c = ckanTO()
+
+        fastest = c.choose_package_resources(package_id="ABC")
+        excel = c.choose_package_resources(package_id="ABC", prefer=["XLSX", "CSV"])
+
+        with pytest.raises(Exception):
+            c.choose_package_resources(package_id="ABC", prefer="smallest")
+
+    assert fastest["id"].tolist() == ["2"]
+    assert fastest["load_as"].tolist() == ["CSV"]
+    assert fastest["group"].tolist() == ["bike share 2019"]
+    assert excel["id"].tolist() == ["1"]
+
+
+@responses.activate
+def test_get_package_data():
+
+    with open(os.path.join(FIXTURES_DIR, "sample_csv.csv"), "rb") as content:
+        responses.add(
+            responses.GET, "https://www.alink.com/2", status=200, body=content.read()
+        )
+
+    with mock.patch("ckanapi.RemoteCKAN") as mockCKAN:
+
+        mock_ckan = mockCKAN()
+        mock_ckan.action.package_show.return_value = {"resources": PACKAGE_RESOURCES}
+        mock_ckan.action.resource_show.side_effect = lambda id: PACKAGE_RESOURCES[
+            int(id) - 1
+        ]
+
+        c = ckanTO()
+        data = c.get_package_data(package_id="ABC")
+
+        with pytest.raises(Exception):
+            c.get_package_data(package_id="ABC", prefer=["SHP"])
+
+    assert data.equals(pd.DataFrame({"col1": [1, 2], "col2": [3, 4]}))
+    assert len(responses.calls) == 1
+
+
+@responses.activate
+def test_get_package_data_file_over_datastore():
+
+    resources = [dict(PACKAGE_RESOURCES[1], datastore_active=True)]
+
+    with open(os.path.join(FIXTURES_DIR, "sample_csv.csv"), "rb") as content:
+        responses.add(
+            responses.GET, "https://www.alink.com/2", status=200, body=content.read()
+        )
+
+    with mock.patch("ckanapi.RemoteCKAN") as mockCKAN:
+
+        mock_ckan = mockCKAN()
+        mock_ckan.action.package_show.return_value = {"resources": resources}
+        mock_ckan.action.resource_show.return_value = resources[0]
+
+        c = ckanTO()
+        chosen = c.choose_package_resources(package_id="ABC", prefer=["CSV"])
+        data = c.get_package_data(package_id="ABC", prefer=["CSV", "DATASTORE"])
+
+    assert chosen["load_as"].tolist() == ["CSV"]
+    assert data.equals(pd.DataFrame({"col1": [1, 2], "col2": [3, 4]}))
+    assert [call.request.url for call in responses.calls] == ["https://www.alink.com/2"]
+
+
+@responses.activate
+def test_get_package_union():
+
+    responses.add(
+        responses.GET,
+        "https://www.alink.com/2019",
+        status=200,
+        body="Date,Min Delay\n2019-01-01,1\n2019-01-02,2\n",
+    )
+    responses.add(
+        responses.GET,
+        "https://www.alink.com/2020",
+        status=200,
+        body="date,min_delay,vehicle\n2020-01-01,1.5,A\n",
+    )
+
+    resources = [
+        {
+            "id": year,
+            "name": f"Delays {year}",
+            "format": "CSV",
+            "datastore_active": False,
+            "url": f"https://www.alink.com/{year}",
+            "last_modified": "2020-09-28",
+        }
+        for year in ["2019", "2020"]
+    ] + [
+        {
+            "id": "readme",
+            "name": "Delays readme",
+            "format": "PDF",
+            "datastore_active": False,
+            "url": "https://www.alink.com/readme",
+            "last_modified": "2020-09-28",
+        }
+    ]
+
+    with mock.patch("ckanapi.RemoteCKAN") as mockCKAN:
+
+        mock_ckan = mockCKAN()
+        mock_ckan.action.package_show.return_value = {"resources": resources}
+        mock_ckan.action.resource_show.side_effect = lambda id: next(
+            r for r in resources if r["id"] == id
+        )
+
+        c = ckanTO()
+        data = c.get_package_union(package_id="ABC", name=r"\d{4}", format="csv")
+
+        with pytest.raises(Exception):
+            c.get_package_union(package_id="ABC", name="2021")
+
+    ref = pd.DataFrame(
+        {
+            "source": pd.Categorical(["Delays 2019", "Delays 2019", "Delays 2020"]),
+            "Date": ["2019-01-01", "2019-01-02", "2020-01-01"],
+            "Min Delay": [1.0, 2.0, 1.5],
+            "vehicle": [None, None, "A"],
+        }
+    )
+
+    assert data.equals(ref)
+
+
+def test_union_frames_dtypes():
+
+    first = pd.DataFrame({"Count": [1, 2], "name": ["a", "b"]})
+    first["name"] = first["name"].astype("string")
+    second = pd.DataFrame([[pd.NA, 7, 8]], columns=["count", "Min Delay", "min_delay"])
+    second["count"] = second["count"].astype("Int64")
+
+    data = union_frames([first, second], ["2019", "2020"])
+
+    assert str(data["Count"].dtype) == "Int64"
+    assert data["Count"].isna().tolist() == [False, False, True]
+    assert str(data["name"].dtype) == "string"
+    assert data["name"].isna().tolist() == [False, False, True]
+    # Duplicate names after matching keep the first column
+    assert data["Min Delay"].tolist()[2] == 7
+
+
+@responses.activate
+def test_preview_resource_datastore():
+
+    _add_datastore_page(
+        "123", 0, 2, [{"_id": 1, "col1": "a"}, {"_id": 2, "col1": "b"}], 100
+    )
+
+    with mock.patch("ckanapi.RemoteCKAN") as mockCKAN:
+
+        mock_ckan = mockCKAN()
+        mock_ckan.action.resource_show.return_value = {
+            "datastore_active": True,
+            "format": "CSV",
+        }
+
+        c = ckanTO()
+        data = c.get_resource(resource_id="123", nrows=2)
+
+    assert data.equals(pd.DataFrame({"_id": [1, 2], "col1": ["a", "b"]}))
+
+
+@responses.activate
+def test_preview_resource_csv():
+
+    url = "https://www.alink.com"
+    body = "col1,col2\n" + "".join(f"{i},{i * 2}\n" for i in range(100000))
+    responses.add(responses.GET, url, status=200, body=body)
+
+    with mock.patch("ckanapi.RemoteCKAN") as mockCKAN:
+
+        mock_ckan = mockCKAN()
+        mock_ckan.action.resource_show.return_value = {
+            "datastore_active": False,
+            "format": "CSV",
+            "url": url,
+            "last_modified": "2019-09-28",
+        }
+
+        c = ckanTO()
+        data = c.preview_resource(resource_id="123", nrows=3)
+
+        with pytest.raises(Exception):
+            c.get_resource(resource_id="123", nrows=3, arrow=True)
+
+    assert data.equals(pd.DataFrame({"col1": [0, 1, 2], "col2": [0, 2, 4]}))
+
+
+@responses.activate
+def test_preview_resource_zip():
+
+    url = "https://www.alink.com/archive.zip"
+
+    with open(os.path.join(FIXTURES_DIR, "sample_zip.zip"), "rb") as content:
+        archive = content.read()
+
+    def ranged(request):
+        start, end = request.headers["Range"][len("bytes=") :].split("-")
+        return (206, {}, archive[int(start) : int(end) + 1])
+
+    responses.add(
+        responses.HEAD,
+        url,
+        status=200,
+        headers={"Accept-Ranges": "bytes", "Content-Length": str(len(archive))},
+    )
+    responses.add_callback(responses.GET, url, callback=ranged)
+
+    with mock.patch("ckanapi.RemoteCKAN") as mockCKAN:
+
+        mock_ckan = mockCKAN()
+        mock_ckan.action.resource_show.return_value = {
+            "datastore_active": False,
+            "format": "ZIP",
+            "url": url,
+            "last_modified": "2019-09-28",
+        }
+
+        c = ckanTO()
+        data = c.preview_resource(resource_id="123", nrows=1)
+
+    assert list(data.keys()) == ["sample_csv.csv", "sample_xlsx.xlsx"]
+    assert data["sample_csv.csv"].equals(pd.DataFrame({"col1": [1], "col2": [3]}))
+    assert data["sample_xlsx.xlsx"] is None
+    assert all("Range" in call.request.headers for call in responses.calls[1:])
+
+
+@responses.activate
+def test_get_resource_csv_schema(tmp_path):
+
+    url = "https://www.alink.com"
+    responses.add(responses.GET, url, status=200, body="col1,col2\n1,a\n2,b\n")
+
+    with mock.patch("ckanapi.RemoteCKAN") as mockCKAN:
+
+        mock_ckan = mockCKAN()
+        mock_ckan.action.resource_show.return_value = {
+            "datastore_active": False,
+            "format": "CSV",
+            "url": url,
+            "last_modified": "2019-09-28",
+        }
+
+        c = ckanTO(cache_dir=tmp_path)
+        data = c.get_resource(resource_id="123")
+
+        # Another client sharing the store reads with the recorded dtypes
+        other = ckanTO(cache_dir=tmp_path)
+        with mock.patch(
+            "pyopendatato.ckanTO.read_file_csv", wraps=read_file_csv
+        ) as read_csv:
+            other_data = other.get_resource(resource_id="123")
+            schema = other.get_resource_schema(resource_id="123")
+
+    assert schema == {"col1": "int64", "col2": "object"}
+    assert read_csv.call_args.kwargs["schema"] == schema
+    assert other_data.equals(data)
+    assert len(responses.calls) == 1
+
+
+@responses.activate
+def test_get_resource_schema_datastore():
+
+    fields = [
+        {"id": "_id", "type": "int"},
+        {"id": "name", "type": "text"},
+        {"id": "opened", "type": "timestamp"},
+    ]
+    responses.add(
+        responses.GET,
+        DATASTORE_SEARCH_URL
+        + "?"
+        + urllib.parse.urlencode({"resource_id": "123", "limit": 0}),
+        status=200,
+        json={"result": {"records": [], "fields": fields, "total": 2}},
+    )
+
+    with mock.patch("ckanapi.RemoteCKAN") as mockCKAN:
+
+        mock_ckan = mockCKAN()
+        mock_ckan.action.resource_show.return_value = {
+            "datastore_active": True,
+            "format": "CSV",
+            "last_modified": "2019-09-28",
+        }
+
+        c = ckanTO()
+        schema = c.get_resource_schema(resource_id="123")
+        c.get_resource_schema(resource_id="123")
+
+    assert schema == {"_id": "Int64", "name": "object", "opened": "datetime64[ns]"}
+    assert len(responses.calls) == 1
+
+
+@responses.activate
+def test_get_resource_memory_budget_chunks():
+
+    records = [{"_id": i, "col1": i * 10} for i in range(30)]
+
+    _add_datastore_page("123", 0, 1000, records, 30)
+    for offset in range(0, 30, 5):
+        _add_datastore_page("123", offset, 5, records[offset : offset + 5], 30)
+
+    with mock.patch("ckanapi.RemoteCKAN") as mockCKAN:
+
+        mock_ckan = mockCKAN()
+        mock_ckan.action.resource_show.return_value = {
+            "datastore_active": True,
+            "format": "CSV",
+        }
+
+        c = ckanTO()
+        estimate = c.estimate_resource_memory(resource_id="123")
+
+        # Chunks take a quarter of the budget
+        c.memory_budget = int(estimate["bytes_per_row"] * 4 * 5.5)
+        chunks = list(c.get_resource(resource_id="123"))
+
+    assert estimate["rows"] == 30
+    assert [len(chunk) for chunk in chunks] == [5] * 6
+    assert c.memory_reports["123"]["chunksize"] == 5
+
+
+@responses.activate
+def test_get_resource_memory_budget_raise():
+
+    records = [{"_id": i, "col1": i * 10} for i in range(5)]
+
+    _add_datastore_page("123", 0, 1000, records, 5)
+
+    with mock.patch("ckanapi.RemoteCKAN") as mockCKAN:
+
+        mock_ckan = mockCKAN()
+        mock_ckan.action.resource_show.return_value = {
+            "datastore_active": True,
+            "format": "CSV",
+        }
+
+        c = ckanTO(memory_budget=1, over_budget="raise")
+
+        with pytest.raises(MemoryBudgetError):
+            c.get_resource(resource_id="123")
+
+    with pytest.raises(Exception):
+        ckanTO(over_budget="swap")
+
+
+@responses.activate
+def test_get_resource_memory_budget_csv():
+
+    url = "https://www.alink.com"
+
+    with open(os.path.join(FIXTURES_DIR, "sample_csv.csv"), "rb") as content:
+        body = content.read()
+
+    responses.add(
+        responses.HEAD, url, status=200, headers={"Content-Length": str(len(body))}
+    )
+    responses.add(responses.GET, url, status=200, body=body)
+
+    with mock.patch("ckanapi.RemoteCKAN") as mockCKAN:
+
+        mock_ckan = mockCKAN()
+        mock_ckan.action.resource_show.return_value = {
+            "datastore_active": False,
+            "format": "CSV",
+            "url": url,
+            "last_modified": "2019-09-28",
+        }
+
+        c = ckanTO(memory_budget=1024**3)
+        data = c.get_resource(resource_id="123")
+
+    assert data.equals(pd.DataFrame({"col1": [1, 2], "col2": [3, 4]}))
+    assert c.memory_reports["123"]["estimated_bytes"] > 0
+    assert c.memory_reports["123"]["actual_bytes"] == data.memory_usage(deep=True).sum()
+
+
+@responses.activate
+def test_get_resource_compressed_transfer():
+
+    url = "https://www.alink.com"
+
+    with open(os.path.join(FIXTURES_DIR, "sample_csv.csv"), "rb") as content:
+        body = gzip.compress(content.read())
+
+    responses.add(
+        responses.GET,
+        url,
+        status=200,
+        body=body,
+        headers={"Content-Encoding": "gzip", "Content-Length": str(len(body))},
+    )
+
+    with mock.patch("ckanapi.RemoteCKAN") as mockCKAN:
+
+        mock_ckan = mockCKAN()
+        mock_ckan.action.resource_show.return_value = {
+            "datastore_active": False,
+            "format": "CSV",
+            "url": url,
+            "last_modified": "2019-09-28",
+        }
+
+        c = ckanTO()
+        data = c.get_resource(resource_id="123")
+
+    assert "gzip" in responses.calls[0].request.headers["Accept-Encoding"]
+    assert data.equals(pd.DataFrame({"col1": [1, 2], "col2": [3, 4]}))
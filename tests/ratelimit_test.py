@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+import pytest
+
+import requests
+import responses
+
+from pyopendatato.ratelimit import (
+    AIMDLimiter,
+    RateLimitedSession,
+    RateLimiter,
+    TokenBucket,
+    retry_after,
+)
+from pyopendatato.utils import open_download, read_datastore
+
+URL = "https://www.alink.com"
+
+
+def test_token_bucket_limits_rate():
+
+    bucket = TokenBucket(rate=50, capacity=1)
+
+    start = time.monotonic()
+    for _ in range(6):
+        bucket.acquire()
+
+    assert time.monotonic() - start >= 0.09
+
+
+def test_token_bucket_pause():
+
+    bucket = TokenBucket(rate=None, capacity=1)
+    bucket.pause(0.05)
+
+    start = time.monotonic()
+    bucket.acquire()
+
+    assert time.monotonic() - start >= 0.04
+
+
+def test_aimd_limiter():
+
+    limiter = AIMDLimiter(initial=4, minimum=1, maximum=5)
+
+    limiter.on_throttle()
+    assert limiter.limit == 2
+
+    for _ in range(100):
+        limiter.on_success()
+    assert limiter.limit == 5
+
+    for _ in range(10):
+        limiter.on_throttle()
+    assert limiter.limit == 1
+
+
+@pytest.mark.parametrize(
+    "headers, expected",
+    [({}, None), ({"Retry-After": "3"}, 3), ({"Retry-After": "soon"}, None)],
+)
+def test_retry_after(headers, expected):
+
+    response = requests.Response()
+    response.headers.update(headers)
+
+    assert retry_after(response) == expected
+
+
+def test_retry_after_http_date():
+
+    response = requests.Response()
+    response.headers["Retry-After"] = "Wed, 21 Oct 2015 07:28:00 GMT"
+
+    assert retry_after(response) == 0
+
+
+@responses.activate
+def test_session_retries_throttled_requests():
+
+    responses.add(responses.GET, URL, status=429, headers={"Retry-After": "0"})
+    responses.add(responses.GET, URL, status=503, headers={"Retry-After": "0"})
+    responses.add(responses.GET, URL, status=200, body=b"hello")
+
+    limiter = RateLimiter(rate=None)
+    session = RateLimitedSession(limiter)
+
+    response = session.get(URL)
+
+    assert response.status_code == 200
+    assert response.content == b"hello"
+    assert len(responses.calls) == 3
+    assert limiter.concurrency.limit < 4
+
+
+@responses.activate
+def test_session_gives_up_after_max_retries():
+
+    responses.add(responses.GET, URL, status=429, headers={"Retry-After": "0"})
+
+    session = RateLimitedSession(RateLimiter(rate=None), max_retries=2)
+
+    assert session.get(URL).status_code == 429
+    assert len(responses.calls) == 3
+
+
+@responses.activate
+def test_session_holds_slot_while_streaming():
+
+    responses.add(responses.GET, URL, status=200, body=b"hello")
+
+    limiter = RateLimiter(rate=None)
+    session = RateLimitedSession(limiter)
+
+    with session.get(URL, stream=True) as response:
+        assert limiter.concurrency._in_flight == 1
+        assert response.content == b"hello"
+
+    assert limiter.concurrency._in_flight == 0
+
+    session.get(URL)
+    assert limiter.concurrency._in_flight == 0
+
+
+@responses.activate
+def test_open_download_releases_slot():
+
+    responses.add(
+        responses.GET,
+        URL,
+        status=200,
+        body=b"col1\n1\n",
+        headers={"Content-Length": "7"},
+    )
+
+    limiter = RateLimiter(rate=None, max_concurrency=1)
+    session = RateLimitedSession(limiter)
+    done = threading.Event()
+
+    with open_download(URL, ".csv", session=session) as buffer:
+        # Requests made while the downloaded content is read do not wait for it
+        thread = threading.Thread(target=lambda: (session.get(URL), done.set()))
+        thread.start()
+        thread.join(timeout=5)
+
+        assert done.is_set()
+        assert buffer.read() == b"col1\n1\n"
+
+
+@responses.activate
+def test_session_server_errors_do_not_grow_limit():
+
+    responses.add(responses.GET, URL, status=500)
+
+    limiter = RateLimiter(rate=None)
+    session = RateLimitedSession(limiter)
+
+    for _ in range(10):
+        assert session.get(URL).status_code == 500
+
+    assert limiter.concurrency.limit == 4
+
+
+@responses.activate
+def test_read_datastore_raises_on_error_status():
+
+    responses.add(responses.GET, URL, status=404, json={"success": False})
+
+    with pytest.raises(requests.HTTPError):
+        read_datastore("123", datastore_search_url=URL)
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+from datetime import datetime, timedelta
+from unittest import mock
+import pytest
+
+import pandas as pd
+import responses
+
+from pyopendatato.ckanTO import ckanTO
+from pyopendatato.scheduler import PrefetchScheduler
+
+URL = "https://www.alink.com"
+
+NOW = datetime(2019, 9, 28, 12, 0, 0)
+
+
+def _package(last_refreshed, last_modified):
+    return {
+        "id": "ABC",
+        "refresh_rate": "Daily",
+        "last_refreshed": last_refreshed,
+        "resources": [
+            {
+                "id": "123",
+                "datastore_active": False,
+                "format": "CSV",
+                "url": URL,
+                "last_modified": last_modified,
+                "package_id": "ABC",
+            }
+        ],
+    }
+
+
+@pytest.mark.parametrize(
+    "refresh_rate, last_refreshed, expected",
+    [
+        ("Daily", "2019-09-28T06:00:00", datetime(2019, 9, 29, 6, 0, 0)),
+        ("Daily", "2019-09-20T06:00:00", NOW + timedelta(minutes=15)),
+        ("Weekly", "2019-09-27T00:00:00", datetime(2019, 10, 4, 0, 0, 0)),
+        ("As available", "2019-09-28T06:00:00", NOW + timedelta(hours=1)),
+        ("Will not be Refreshed", "2019-09-28T06:00:00", None),
+    ],
+)
+def test_next_poll(refresh_rate, last_refreshed, expected):
+
+    with mock.patch("ckanapi.RemoteCKAN"):
+        scheduler = PrefetchScheduler(ckanTO())
+
+    assert scheduler.next_poll(refresh_rate, last_refreshed, now=NOW) == expected
+
+
+@responses.activate
+def test_run_pending_prefetches_new_versions():
+
+    responses.add(responses.GET, URL, status=200, body=b"col1,col2\n1,3\n2,4")
+
+    with mock.patch("ckanapi.RemoteCKAN") as mockCKAN:
+
+        mock_ckan = mockCKAN()
+        mock_ckan.action.package_show.return_value = _package(
+            "2019-09-28T06:00:00", "2019-09-28T06:00:00"
+        )
+        mock_ckan.action.resource_show.return_value = _package(
+            "2019-09-28T06:00:00", "2019-09-28T06:00:00"
+        )["resources"][0]
+
+        c = ckanTO()
+        scheduler = PrefetchScheduler(c, package_ids=["ABC"])
+
+        assert scheduler.run_pending(now=NOW) == ["123"]
+        assert len(responses.calls) == 1
+
+        # Not due again until the next daily refresh
+        assert scheduler.run_pending(now=NOW + timedelta(hours=1)) == []
+
+        data = c.get_resource("123")
+        assert len(responses.calls) == 1
+        assert data.equals(pd.DataFrame({"col1": [1, 2], "col2": [3, 4]}))
+
+        mock_ckan.action.package_show.return_value = _package(
+            "2019-09-29T06:00:00", "2019-09-29T06:00:00"
+        )
+        assert scheduler.run_pending(now=NOW + timedelta(days=1)) == ["123"]
+        assert len(responses.calls) == 2
+
+
+def test_watch_resource_only_prefetches_that_resource():
+
+    with mock.patch("ckanapi.RemoteCKAN") as mockCKAN:
+
+        mock_ckan = mockCKAN()
+        package = _package("2019-09-28T06:00:00", "2019-09-28T06:00:00")
+        package["resources"].append(dict(package["resources"][0], id="456"))
+        mock_ckan.action.package_show.return_value = package
+        mock_ckan.action.resource_show.return_value = package["resources"][1]
+
+        c = ckanTO()
+        c.prefetch_resource = mock.Mock()
+
+        scheduler = PrefetchScheduler(c, resource_ids=["456"])
+
+        assert scheduler.run_pending(now=NOW) == ["456"]
+        assert c.prefetch_resource.call_count == 1
+        assert c.prefetch_resource.call_args[0] == ("456",)
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+
+import gzip
+import os
+import threading
+from unittest import mock
+
+import pytest
+import responses
+
+from pyopendatato.ckanTO import ckanTO
+from pyopendatato.scratch import ScratchSpace
+from pyopendatato.utils import (
+    ENCODED_EXPANSION,
+    download_extract_zipped_file,
+    download_scratch_file,
+)
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def test_file_removed_on_failure(tmp_path):
+
+    scratch = ScratchSpace(tmp_path)
+
+    with pytest.raises(ValueError):
+        with scratch.file(".csv") as temp_file:
+            temp_file.write_bytes(b"data")
+            raise ValueError
+
+    with pytest.raises(ValueError):
+        with scratch.directory() as temp_dir:
+            (temp_dir / "data.csv").write_bytes(b"data")
+            raise ValueError
+
+    assert list(scratch.path.iterdir()) == []
+    assert scratch.reserved == 0
+
+
+def test_quota():
+
+    scratch = ScratchSpace(quota=100)
+    released = threading.Event()
+    order = []
+
+    def reserve():
+        with scratch.reserve(60):
+            order.append("second")
+
+    with pytest.raises(Exception):
+        with scratch.reserve(101):
+            pass
+
+    with scratch.reserve(60):
+        thread = threading.Thread(target=reserve)
+        thread.start()
+        thread.join(0.1)
+        # The second reservation waits for the first one to be released
+        assert thread.is_alive()
+        order.append("first")
+
+        # A thread holding a reservation does not wait for another one
+        with scratch.reserve(60):
+            released.set()
+
+    thread.join()
+
+    assert released.is_set()
+    assert order == ["first", "second"]
+    assert scratch.reserved == 0
+
+
+def test_cleanup(tmp_path):
+
+    scratch = ScratchSpace(tmp_path)
+    with scratch.file() as temp_file:
+        temp_file.write_bytes(b"data")
+        scratch.cleanup()
+
+    assert list(tmp_path.iterdir()) == []
+
+
+@responses.activate
+def test_get_resource_archive_cleanup(tmp_path):
+
+    url = "https://www.alink.com"
+
+    with open(os.path.join(FIXTURES_DIR, "sample_zip_invalid.zip"), "rb") as content:
+        responses.add(responses.GET, url, status=200, body=content.read())
+
+    with mock.patch("ckanapi.RemoteCKAN") as mockCKAN:
+
+        mock_ckan = mockCKAN()
+        mock_ckan.action.resource_show.return_value = {
+            "datastore_active": False,
+            "format": "ZIP",
+            "url": url,
+            "last_modified": "2019-09-28",
+        }
+
+        scratch = ScratchSpace(tmp_path)
+        c = ckanTO(scratch=scratch)
+
+        with pytest.raises(Exception):
+            c.get_resource(resource_id="123")
+
+    assert list(scratch.path.iterdir()) == []
+    assert scratch.reserved == 0
+
+
+@responses.activate
+def test_download_extract_zipped_file_scratch(tmp_path):
+
+    url = "https://www.alink.com"
+
+    with open(os.path.join(FIXTURES_DIR, "sample_zip.zip"), "rb") as content:
+        responses.add(responses.GET, url, status=200, body=content.read())
+
+    scratch = ScratchSpace(tmp_path)
+
+    with download_extract_zipped_file(url, "zip", scratch=scratch) as temp_dir:
+        assert temp_dir.parent == scratch.path
+        assert any(temp_dir.iterdir())
+        assert scratch.reserved > 0
+
+    assert list(scratch.path.iterdir()) == []
+    assert scratch.reserved == 0
+
+
+def test_unsized_reservation():
+
+    scratch = ScratchSpace(quota=100, unsized_reservation=40)
+    with scratch.file(nbytes=None):
+        assert scratch.reserved == 40
+
+    scratch = ScratchSpace(quota=10, unsized_reservation=40)
+    with scratch.file(nbytes=None):
+        assert scratch.reserved == 10
+
+
+@responses.activate
+def test_compressed_download_reservation_capped_at_quota():
+
+    url = "https://www.alink.com"
+    body = gzip.compress(b"col1\n" + b"1\n" * 1000)
+    responses.add(
+        responses.GET,
+        url,
+        status=200,
+        body=body,
+        headers={"Content-Encoding": "gzip", "Content-Length": str(len(body))},
+    )
+
+    # The estimated decoded size (ENCODED_EXPANSION times the compressed size) exceeds the quota
+    scratch = ScratchSpace(quota=len(body) * ENCODED_EXPANSION - 1)
+
+    with download_scratch_file(url, ".csv", scratch=scratch) as temp_file:
+        assert temp_file.read_bytes() == b"col1\n" + b"1\n" * 1000
+        assert scratch.reserved == scratch.quota
+
+    assert scratch.reserved == 0
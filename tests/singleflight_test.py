@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+import pytest
+
+import pandas as pd
+import responses
+
+from pyopendatato.ckanTO import ckanTO
+from pyopendatato.singleflight import SingleFlight, copy_result
+
+
+def test_single_flight_coalesces_concurrent_calls():
+
+    group = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def work():
+        calls.append(1)
+        release.wait()
+        return "result"
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(group.do, "key", work) for _ in range(4)]
+        time.sleep(0.1)
+        release.set()
+        results = [f.result() for f in futures]
+
+    assert len(calls) == 1
+    assert [shared for _, shared in results] == [True, True, True, True]
+    assert all(result == "result" for result, _ in results)
+
+
+def test_single_flight_shares_errors():
+
+    group = SingleFlight()
+    release = threading.Event()
+
+    def work():
+        release.wait()
+        raise ValueError("failed")
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        futures = [executor.submit(group.do, "key", work) for _ in range(2)]
+        time.sleep(0.1)
+        release.set()
+
+        for future in futures:
+            with pytest.raises(ValueError):
+                future.result()
+
+
+def test_single_flight_runs_again_after_completion():
+
+    group = SingleFlight()
+
+    assert group.do("key", lambda: 1) == (1, False)
+    assert group.do("key", lambda: 2) == (2, False)
+
+
+def test_copy_result():
+
+    data = {"a.csv": pd.DataFrame({"col1": [1, 2]}), "b.json": {"key": [1]}}
+    copied = copy_result(data)
+
+    copied["a.csv"].loc[0, "col1"] = 100
+    copied["b.json"]["key"].append(2)
+
+    assert data["a.csv"].loc[0, "col1"] == 1
+    assert data["b.json"] == {"key": [1]}
+
+
+@responses.activate
+def test_get_resource_concurrent_requests_share_download():
+
+    url = "https://www.alink.com"
+    responses.add(responses.GET, url, status=200, body=b"col1,col2\n1,3\n2,4")
+
+    def resource_show(id):
+        time.sleep(0.1)
+        return {"datastore_active": False, "format": "CSV", "url": url}
+
+    with mock.patch("ckanapi.RemoteCKAN") as mockCKAN:
+
+        mock_ckan = mockCKAN()
+        mock_ckan.action.resource_show.side_effect = resource_show
+
+        c = ckanTO()
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(c.get_resource, ["123"] * 4))
+
+    ref = pd.DataFrame({"col1": [1, 2], "col2": [3, 4]})
+
+    assert mock_ckan.action.resource_show.call_count == 1
+    assert len(responses.calls) == 1
+    assert all(data.equals(ref) for data in results)
+    assert len(set(id(data) for data in results)) == 4
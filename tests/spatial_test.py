@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+
+import json
+from unittest import mock
+
+import pytest
+import responses
+import geopandas
+from shapely.geometry import Point, box
+
+from pyopendatato.ckanTO import ckanTO
+from pyopendatato.spatial import SpatialIndex
+
+WARDS = {
+    "type": "FeatureCollection",
+    "features": [
+        {
+            "type": "Feature",
+            "geometry": box(0, 0, 1, 1).__geo_interface__,
+            "properties": {"ward": "A"},
+        },
+        {
+            "type": "Feature",
+            "geometry": box(1, 0, 2, 1).__geo_interface__,
+            "properties": {"ward": "B"},
+        },
+    ],
+}
+
+
+def _wards():
+    return geopandas.GeoDataFrame.from_features(WARDS["features"], crs="EPSG:4326")
+
+
+def test_lookup():
+
+    index = SpatialIndex(_wards())
+
+    result = index.lookup([(0.5, 0.5), (1.5, 0.5), (1, 0.5), (5, 5)])
+
+    assert result["ward"].tolist()[:3] == ["A", "B", "A"]
+    assert result["ward"].isna().tolist() == [False, False, False, True]
+
+
+def test_lookup_geoseries():
+
+    index = SpatialIndex(_wards())
+    points = geopandas.GeoSeries(
+        [Point(1.5, 0.5), Point(0.5, 0.5)], index=[10, 20], crs="EPSG:4326"
+    )
+
+    result = index.lookup(points)
+
+    assert result.index.tolist() == [10, 20]
+    assert result["ward"].tolist() == ["B", "A"]
+
+
+def test_nearest():
+
+    index = SpatialIndex(_wards())
+
+    result = index.nearest([(-1, 0.5), (3, 0.5), (10, 0.5)], max_distance=2)
+
+    assert result["ward"].tolist()[:2] == ["A", "B"]
+    assert result["ward"].isna().tolist() == [False, False, True]
+
+
+def test_save_load(tmp_path):
+
+    pytest.importorskip("pyarrow")
+
+    path = tmp_path / "wards.parquet"
+    with open(path, "wb") as out_file:
+        SpatialIndex(_wards()).save(out_file)
+
+    index = SpatialIndex.load(path)
+
+    assert index.lookup([(1.5, 0.5)])["ward"].tolist() == ["B"]
+
+
+@responses.activate
+def test_get_spatial_index(tmp_path):
+
+    pytest.importorskip("pyarrow")
+
+    url = "https://www.alink.com"
+    responses.add(responses.GET, url, status=200, body=json.dumps(WARDS))
+
+    resource_info = {
+        "datastore_active": False,
+        "format": "GEOJSON",
+        "url": url,
+        "id": "123",
+        "name": "Wards",
+        "last_modified": "2019-09-28",
+        "package_id": "ABC",
+    }
+
+    with mock.patch("ckanapi.RemoteCKAN") as mockCKAN:
+
+        mock_ckan = mockCKAN()
+        mock_ckan.action.resource_show.return_value = resource_info
+
+        c = ckanTO(cache_dir=tmp_path)
+        index = c.get_spatial_index(resource_id="123")
+
+        assert c.get_spatial_index(resource_id="123") is index
+
+        # Another client sharing the store loads the features instead of parsing the resource
+        other = ckanTO(cache_dir=tmp_path)
+        with mock.patch.object(other, "_get_resource") as get_resource:
+            other_index = other.get_spatial_index(resource_id="123")
+
+    get_resource.assert_not_called()
+    assert len(responses.calls) == 1
+    assert list((tmp_path / "123").glob("*.spatial-v2.parquet"))
+    assert other_index.lookup([(0.5, 0.5)])["ward"].tolist() == ["A"]
+
+
+def test_get_spatial_index_invalid_format():
+
+    with mock.patch("ckanapi.RemoteCKAN") as mockCKAN:
+
+        mock_ckan = mockCKAN()
+        mock_ckan.action.resource_show.return_value = {
+            "datastore_active": False,
+            "format": "CSV",
+            "last_modified": "2019-09-28",
+        }
+
+        c = ckanTO()
+
+        with pytest.raises(Exception):
+            c.get_spatial_index(resource_id="123")
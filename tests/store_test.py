@@ -0,0 +1,345 @@
+# -*- coding: utf-8 -*-
+
+import gzip
+import io
+import multiprocessing
+import os
+import time
+import zipfile
+from unittest import mock
+import pytest
+
+import pandas as pd
+import responses
+
+from pyopendatato.ckanTO import FILE_EXPANSION, ckanTO
+from pyopendatato.store import DownloadStore
+from pyopendatato.utils import open_file, read_file_csv
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def _read(path):
+    # Text files are stored compressed
+    with open_file(path) as in_file:
+        return in_file.read()
+
+
+def _fetch_in_process(args):
+    root, counter = args
+
+    def download(out_file):
+        with open(counter, "a") as f:
+            f.write("x")
+        time.sleep(0.2)
+        out_file.write(b"hello")
+
+    path = DownloadStore(root).fetch("123", "2019-09-28", ".txt", download)
+    return _read(path)
+
+
+def test_store_fetch_downloads_once(tmp_path):
+
+    store = DownloadStore(tmp_path)
+    download = mock.Mock(side_effect=lambda f: f.write(b"hello"))
+
+    first = store.fetch("123", "2019-09-28", ".txt", download)
+    second = store.fetch("123", "2019-09-28", ".txt", download)
+
+    assert first == second
+    assert _read(first) == b"hello"
+    assert download.call_count == 1
+
+
+def test_store_failed_download_leaves_nothing(tmp_path):
+
+    store = DownloadStore(tmp_path)
+
+    def download(out_file):
+        out_file.write(b"partial")
+        raise IOError("connection lost")
+
+    with pytest.raises(IOError):
+        store.fetch("123", "2019-09-28", ".txt", download)
+
+    assert store.get("123", "2019-09-28", ".txt") is None
+    assert not list((tmp_path / "123").glob("*.tmp"))
+
+
+def test_store_new_version_replaces_old(tmp_path):
+
+    store = DownloadStore(tmp_path)
+
+    store.fetch("123", "2019-09-28", ".txt", lambda f: f.write(b"old"))
+    store.fetch("123", "2019-10-01", ".txt", lambda f: f.write(b"new"))
+
+    assert store.get("123", "2019-09-28", ".txt") is None
+    assert _read(store.get("123", "2019-10-01", ".txt")) == b"new"
+
+    store.invalidate("123")
+    assert store.get("123", "2019-10-01", ".txt") is None
+
+
+def test_store_shared_between_processes(tmp_path):
+
+    counter = tmp_path / "counter"
+
+    with multiprocessing.get_context("fork").Pool(4) as pool:
+        results = pool.map(_fetch_in_process, [(tmp_path / "store", counter)] * 4)
+
+    assert results == [b"hello"] * 4
+    assert counter.read_text() == "x"
+
+
+@responses.activate
+def test_get_resource_uses_store(tmp_path):
+
+    url = "https://www.alink.com"
+    responses.add(responses.GET, url, status=200, body=b"col1,col2\n1,3\n2,4")
+
+    with mock.patch("ckanapi.RemoteCKAN") as mockCKAN:
+
+        mock_ckan = mockCKAN()
+        mock_ckan.action.resource_show.return_value = {
+            "datastore_active": False,
+            "format": "CSV",
+            "url": url,
+            "id": "123",
+            "last_modified": "2019-09-28",
+        }
+
+        c = ckanTO(cache_dir=tmp_path)
+        first = c.get_resource(resource_id="123")
+        second = c.get_resource(resource_id="123")
+
+    ref = pd.DataFrame({"col1": [1, 2], "col2": [3, 4]})
+
+    assert first.equals(ref)
+    assert second.equals(ref)
+    assert len(responses.calls) == 1
+    assert c.store.get("123", "2019-09-28", ".csv") is not None
+
+
+def test_store_keeps_identical_files_once(tmp_path):
+
+    store = DownloadStore(tmp_path)
+
+    first = store.fetch("123", "2019-09-28", ".shp", lambda f: f.write(b"shared"))
+    second = store.fetch("456", "2019-10-01", ".zip", lambda f: f.write(b"shared"))
+    other = store.fetch("789", "2019-10-01", ".zip", lambda f: f.write(b"other"))
+
+    assert first.read_bytes() == second.read_bytes() == b"shared"
+    assert first.stat().st_ino == second.stat().st_ino
+    assert other.stat().st_ino != first.stat().st_ino
+    assert store.digest(first) == store.digest(second) != store.digest(other)
+    assert store.is_shared(first) and not store.is_shared(other)
+
+    # Objects are removed once no resource uses them
+    store.invalidate("123")
+    assert second.read_bytes() == b"shared"
+    assert not store.is_shared(second)
+
+    store.invalidate("456")
+    store.fetch("789", "2019-10-02", ".zip", lambda f: f.write(b"newer"))
+    assert len(list((tmp_path / ".objects").glob("*/*"))) == 1
+
+
+def test_store_extracts_once_per_content(tmp_path):
+
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zip_file:
+        zip_file.writestr("data.csv", "col1\n1\n")
+        zip_file.writestr("copy.csv", "col1\n1\n")
+
+    def extract(path, out_dir):
+        with zipfile.ZipFile(path) as zip_file:
+            zip_file.extractall(out_dir)
+
+    extract = mock.Mock(side_effect=extract)
+
+    store = DownloadStore(tmp_path)
+    first = store.fetch(
+        "123", "2019-09-28", ".zip", lambda f: f.write(archive.getvalue())
+    )
+    second = store.fetch(
+        "456", "2019-09-28", ".zip", lambda f: f.write(archive.getvalue())
+    )
+
+    first_dir = store.extract(first, extract)
+    second_dir = store.extract(second, extract)
+
+    assert first_dir == second_dir
+    assert extract.call_count == 1
+    assert (first_dir / "data.csv").stat().st_ino == (
+        first_dir / "copy.csv"
+    ).stat().st_ino
+
+    store.invalidate("123")
+    store.invalidate("456")
+    assert not first_dir.exists()
+    assert not list((tmp_path / ".objects").glob("*/*"))
+
+
+@responses.activate
+def test_get_resource_parses_identical_files_once(tmp_path):
+
+    url = "https://www.alink.com"
+    responses.add(responses.GET, url, status=200, body=b"col1,col2\n1,3\n2,4")
+
+    with mock.patch("ckanapi.RemoteCKAN") as mockCKAN:
+
+        mock_ckan = mockCKAN()
+        mock_ckan.action.resource_show.side_effect = lambda id: {
+            "datastore_active": False,
+            "format": "CSV",
+            "url": url,
+            "id": id,
+            "last_modified": "2019-09-28",
+        }
+
+        c = ckanTO(cache_dir=tmp_path)
+
+        with mock.patch(
+            "pyopendatato.ckanTO.read_file_csv", wraps=read_file_csv
+        ) as read:
+            data = [c.get_resource(resource_id) for resource_id in ["1", "2", "3"]]
+
+    ref = pd.DataFrame({"col1": [1, 2], "col2": [3, 4]})
+
+    assert all(frame.equals(ref) for frame in data)
+    assert data[1] is not data[2]
+    # The first two resources are parsed before their file is known to be shared
+    assert read.call_count == 2
+    # One copy of the file, and one of the schema recorded for the resources
+    assert len(list((tmp_path / ".objects").glob("*/*"))) == 2
+
+
+def test_store_compresses_text_files(tmp_path):
+
+    store = DownloadStore(tmp_path)
+
+    first = store.fetch("123", "2019-09-28", ".csv", lambda f: f.write(b"col1\n1\n"))
+    second = store.fetch("456", "2019-09-28", ".csv", lambda f: f.write(b"col1\n1\n"))
+    archive = store.fetch("789", "2019-09-28", ".zip", lambda f: f.write(b"PK"))
+
+    assert first.name == "2019-09-28.csv.gz"
+    assert gzip.decompress(first.read_bytes()) == b"col1\n1\n"
+    assert store.get("123", "2019-09-28", ".csv") == first
+    # Identical content compresses to identical bytes, kept once
+    assert first.stat().st_ino == second.stat().st_ino
+    assert archive.read_bytes() == b"PK"
+
+    assert store.content_size(first) == len(b"col1\n1\n")
+
+    raw = DownloadStore(tmp_path / "raw", compression=None)
+    path = raw.fetch("123", "2019-09-28", ".csv", lambda f: f.write(b"col1\n1\n"))
+    assert path.name == "2019-09-28.csv"
+    assert raw.digest(path) == store.digest(first)
+
+    with pytest.raises(Exception):
+        DownloadStore(tmp_path, compression="lzma")
+
+
+@pytest.mark.parametrize(
+    "format, fixture",
+    [("CSV", "sample_csv.csv"), ("GEOJSON", "sample_geojson.geojson")],
+)
+@responses.activate
+def test_get_resource_reads_compressed_store(tmp_path, format, fixture):
+
+    url = "https://www.alink.com"
+
+    fixtures_dir = os.path.join(os.path.dirname(__file__), "fixtures")
+    with open(os.path.join(fixtures_dir, fixture), "rb") as content:
+        responses.add(responses.GET, url, status=200, body=content.read())
+
+    with mock.patch("ckanapi.RemoteCKAN") as mockCKAN:
+
+        mock_ckan = mockCKAN()
+        mock_ckan.action.resource_show.return_value = {
+            "datastore_active": False,
+            "format": format,
+            "url": url,
+            "id": "123",
+            "last_modified": "2019-09-28",
+        }
+
+        stored = ckanTO(cache_dir=tmp_path).get_resource(resource_id="123")
+        # Read from the store by a new client
+        again = ckanTO(cache_dir=tmp_path).get_resource(resource_id="123")
+
+    assert len(responses.calls) == 1
+    assert list((tmp_path / "123").glob("*." + format.lower() + ".gz"))
+    assert stored.equals(again)
+
+
+@responses.activate
+def test_get_resource_dask_decompresses_stored_csv(tmp_path):
+
+    dd = pytest.importorskip("dask.dataframe")
+
+    url = "https://www.alink.com"
+    responses.add(responses.GET, url, status=200, body=b"col1,col2\n1,3\n2,4")
+
+    with mock.patch("ckanapi.RemoteCKAN") as mockCKAN:
+
+        mock_ckan = mockCKAN()
+        mock_ckan.action.resource_show.return_value = {
+            "datastore_active": False,
+            "format": "CSV",
+            "url": url,
+            "id": "123",
+            "last_modified": "2019-09-28",
+        }
+
+        with ckanTO(cache_dir=tmp_path) as c:
+            with mock.patch("dask.dataframe.read_csv", wraps=dd.read_csv) as read:
+                data = c.get_resource_dask(resource_id="123")
+
+            # dask cannot split gzip files into partitions
+            path = read.call_args[0][0]
+            assert path.endswith(".csv")
+            assert data["col2"].sum().compute() == 7
+
+        assert not os.path.exists(path)
+
+
+def test_store_zstd_content_size(tmp_path):
+
+    pytest.importorskip("zstandard")
+
+    store = DownloadStore(tmp_path, compression="zstd")
+    content = b"col1\n" + b"1\n" * 1000
+    path = store.fetch("123", "2019-09-28", ".csv", lambda f: f.write(content))
+
+    assert path.name == "2019-09-28.csv.zst"
+    assert path.stat().st_size < len(content)
+    assert store.content_size(path) == len(content)
+    assert _read(path) == content
+
+
+@responses.activate
+def test_estimate_resource_memory_stored_shapefile(tmp_path):
+
+    url = "https://www.alink.com"
+    with open(os.path.join(FIXTURES_DIR, "sample_shp.zip"), "rb") as content:
+        body = content.read()
+        responses.add(responses.GET, url, status=200, body=body)
+
+    with mock.patch("ckanapi.RemoteCKAN") as mockCKAN:
+
+        mock_ckan = mockCKAN()
+        mock_ckan.action.resource_show.return_value = {
+            "datastore_active": False,
+            "format": "SHP",
+            "url": url,
+            "last_modified": "2019-09-28",
+        }
+
+        c = ckanTO(cache_dir=tmp_path)
+        c.get_resource(resource_id="123")
+        estimate = c.estimate_resource_memory(resource_id="123")
+
+    # The size comes from the stored archive, without a HEAD request
+    assert len(responses.calls) == 1
+    assert estimate["bytes"] == len(body) * FILE_EXPANSION["SHP"]
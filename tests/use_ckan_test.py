@@ -169,3 +169,61 @@ def test_resource_metadata():
         )
 
         assert resource_info == ref
+
+
+def _package(package_id, name):
+    return {
+        "id": package_id,
+        "name": name,
+        "title": name.title(),
+        "resources": [
+            {
+                "id": package_id + "-r",
+                "name": name,
+                "format": "CSV",
+                "package_id": package_id,
+            }
+        ],
+    }
+
+
+def test_packages_metadata():
+
+    with mock.patch("ckanapi.RemoteCKAN") as mockCKAN:
+
+        mock_ckan = mockCKAN()
+        mock_ckan.action.package_search.return_value = {
+            "count": 2,
+            "results": [_package("2", "second"), _package("1", "first")],
+        }
+        mock_ckan.action.package_show.return_value = _package("3", "private")
+
+        c = ckanTO()
+        r = c.get_packages_metadata(["1", "second", "3"], batch_size=10)
+        resources = c.list_packages_resources(["1", "3"])
+
+    fq = mock_ckan.action.package_search.call_args_list[0].kwargs["fq"]
+
+    assert fq == 'id:("1" OR "second" OR "3") OR name:("1" OR "second" OR "3")'
+    assert r["id"].tolist() == ["1", "2", "3"]
+    assert r["title"].tolist() == ["First", "Second", "Private"]
+    assert resources["id"].tolist() == ["1-r", "3-r"]
+    assert mock_ckan.action.package_search.call_count == 2
+    assert mock_ckan.action.package_show.call_count == 2
+
+
+def test_resources_metadata():
+
+    with mock.patch("ckanapi.RemoteCKAN") as mockCKAN:
+
+        mock_ckan = mockCKAN()
+        mock_ckan.action.resource_show.side_effect = lambda id: {
+            "id": id,
+            "format": "CSV",
+        }
+
+        c = ckanTO()
+        r = c.get_resources_metadata(["a", "b"])
+
+    assert r["id"].tolist() == ["a", "b"]
+    assert r["format"].tolist() == ["CSV", "CSV"]